@@ -0,0 +1,297 @@
+"""
+Initial schema
+
+Revision ID: 0001
+Revises:
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('users',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('hashed_password', sa.String(), nullable=False),
+    sa.Column('first_name', sa.String(), nullable=True),
+    sa.Column('last_name', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('is_verified', sa.Boolean(), nullable=True),
+    sa.Column('is_superuser', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+    op.create_table('classes',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('code', sa.String(), nullable=True),
+    sa.Column('section', sa.String(), nullable=True),
+    sa.Column('semester', sa.String(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('professor', sa.String(), nullable=True),
+    sa.Column('professor_email', sa.String(), nullable=True),
+    sa.Column('schedule', sa.JSON(), nullable=True),
+    sa.Column('location', sa.String(), nullable=True),
+    sa.Column('ai_settings', sa.JSON(), nullable=True),
+    sa.Column('grading_scale', sa.JSON(), nullable=True),
+    sa.Column('created_by', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('user_profiles',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('university', sa.String(), nullable=True),
+    sa.Column('major', sa.String(), nullable=True),
+    sa.Column('year', sa.Integer(), nullable=True),
+    sa.Column('gpa', sa.String(), nullable=True),
+    sa.Column('preferred_ai_level', sa.String(), nullable=True),
+    sa.Column('study_preferences', sa.JSON(), nullable=True),
+    sa.Column('total_study_hours', sa.Integer(), nullable=True),
+    sa.Column('assignments_completed', sa.Integer(), nullable=True),
+    sa.Column('average_assignment_score', sa.Integer(), nullable=True),
+    sa.Column('timezone', sa.String(), nullable=True),
+    sa.Column('notification_preferences', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_profiles_user_id'), 'user_profiles', ['user_id'], unique=True)
+    op.create_table('writing_styles',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('vocabulary_complexity', sa.Float(), nullable=True),
+    sa.Column('sentence_length_avg', sa.Float(), nullable=True),
+    sa.Column('sentence_length_std', sa.Float(), nullable=True),
+    sa.Column('formality_level', sa.Float(), nullable=True),
+    sa.Column('technical_level', sa.Float(), nullable=True),
+    sa.Column('common_phrases', sa.JSON(), nullable=True),
+    sa.Column('transition_words', sa.JSON(), nullable=True),
+    sa.Column('vocabulary_preferences', sa.JSON(), nullable=True),
+    sa.Column('grammar_patterns', sa.JSON(), nullable=True),
+    sa.Column('punctuation_style', sa.JSON(), nullable=True),
+    sa.Column('paragraph_length_avg', sa.Float(), nullable=True),
+    sa.Column('paragraph_structure', sa.JSON(), nullable=True),
+    sa.Column('tone_attributes', sa.JSON(), nullable=True),
+    sa.Column('voice_type', sa.String(), nullable=True),
+    sa.Column('sample_count', sa.Integer(), nullable=True),
+    sa.Column('last_trained', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('training_status', sa.String(), nullable=True),
+    sa.Column('model_path', sa.String(), nullable=True),
+    sa.Column('accuracy_score', sa.Float(), nullable=True),
+    sa.Column('is_default', sa.Boolean(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('assignments',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('class_id', sa.String(), nullable=False),
+    sa.Column('created_by', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('instructions', sa.Text(), nullable=True),
+    sa.Column('assignment_type', sa.String(), nullable=True),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('attachment_paths', sa.JSON(), nullable=True),
+    sa.Column('resource_links', sa.JSON(), nullable=True),
+    sa.Column('instruction_video_path', sa.String(), nullable=True),
+    sa.Column('instruction_video_transcript', sa.Text(), nullable=True),
+    sa.Column('assigned_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('due_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('total_points', sa.Float(), nullable=True),
+    sa.Column('grading_rubric', sa.JSON(), nullable=True),
+    sa.Column('allowed_ai_level', sa.String(), nullable=True),
+    sa.Column('ai_restrictions', sa.JSON(), nullable=True),
+    sa.Column('is_published', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('class_enrollments',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('class_id', sa.String(), nullable=False),
+    sa.Column('enrollment_date', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('role', sa.String(), nullable=True),
+    sa.Column('current_grade', sa.Float(), nullable=True),
+    sa.Column('attendance_rate', sa.Float(), nullable=True),
+    sa.Column('participation_score', sa.Float(), nullable=True),
+    sa.Column('topics_covered', sa.JSON(), nullable=True),
+    sa.Column('knowledge_gaps', sa.JSON(), nullable=True),
+    sa.Column('study_time_minutes', sa.Integer(), nullable=True),
+    sa.Column('ai_assistance_level', sa.String(), nullable=True),
+    sa.Column('custom_ai_instructions', sa.Text(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('completed', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('materials',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('class_id', sa.String(), nullable=False),
+    sa.Column('uploaded_by', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('file_type', sa.String(), nullable=True),
+    sa.Column('file_size', sa.Integer(), nullable=True),
+    sa.Column('file_path', sa.String(), nullable=True),
+    sa.Column('content_hash', sa.String(), nullable=True),
+    sa.Column('duration_seconds', sa.Integer(), nullable=True),
+    sa.Column('transcript', sa.Text(), nullable=True),
+    sa.Column('is_processed', sa.Boolean(), nullable=True),
+    sa.Column('processing_status', sa.String(), nullable=True),
+    sa.Column('processing_error', sa.Text(), nullable=True),
+    sa.Column('metadata', sa.JSON(), nullable=True),
+    sa.Column('tags', sa.JSON(), nullable=True),
+    sa.Column('embedding_count', sa.Integer(), nullable=True),
+    sa.Column('last_embedded', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+    sa.ForeignKeyConstraint(['uploaded_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('assignment_submissions',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('assignment_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('file_paths', sa.JSON(), nullable=True),
+    sa.Column('ai_assistance_used', sa.Boolean(), nullable=True),
+    sa.Column('ai_assistance_level', sa.String(), nullable=True),
+    sa.Column('ai_interaction_count', sa.Integer(), nullable=True),
+    sa.Column('ai_generated_percentage', sa.Float(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('progress_percentage', sa.Float(), nullable=True),
+    sa.Column('time_spent_minutes', sa.Integer(), nullable=True),
+    sa.Column('submitted_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('is_late', sa.Boolean(), nullable=True),
+    sa.Column('score', sa.Float(), nullable=True),
+    sa.Column('feedback', sa.Text(), nullable=True),
+    sa.Column('graded_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('graded_by', sa.String(), nullable=True),
+    sa.Column('version', sa.Integer(), nullable=True),
+    sa.Column('previous_versions', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['assignment_id'], ['assignments.id'], ),
+    sa.ForeignKeyConstraint(['graded_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('chat_sessions',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('class_id', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('context_materials', sa.JSON(), nullable=True),
+    sa.Column('assignment_id', sa.String(), nullable=True),
+    sa.Column('ai_assistance_level', sa.String(), nullable=True),
+    sa.Column('custom_instructions', sa.Text(), nullable=True),
+    sa.Column('message_count', sa.Integer(), nullable=True),
+    sa.Column('total_tokens_used', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('last_activity', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['assignment_id'], ['assignments.id'], ),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('material_chunks',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('material_id', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('chunk_index', sa.Integer(), nullable=True),
+    sa.Column('page_number', sa.Integer(), nullable=True),
+    sa.Column('start_time', sa.Float(), nullable=True),
+    sa.Column('end_time', sa.Float(), nullable=True),
+    sa.Column('embedding_id', sa.String(), nullable=True),
+    sa.Column('embedding_model', sa.String(), nullable=True),
+    sa.Column('metadata', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['material_id'], ['materials.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('writing_samples',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('style_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=True),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('source_type', sa.String(), nullable=True),
+    sa.Column('class_id', sa.String(), nullable=True),
+    sa.Column('assignment_id', sa.String(), nullable=True),
+    sa.Column('word_count', sa.Integer(), nullable=True),
+    sa.Column('sentence_count', sa.Integer(), nullable=True),
+    sa.Column('paragraph_count', sa.Integer(), nullable=True),
+    sa.Column('features', sa.JSON(), nullable=True),
+    sa.Column('quality_score', sa.Float(), nullable=True),
+    sa.Column('is_validated', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['assignment_id'], ['assignments.id'], ),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+    sa.ForeignKeyConstraint(['style_id'], ['writing_styles.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('chat_messages',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('session_id', sa.String(), nullable=False),
+    sa.Column('role', sa.Enum('USER', 'ASSISTANT', 'SYSTEM', name='messagerole'), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('tokens_used', sa.Integer(), nullable=True),
+    sa.Column('model_used', sa.String(), nullable=True),
+    sa.Column('attachments', sa.JSON(), nullable=True),
+    sa.Column('citations', sa.JSON(), nullable=True),
+    sa.Column('helpful', sa.Boolean(), nullable=True),
+    sa.Column('feedback_text', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['session_id'], ['chat_sessions.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('chat_messages')
+    op.drop_table('writing_samples')
+    op.drop_table('material_chunks')
+    op.drop_table('chat_sessions')
+    op.drop_table('assignment_submissions')
+    op.drop_table('materials')
+    op.drop_table('class_enrollments')
+    op.drop_table('assignments')
+    op.drop_table('writing_styles')
+    op.drop_index(op.f('ix_user_profiles_user_id'), table_name='user_profiles')
+    op.drop_table('user_profiles')
+    op.drop_table('classes')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    sa.Enum(name='messagerole').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,63 @@
+"""
+Indexes for hot query paths
+
+Enrollment checks filter class_enrollments by (class_id, user_id, is_active)
+on nearly every request; chats, chunks and submissions are looked up by
+their parent IDs. On PostgreSQL the indexes are built CONCURRENTLY so the
+tables stay writable during the migration.
+
+The unique indexes fail if duplicate rows already exist; remove duplicate
+enrollments, submissions or chunks before upgrading.
+
+Revision ID: 0002
+Revises: 0001
+"""
+from alembic import op
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, unique)
+INDEXES = [
+    ('uq_class_enrollments_class_user', 'class_enrollments', ['class_id', 'user_id'], True),
+    ('ix_class_enrollments_user_active', 'class_enrollments', ['user_id', 'is_active'], False),
+    ('ix_materials_class_created', 'materials', ['class_id', 'created_at'], False),
+    ('uq_material_chunks_material_index', 'material_chunks', ['material_id', 'chunk_index'], True),
+    ('ix_material_chunks_material_page', 'material_chunks', ['material_id', 'page_number'], False),
+    ('ix_assignments_class_due', 'assignments', ['class_id', 'due_date'], False),
+    ('uq_assignment_submissions_assignment_user', 'assignment_submissions', ['assignment_id', 'user_id'], True),
+    ('ix_assignment_submissions_user_submitted', 'assignment_submissions', ['user_id', 'submitted_at'], False),
+    ('ix_chat_sessions_user_activity', 'chat_sessions', ['user_id', 'last_activity'], False),
+    ('ix_chat_sessions_class_user', 'chat_sessions', ['class_id', 'user_id'], False),
+    ('ix_chat_messages_session_created', 'chat_messages', ['session_id', 'created_at'], False),
+    ('ix_writing_styles_user_active', 'writing_styles', ['user_id', 'is_active'], False),
+    ('ix_writing_samples_style', 'writing_samples', ['style_id'], False),
+]
+
+
+def _is_postgres():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    if _is_postgres():
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with op.get_context().autocommit_block():
+            for name, table, columns, unique in INDEXES:
+                op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True)
+    else:
+        for name, table, columns, unique in INDEXES:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    if _is_postgres():
+        with op.get_context().autocommit_block():
+            for name, table, _, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
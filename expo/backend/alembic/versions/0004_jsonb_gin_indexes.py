@@ -0,0 +1,88 @@
+"""
+JSONB for material tags/metadata, session context and message citations
+
+On PostgreSQL the JSON columns are converted to JSONB and given GIN
+indexes (jsonb_path_ops where only containment is queried), so tag
+filters and "sessions referencing a material" become index lookups.
+Converting a column rewrites the table under an exclusive lock; the
+indexes are then built CONCURRENTLY. SQLite keeps JSON and gets plain
+indexes matching the models.
+
+Revision ID: 0004
+Revises: 0003
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# (table, column)
+COLUMNS = [
+    ('materials', 'tags'),
+    ('materials', 'metadata'),
+    ('chat_sessions', 'context_materials'),
+    ('chat_messages', 'citations'),
+]
+
+# (name, table, column, operator class)
+INDEXES = [
+    ('ix_materials_tags', 'materials', 'tags', 'jsonb_path_ops'),
+    ('ix_materials_metadata', 'materials', 'metadata', None),
+    ('ix_chat_sessions_context_materials', 'chat_sessions', 'context_materials', 'jsonb_path_ops'),
+    ('ix_chat_messages_citations', 'chat_messages', 'citations', 'jsonb_path_ops'),
+]
+
+
+def _is_postgres():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    if not _is_postgres():
+        for name, table, column, _ in INDEXES:
+            op.create_index(name, table, [column])
+        return
+
+    for table, column in COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=postgresql.JSONB(),
+            postgresql_using=f'"{column}"::jsonb'
+        )
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, column, ops in INDEXES:
+            op.create_index(
+                name,
+                table,
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: ops} if ops else {},
+                postgresql_concurrently=True
+            )
+
+
+def downgrade():
+    if not _is_postgres():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+    for table, column in COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.JSON(),
+            postgresql_using=f'"{column}"::json'
+        )
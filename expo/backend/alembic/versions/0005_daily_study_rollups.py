@@ -0,0 +1,102 @@
+"""
+Daily study rollups
+
+Per-user, per-class, per-day counters behind the study statistics. The
+table is backfilled from existing submissions, chat sessions and messages.
+Study minutes were only ever kept as running totals, so they have no
+per-day history and accumulate from this migration on.
+
+Revision ID: 0005
+Revises: 0004
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Each backfill query yields (user_id, class_id, day, counter...)
+BACKFILLS = [
+    (
+        ['assignments_completed'],
+        """
+        SELECT s.user_id, a.class_id, {day}, COUNT(*)
+        FROM assignment_submissions s JOIN assignments a ON a.id = s.assignment_id
+        WHERE s.status = 'completed' AND s.submitted_at IS NOT NULL
+        GROUP BY s.user_id, a.class_id, {day}
+        """,
+        's.submitted_at'
+    ),
+    (
+        ['scores_recorded', 'score_total'],
+        """
+        SELECT s.user_id, a.class_id, {day}, COUNT(*), SUM(s.score)
+        FROM assignment_submissions s JOIN assignments a ON a.id = s.assignment_id
+        WHERE s.score IS NOT NULL AND COALESCE(s.graded_at, s.submitted_at) IS NOT NULL
+        GROUP BY s.user_id, a.class_id, {day}
+        """,
+        'COALESCE(s.graded_at, s.submitted_at)'
+    ),
+    (
+        ['chat_sessions'],
+        """
+        SELECT cs.user_id, cs.class_id, {day}, COUNT(*)
+        FROM chat_sessions cs
+        WHERE cs.created_at IS NOT NULL
+        GROUP BY cs.user_id, cs.class_id, {day}
+        """,
+        'cs.created_at'
+    ),
+    (
+        ['chat_messages', 'tokens_used'],
+        """
+        SELECT cs.user_id, cs.class_id, {day}, COUNT(*), COALESCE(SUM(m.tokens_used), 0)
+        FROM chat_messages m JOIN chat_sessions cs ON cs.id = m.session_id
+        WHERE m.created_at IS NOT NULL
+        GROUP BY cs.user_id, cs.class_id, {day}
+        """,
+        'm.created_at'
+    ),
+]
+
+
+def _day_expression(column):
+    if op.get_bind().dialect.name == 'postgresql':
+        return f"CAST(timezone('UTC', {column}) AS DATE)"
+    return f"date({column})"
+
+
+def upgrade():
+    op.create_table(
+        'daily_study_rollups',
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('class_id', sa.String(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('study_minutes', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('assignments_completed', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('scores_recorded', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('score_total', sa.Float(), server_default='0', nullable=False),
+        sa.Column('chat_sessions', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('chat_messages', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('tokens_used', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'class_id', 'day')
+    )
+    op.create_index('ix_daily_study_rollups_class_day', 'daily_study_rollups', ['class_id', 'day'], unique=False)
+
+    for counters, query, timestamp in BACKFILLS:
+        columns = ', '.join(['user_id', 'class_id', 'day'] + counters)
+        updates = ', '.join(f'{name} = daily_study_rollups.{name} + excluded.{name}' for name in counters)
+        op.execute(
+            f"INSERT INTO daily_study_rollups ({columns}) "
+            f"{query.format(day=_day_expression(timestamp))} "
+            f"ON CONFLICT (user_id, class_id, day) DO UPDATE SET {updates}"
+        )
+
+
+def downgrade():
+    op.drop_index('ix_daily_study_rollups_class_day', table_name='daily_study_rollups')
+    op.drop_table('daily_study_rollups')
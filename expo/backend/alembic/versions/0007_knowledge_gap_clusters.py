@@ -0,0 +1,69 @@
+"""
+Knowledge-gap topic clusters
+
+Per-class topic clusters and per-user question counts maintained by the
+knowledge-gap job, a (timestamp, key) position on aggregation watermarks
+for sources keyed by UUID, and an index for scanning chat messages in
+creation order. On PostgreSQL the index is built CONCURRENTLY.
+
+Revision ID: 0007
+Revises: 0006
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def _is_postgres():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    op.add_column('aggregation_watermarks', sa.Column('last_event_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('aggregation_watermarks', sa.Column('last_event_key', sa.String(), nullable=True))
+    op.create_table(
+        'topic_clusters',
+        sa.Column('class_id', sa.String(), nullable=False),
+        sa.Column('cluster_index', sa.Integer(), nullable=False),
+        sa.Column('centroid', sa.LargeBinary(), nullable=False),
+        sa.Column('question_count', sa.Integer(), nullable=False),
+        sa.Column('label', sa.String(), nullable=False),
+        sa.Column('keywords', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+        sa.PrimaryKeyConstraint('class_id', 'cluster_index')
+    )
+    op.create_table(
+        'topic_question_counts',
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('class_id', sa.String(), nullable=False),
+        sa.Column('cluster_index', sa.Integer(), nullable=False),
+        sa.Column('question_count', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'class_id', 'cluster_index')
+    )
+
+    if _is_postgres():
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with op.get_context().autocommit_block():
+            op.create_index('ix_chat_messages_created', 'chat_messages', ['created_at', 'id'], postgresql_concurrently=True)
+    else:
+        op.create_index('ix_chat_messages_created', 'chat_messages', ['created_at', 'id'])
+
+
+def downgrade():
+    if _is_postgres():
+        with op.get_context().autocommit_block():
+            op.drop_index('ix_chat_messages_created', table_name='chat_messages', postgresql_concurrently=True)
+    else:
+        op.drop_index('ix_chat_messages_created', table_name='chat_messages')
+
+    op.drop_table('topic_question_counts')
+    op.drop_table('topic_clusters')
+    op.drop_column('aggregation_watermarks', 'last_event_key')
+    op.drop_column('aggregation_watermarks', 'last_event_at')
@@ -0,0 +1,35 @@
+"""
+Quantile sketches
+
+Serialized KLL sketches behind the percentile ranks in class progress.
+Populate them from existing grades with
+`python -m scripts.rebuild_quantile_sketches`.
+
+Revision ID: 0008
+Revises: 0007
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'quantile_sketches',
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('scope_id', sa.String(), nullable=False),
+        sa.Column('metric', sa.String(), nullable=False),
+        sa.Column('item_count', sa.BigInteger(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('scope', 'scope_id', 'metric')
+    )
+
+
+def downgrade():
+    op.drop_table('quantile_sketches')
@@ -0,0 +1,97 @@
+"""
+Hourly study rollups
+
+Per-user, per-class, per-hour counters behind the hourly time series. The
+last RETENTION_DAYS of chat messages and of already aggregated activity
+events are backfilled; older hours are pruned by the periodic
+analytics.prune_hourly_rollups task anyway.
+
+Revision ID: 0009
+Revises: 0008
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+# Matches the HOURLY_ROLLUP_RETENTION_DAYS default
+RETENTION_DAYS = 35
+
+# Each backfill query yields (user_id, class_id, hour, counter...)
+BACKFILLS = [
+    (
+        ['chat_messages', 'tokens_used'],
+        """
+        SELECT cs.user_id, cs.class_id, {hour}, COUNT(*), COALESCE(SUM(m.tokens_used), 0)
+        FROM chat_messages m JOIN chat_sessions cs ON cs.id = m.session_id
+        WHERE m.created_at >= {cutoff}
+        GROUP BY cs.user_id, cs.class_id, {hour}
+        """,
+        'm.created_at'
+    ),
+    (
+        # Events past the watermark are still to be folded in by the aggregator
+        ['study_minutes'],
+        """
+        SELECT e.user_id, COALESCE(e.class_id, ''), {hour}, SUM(e.duration_minutes)
+        FROM activity_events e
+        WHERE e.recorded_at >= {cutoff}
+          AND e.id <= COALESCE(
+              (SELECT w.last_event_id FROM aggregation_watermarks w WHERE w.name = 'activity_events'), 0
+          )
+        GROUP BY e.user_id, COALESCE(e.class_id, ''), {hour}
+        HAVING SUM(e.duration_minutes) > 0
+        """,
+        'e.recorded_at'
+    ),
+]
+
+
+def _is_postgres():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def _hour_expression(column):
+    if _is_postgres():
+        return f"date_trunc('hour', timezone('UTC', {column}))"
+    # The text format SQLAlchemy stores SQLite DateTime values in
+    return f"strftime('%Y-%m-%d %H:00:00.000000', {column})"
+
+
+def _cutoff():
+    if _is_postgres():
+        return f"now() - interval '{RETENTION_DAYS} days'"
+    return f"datetime('now', '-{RETENTION_DAYS} days')"
+
+
+def upgrade():
+    op.create_table(
+        'hourly_study_rollups',
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('hour', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('class_id', sa.String(), nullable=False),
+        sa.Column('study_minutes', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('chat_messages', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('tokens_used', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'hour', 'class_id')
+    )
+    op.create_index('ix_hourly_study_rollups_hour', 'hourly_study_rollups', ['hour'], unique=False)
+
+    for counters, query, timestamp in BACKFILLS:
+        columns = ', '.join(['user_id', 'class_id', 'hour'] + counters)
+        updates = ', '.join(f'{name} = hourly_study_rollups.{name} + excluded.{name}' for name in counters)
+        op.execute(
+            f"INSERT INTO hourly_study_rollups ({columns}) "
+            f"{query.format(hour=_hour_expression(timestamp), cutoff=_cutoff())} "
+            f"ON CONFLICT (user_id, hour, class_id) DO UPDATE SET {updates}"
+        )
+
+
+def downgrade():
+    op.drop_index('ix_hourly_study_rollups_hour', table_name='hourly_study_rollups')
+    op.drop_table('hourly_study_rollups')
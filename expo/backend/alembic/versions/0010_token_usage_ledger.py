@@ -0,0 +1,51 @@
+"""
+Token usage ledger
+
+LLM tokens per class, user, day and model, the source of token quota
+enforcement. Backfilled from the token counts of existing chat messages;
+messages without a recorded model are booked under ''.
+
+Revision ID: 0010
+Revises: 0009
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def _day_expression(column):
+    if op.get_bind().dialect.name == 'postgresql':
+        return f"CAST(timezone('UTC', {column}) AS DATE)"
+    return f"date({column})"
+
+
+def upgrade():
+    op.create_table(
+        'token_usage_ledger',
+        sa.Column('class_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('tokens', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('requests', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('class_id', 'user_id', 'day', 'model')
+    )
+
+    day = _day_expression('m.created_at')
+    op.execute(
+        "INSERT INTO token_usage_ledger (class_id, user_id, day, model, tokens, requests) "
+        f"SELECT cs.class_id, cs.user_id, {day}, COALESCE(m.model_used, ''), SUM(m.tokens_used), COUNT(*) "
+        "FROM chat_messages m JOIN chat_sessions cs ON cs.id = m.session_id "
+        "WHERE m.tokens_used > 0 AND m.created_at IS NOT NULL "
+        f"GROUP BY cs.class_id, cs.user_id, {day}, COALESCE(m.model_used, '')"
+    )
+
+
+def downgrade():
+    op.drop_table('token_usage_ledger')
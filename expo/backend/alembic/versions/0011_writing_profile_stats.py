@@ -0,0 +1,29 @@
+"""
+Writing profile statistics
+
+Streaming statistics of each writing style's samples, so adding or
+removing a sample updates the profile without re-reading the others.
+Existing styles have none yet; they are built once from the stored sample
+features the next time a sample is added or removed.
+
+Revision ID: 0011
+Revises: 0010
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('writing_styles', sa.Column('profile_stats', sa.JSON(), nullable=True))
+    op.add_column('writing_styles', sa.Column('phrase_sketch', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('writing_styles', 'phrase_sketch')
+    op.drop_column('writing_styles', 'profile_stats')
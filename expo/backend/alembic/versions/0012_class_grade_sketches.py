@@ -0,0 +1,31 @@
+"""
+Class grade sketches
+
+Class grade percentiles now rank a student's current grade among the
+current grades of the class, instead of among individual submission
+scores. The old per-submission class sketches are dropped; rebuild the
+new ones with `python -m scripts.rebuild_quantile_sketches`, or they fill
+in as grades are recorded.
+
+Revision ID: 0012
+Revises: 0011
+"""
+from alembic import op
+
+
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM quantile_sketches WHERE scope = 'class' AND metric = 'score_percent'"
+    )
+
+
+def downgrade():
+    op.execute(
+        "DELETE FROM quantile_sketches WHERE scope = 'class' AND metric = 'current_grade'"
+    )
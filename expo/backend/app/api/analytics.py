@@ -1,18 +1,43 @@
 """
 Analytics and progress tracking API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, and_
 from typing import Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-from app.core.database import get_async_session
-from app.models.user import User, UserProfile
+from app.core.database import get_read_session, replica_router
+from app.core.sketches import percentile_rank
+from app.models.user import User
 from app.models.class_model import ClassEnrollment
-from app.models.assignment import AssignmentSubmission
-from app.models.chat import ChatSession, ChatMessage
+from app.models.assignment import Assignment, AssignmentSubmission
+from app.models.chat import ChatSession
+from app.models.writing_style import WritingStyle
+from app.models.analytics import DailyStudyRollup
 from app.api.auth import get_current_user
+from app.api.deps import ClassAccess, get_class_access
+from app.services.activity_log import activity_buffer
+from app.services.analytics_cache import cached_json_response
+from app.services.class_analytics import (
+    EXPORT_FORMATS,
+    class_overview,
+    stream_csv,
+    stream_parquet,
+    student_export_query
+)
+from app.services.quantile_sketches import (
+    ASSIGNMENT,
+    CLASS,
+    CURRENT_GRADE,
+    SCORE_PERCENT,
+    STUDY_MINUTES,
+    load_sketches,
+    score_percent
+)
+from app.services.study_rollups import utc_day
+from app.services.study_timeseries import study_timeseries
 from app.schemas.analytics import (
     StudyStatsResponse,
     ClassProgressResponse,
@@ -24,11 +49,20 @@ router = APIRouter()
 
 @router.get("/study-stats", response_model=StudyStatsResponse)
 async def get_study_stats(
+    request: Request,
     time_range: str = "week",  # week, month, semester
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get overall study statistics for user"""
+    return await cached_json_response(
+        request,
+        (current_user.id, "study-stats", time_range),
+        lambda: _study_stats(db, current_user, time_range)
+    )
+
+
+async def _study_stats(db: AsyncSession, current_user: User, time_range: str) -> StudyStatsResponse:
     # Calculate date range
     now = datetime.utcnow()
     if time_range == "week":
@@ -38,82 +72,139 @@ async def get_study_stats(
     else:  # semester
         start_date = now - timedelta(days=120)
     
-    # Get study time from enrollments
-    enrollments = await db.execute(
-        select(ClassEnrollment)
+    # Sum the daily rollups in range; in-progress work and active classes
+    # are current state, counted through their indexes in the same query
+    in_progress = (
+        select(func.count(AssignmentSubmission.id))
+        .where(AssignmentSubmission.user_id == current_user.id)
+        .where(AssignmentSubmission.status == "in_progress")
+        .where(AssignmentSubmission.submitted_at >= start_date)
+        .scalar_subquery()
+    )
+    active_classes = (
+        select(func.count(ClassEnrollment.id))
         .where(ClassEnrollment.user_id == current_user.id)
         .where(ClassEnrollment.is_active == True)
+        .scalar_subquery()
     )
-    
-    total_study_minutes = sum([e.study_time_minutes for e in enrollments.scalars()])
-    
-    # Get assignment statistics
-    submissions = await db.execute(
-        select(AssignmentSubmission)
-        .where(AssignmentSubmission.user_id == current_user.id)
-        .where(AssignmentSubmission.submitted_at >= start_date)
+    totals = await db.execute(
+        select(
+            func.coalesce(func.sum(DailyStudyRollup.study_minutes), 0).label("study_minutes"),
+            func.coalesce(func.sum(DailyStudyRollup.assignments_completed), 0).label("assignments_completed"),
+            func.coalesce(func.sum(DailyStudyRollup.scores_recorded), 0).label("scores_recorded"),
+            func.coalesce(func.sum(DailyStudyRollup.score_total), 0).label("score_total"),
+            func.coalesce(func.sum(DailyStudyRollup.chat_sessions), 0).label("chat_sessions"),
+            func.coalesce(func.sum(DailyStudyRollup.chat_messages), 0).label("chat_messages"),
+            func.coalesce(func.sum(DailyStudyRollup.tokens_used), 0).label("tokens_used"),
+            in_progress.label("assignments_in_progress"),
+            active_classes.label("active_classes")
+        )
+        .where(DailyStudyRollup.user_id == current_user.id)
+        .where(DailyStudyRollup.day >= utc_day(start_date))
     )
-    
-    submissions_list = list(submissions.scalars())
-    assignments_completed = len([s for s in submissions_list if s.status == "completed"])
-    assignments_in_progress = len([s for s in submissions_list if s.status == "in_progress"])
+    stats = totals.one()
     
     # Calculate average score
-    graded_submissions = [s for s in submissions_list if s.score is not None]
     average_score = (
-        sum([s.score for s in graded_submissions]) / len(graded_submissions)
-        if graded_submissions else 0
+        stats.score_total / stats.scores_recorded
+        if stats.scores_recorded else 0
     )
     
-    # Get AI usage statistics
-    ai_sessions = await db.execute(
-        select(func.count(ChatSession.id))
-        .where(ChatSession.user_id == current_user.id)
-        .where(ChatSession.created_at >= start_date)
+    return StudyStatsResponse(
+        total_study_hours=stats.study_minutes / 60,
+        assignments_completed=stats.assignments_completed,
+        assignments_in_progress=stats.assignments_in_progress or 0,
+        average_score=average_score,
+        ai_sessions=stats.chat_sessions,
+        ai_messages=stats.chat_messages,
+        tokens_used=stats.tokens_used,
+        active_classes=stats.active_classes or 0,
+        time_range=time_range
     )
-    ai_session_count = ai_sessions.scalar()
+
+
+# Range returned when start is omitted, per bucket
+DEFAULT_TIMESERIES_SPANS = {
+    "hour": timedelta(days=2),
+    "day": timedelta(days=30),
+    "week": timedelta(weeks=26),
+}
+
+
+@router.get("/timeseries")
+async def get_study_timeseries(
+    request: Request,
+    metrics: str = "study_minutes,chat_messages,tokens_used",  # comma-separated rollup counters
+    bucket: str = "day",  # hour, day, week
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    class_id: Optional[str] = None,
+    max_points: int = 200,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_session)
+):
+    """
+    Get bucketed series of study metrics for charts.
     
-    # Get message count and tokens used
-    messages = await db.execute(
-        select(
-            func.count(ChatMessage.id),
-            func.sum(ChatMessage.tokens_used)
+    All metrics come back in one response, read from the pre-aggregated
+    rollups and downsampled to at most max_points points. Hour buckets
+    cover the last HOURLY_ROLLUP_RETENTION_DAYS days.
+    """
+    if bucket not in DEFAULT_TIMESERIES_SPANS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported bucket. Use one of: {', '.join(DEFAULT_TIMESERIES_SPANS)}"
         )
-        .join(ChatSession)
-        .where(ChatSession.user_id == current_user.id)
-        .where(ChatMessage.created_at >= start_date)
-    )
-    
-    message_count, total_tokens = messages.first()
+    if not 1 <= max_points <= 1000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="max_points must be between 1 and 1000"
+        )
+    metric_names = tuple(dict.fromkeys(name.strip() for name in metrics.split(",") if name.strip()))
     
-    # Get class count
-    active_classes = await db.execute(
-        select(func.count(ClassEnrollment.id))
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.is_active == True)
-    )
-    class_count = active_classes.scalar()
+    async def build():
+        range_end = end or datetime.now(timezone.utc)
+        range_start = start or range_end - DEFAULT_TIMESERIES_SPANS[bucket]
+        try:
+            return await study_timeseries(
+                db,
+                current_user.id,
+                metric_names,
+                bucket,
+                range_start,
+                range_end,
+                class_id=class_id,
+                max_points=max_points
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
     
-    return StudyStatsResponse(
-        total_study_hours=total_study_minutes / 60,
-        assignments_completed=assignments_completed,
-        assignments_in_progress=assignments_in_progress,
-        average_score=average_score,
-        ai_sessions=ai_session_count or 0,
-        ai_messages=message_count or 0,
-        tokens_used=total_tokens or 0,
-        active_classes=class_count or 0,
-        time_range=time_range
+    return await cached_json_response(
+        request,
+        (current_user.id, "timeseries", metric_names, bucket, start, end, class_id, max_points),
+        build
     )
 
 
 @router.get("/class/{class_id}/progress", response_model=ClassProgressResponse)
 async def get_class_progress(
+    request: Request,
     class_id: str,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get detailed progress for a specific class"""
+    return await cached_json_response(
+        request,
+        (current_user.id, "class-progress", class_id),
+        lambda: _class_progress(db, current_user, class_id)
+    )
+
+
+async def _class_progress(db: AsyncSession, current_user: User, class_id: str) -> ClassProgressResponse:
     # Verify enrollment
     enrollment = await db.execute(
         select(ClassEnrollment)
@@ -129,41 +220,72 @@ async def get_class_progress(
             detail="You are not enrolled in this class"
         )
     
-    # Get assignment progress
-    submissions = await db.execute(
-        select(AssignmentSubmission)
-        .join(Assignment)
+    # Aggregate assignment progress and chat activity in one round-trip
+    graded = and_(
+        AssignmentSubmission.score.isnot(None),
+        Assignment.total_points.isnot(None),
+        Assignment.total_points != 0
+    )
+    chat_sessions = (
+        select(func.count(ChatSession.id))
+        .where(ChatSession.class_id == class_id)
+        .where(ChatSession.user_id == current_user.id)
+        .scalar_subquery()
+    )
+    progress = await db.execute(
+        select(
+            func.count(AssignmentSubmission.id).label("total"),
+            func.count(AssignmentSubmission.id).filter(
+                AssignmentSubmission.status == "completed"
+            ).label("completed"),
+            func.count(AssignmentSubmission.id).filter(graded).label("graded"),
+            func.sum(AssignmentSubmission.score).filter(graded).label("earned"),
+            func.sum(Assignment.total_points).filter(graded).label("possible"),
+            chat_sessions.label("chat_sessions")
+        )
+        .select_from(AssignmentSubmission)
+        .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
         .where(Assignment.class_id == class_id)
         .where(AssignmentSubmission.user_id == current_user.id)
     )
-    
-    submissions_list = list(submissions.scalars())
+    stats = progress.one()
     
     # Calculate metrics
-    total_assignments = len(submissions_list)
-    completed_assignments = len([s for s in submissions_list if s.status == "completed"])
+    total_assignments = stats.total
+    completed_assignments = stats.completed
+    chat_count = stats.chat_sessions
     
     # Calculate grade
-    graded = [s for s in submissions_list if s.score is not None and s.assignment.total_points]
-    if graded:
-        total_earned = sum([s.score for s in graded])
-        total_possible = sum([s.assignment.total_points for s in graded])
-        current_grade = (total_earned / total_possible) * 100 if total_possible > 0 else 0
+    if stats.graded:
+        current_grade = (stats.earned / stats.possible) * 100 if stats.possible > 0 else 0
     else:
         current_grade = None
     
-    # Get chat activity
-    chat_sessions = await db.execute(
-        select(func.count(ChatSession.id))
-        .where(ChatSession.class_id == class_id)
-        .where(ChatSession.user_id == current_user.id)
-    )
-    chat_count = chat_sessions.scalar()
-    
     # Get topics and knowledge gaps from enrollment
     topics_covered = enrollment_obj.topics_covered or []
     knowledge_gaps = enrollment_obj.knowledge_gaps or []
     
+    # Percentile ranks from the class and assignment sketches
+    graded_submissions = (await db.execute(
+        select(Assignment.id, AssignmentSubmission.score, Assignment.total_points)
+        .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+        .where(Assignment.class_id == class_id)
+        .where(AssignmentSubmission.user_id == current_user.id)
+        .where(graded)
+    )).all()
+    sketches = await load_sketches(db, [
+        (CLASS, class_id, CURRENT_GRADE),
+        (CLASS, class_id, STUDY_MINUTES),
+        *((ASSIGNMENT, assignment_id, SCORE_PERCENT) for assignment_id, _, _ in graded_submissions)
+    ])
+    assignment_percentiles = {
+        assignment_id: percentile_rank(
+            sketches.get((ASSIGNMENT, assignment_id, SCORE_PERCENT)),
+            score_percent(score, total_points)
+        )
+        for assignment_id, score, total_points in graded_submissions
+    }
+    
     return ClassProgressResponse(
         class_id=class_id,
         enrollment_date=enrollment_obj.enrollment_date,
@@ -176,26 +298,106 @@ async def get_class_progress(
         chat_sessions=chat_count or 0,
         topics_covered=topics_covered,
         knowledge_gaps=knowledge_gaps,
-        ai_assistance_level=enrollment_obj.ai_assistance_level
+        ai_assistance_level=enrollment_obj.ai_assistance_level,
+        grade_percentile=percentile_rank(sketches.get((CLASS, class_id, CURRENT_GRADE)), current_grade),
+        study_time_percentile=percentile_rank(
+            sketches.get((CLASS, class_id, STUDY_MINUTES)),
+            enrollment_obj.study_time_minutes
+        ),
+        assignment_percentiles=assignment_percentiles
+    )
+
+
+@router.get("/class/{class_id}/overview")
+async def get_class_overview(
+    class_id: str,
+    access: ClassAccess = Depends(get_class_access),
+    db: AsyncSession = Depends(get_read_session)
+):
+    """Class-wide submission, AI assistance, token and study time analytics (instructor/TA only)"""
+    await access.require(
+        class_id,
+        roles=("instructor", "ta"),
+        active_only=False,
+        detail="Only instructors and TAs can view class analytics"
+    )
+    
+    return await class_overview(db, class_id)
+
+
+@router.get("/class/{class_id}/export")
+async def export_class_analytics(
+    class_id: str,
+    format: str = "csv",  # csv, parquet
+    access: ClassAccess = Depends(get_class_access)
+):
+    """
+    Export one row of analytics per enrolled student (instructor/TA only).
+    
+    Rows are streamed from a server-side cursor as they are encoded, so
+    memory stays bounded for large classes.
+    """
+    await access.require(
+        class_id,
+        roles=("instructor", "ta"),
+        active_only=False,
+        detail="Only instructors and TAs can export class analytics"
+    )
+    
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    media_type, extension = EXPORT_FORMATS[format]
+    encode = stream_parquet if format == "parquet" else stream_csv
+    
+    async def body():
+        # The request's session is closed before the response streams
+        async with replica_router.pick()() as db:
+            async for chunk in encode(db, student_export_query(class_id)):
+                yield chunk
+    
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="class-{class_id}-analytics.{extension}"'}
     )
 
 
 @router.get("/writing-analytics", response_model=WritingAnalyticsResponse)
 async def get_writing_analytics(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get writing style analytics for user"""
-    # Get writing styles
-    styles = await db.execute(
-        select(WritingStyle)
-        .where(WritingStyle.user_id == current_user.id)
-        .where(WritingStyle.is_active == True)
+    return await cached_json_response(
+        request,
+        (current_user.id, "writing-analytics"),
+        lambda: _writing_analytics(db, current_user)
     )
+
+
+async def _writing_analytics(db: AsyncSession, current_user: User) -> WritingAnalyticsResponse:
+    # Style profiles are kept up to date as samples change, so this only
+    # combines their stored columns
+    active_styles = and_(
+        WritingStyle.user_id == current_user.id,
+        WritingStyle.is_active == True
+    )
+    totals = (await db.execute(
+        select(
+            func.count(WritingStyle.id),
+            func.coalesce(func.sum(WritingStyle.sample_count), 0),
+            func.avg(func.coalesce(WritingStyle.vocabulary_complexity, 0)),
+            func.avg(func.coalesce(WritingStyle.formality_level, 0))
+        )
+        .where(active_styles)
+    )).one()
+    total_styles, total_samples, avg_complexity, avg_formality = totals
     
-    styles_list = list(styles.scalars())
-    
-    if not styles_list:
+    if not total_styles:
         return WritingAnalyticsResponse(
             total_styles=0,
             total_samples=0,
@@ -205,21 +407,15 @@ async def get_writing_analytics(
             improvement_suggestions=["Upload writing samples to create your first style profile"]
         )
     
-    # Calculate analytics
-    total_samples = sum([s.sample_count for s in styles_list])
-    avg_complexity = sum([s.vocabulary_complexity for s in styles_list if s.vocabulary_complexity]) / len(styles_list)
-    avg_formality = sum([s.formality_level for s in styles_list if s.formality_level]) / len(styles_list)
-    
-    # Get most common tones
-    all_tones = []
-    for style in styles_list:
-        if style.tone_attributes:
-            all_tones.extend(style.tone_attributes)
-    
     # Count tone frequencies
+    tones = await db.execute(
+        select(WritingStyle.tone_attributes)
+        .where(active_styles)
+    )
     tone_counts = {}
-    for tone in all_tones:
-        tone_counts[tone] = tone_counts.get(tone, 0) + 1
+    for tone_attributes in tones.scalars():
+        for tone in tone_attributes or []:
+            tone_counts[tone] = tone_counts.get(tone, 0) + 1
     
     most_common_tones = sorted(tone_counts.items(), key=lambda x: x[1], reverse=True)[:5]
     
@@ -233,7 +429,7 @@ async def get_writing_analytics(
         suggestions.append("Upload more writing samples for better style analysis")
     
     return WritingAnalyticsResponse(
-        total_styles=len(styles_list),
+        total_styles=total_styles,
         total_samples=total_samples,
         average_complexity=avg_complexity,
         average_formality=avg_formality,
@@ -248,30 +444,24 @@ async def track_activity(
     class_id: Optional[str] = None,
     duration_minutes: Optional[int] = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_session)
+    access: ClassAccess = Depends(get_class_access)
 ):
-    """Track user study activity"""
-    if class_id:
-        # Update class-specific study time
-        enrollment = await db.execute(
-            select(ClassEnrollment)
-            .where(ClassEnrollment.class_id == class_id)
-            .where(ClassEnrollment.user_id == current_user.id)
+    """
+    Track user study activity.
+    
+    The event is buffered and written to the activity log in batches;
+    study counters catch up when the aggregator folds it in.
+    """
+    if duration_minutes is not None and duration_minutes < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="duration_minutes cannot be negative"
         )
-        
-        enrollment_obj = enrollment.scalar()
-        if enrollment_obj and duration_minutes:
-            enrollment_obj.study_time_minutes += duration_minutes
-            await db.commit()
     
-    # Update user profile stats
-    profile = await db.execute(
-        select(UserProfile).where(UserProfile.user_id == current_user.id)
-    )
+    # Events feed the class's rollups, so only members may record against it
+    if class_id:
+        await access.require(class_id)
     
-    profile_obj = profile.scalar()
-    if profile_obj and duration_minutes:
-        profile_obj.total_study_hours += duration_minutes / 60
-        await db.commit()
+    await activity_buffer.record(current_user.id, class_id, activity_type, duration_minutes or 0)
     
-    return {"message": "Activity tracked successfully"}
\ No newline at end of file
+    return {"message": "Activity tracked successfully"}
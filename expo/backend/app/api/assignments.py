@@ -1,7 +1,7 @@
 """
 Assignment management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Body, Depends, HTTPException, status, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
@@ -12,14 +12,17 @@ import json
 from app.core.database import get_async_session
 from app.models.user import User
 from app.models.assignment import Assignment, AssignmentSubmission
-from app.models.class_model import ClassEnrollment, Class
+from app.models.class_model import Class
 from app.api.auth import get_current_user
+from app.api.deps import ClassAccess, get_class_access
 from app.schemas.assignment import (
     AssignmentCreate, AssignmentUpdate, AssignmentResponse,
     SubmissionCreate, SubmissionUpdate, SubmissionResponse
 )
 from app.services.file_service import FileService
-from app.services.video_processor import VideoProcessor
+from app.services.analytics_cache import invalidate_user_analytics
+from app.services.quantile_sketches import CURRENT_GRADE, mark_class_sketch_stale, record_grade, score_percent
+from app.services.study_rollups import bump_daily_rollup, utc_day
 from app.tasks import process_instruction_video
 
 router = APIRouter()
@@ -30,22 +33,12 @@ async def get_class_assignments(
     class_id: str,
     include_completed: bool = False,
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Get all assignments for a class"""
     # Verify enrollment
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.is_active == True)
-    )
-    
-    if not enrollment.scalar():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not enrolled in this class"
-        )
+    await access.require(class_id)
     
     # Get assignments
     query = select(Assignment).where(
@@ -73,23 +66,18 @@ async def get_class_assignments(
 async def create_assignment(
     assignment_data: AssignmentCreate,
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Create a new assignment (instructor/TA only)"""
     # Verify instructor/TA role
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == assignment_data.class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.role.in_(["instructor", "ta"]))
+    await access.require(
+        assignment_data.class_id,
+        roles=("instructor", "ta"),
+        active_only=False,
+        detail="Only instructors and TAs can create assignments"
     )
     
-    if not enrollment.scalar():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only instructors and TAs can create assignments"
-        )
-    
     # Create assignment
     assignment = Assignment(
         id=str(uuid.uuid4()),
@@ -121,6 +109,7 @@ async def upload_instruction_video(
     assignment_id: str,
     video: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Upload instruction video for assignment"""
@@ -133,16 +122,11 @@ async def upload_instruction_video(
         )
     
     # Verify permissions
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == assignment.class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.role.in_(["instructor", "ta"]))
-    )
-    
-    if not enrollment.scalar() and assignment.created_by != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
+    if assignment.created_by != current_user.id:
+        await access.require(
+            assignment.class_id,
+            roles=("instructor", "ta"),
+            active_only=False,
             detail="You don't have permission to upload instructions for this assignment"
         )
     
@@ -168,7 +152,7 @@ async def upload_instruction_video(
 @router.get("/{assignment_id}", response_model=AssignmentResponse)
 async def get_assignment(
     assignment_id: str,
-    current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Get specific assignment details"""
@@ -181,19 +165,11 @@ async def get_assignment(
         )
     
     # Verify enrollment
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == assignment.class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.is_active == True)
+    await access.require(
+        assignment.class_id,
+        detail="You don't have access to this assignment"
     )
     
-    if not enrollment.scalar():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't have access to this assignment"
-        )
-    
     return assignment
 
 
@@ -225,6 +201,7 @@ async def submit_assignment(
     assignment_id: str,
     submission_data: SubmissionCreate,
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Submit or update assignment submission"""
@@ -237,19 +214,7 @@ async def submit_assignment(
         )
     
     # Verify enrollment
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == assignment.class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.is_active == True)
-    )
-    
-    enrollment_obj = enrollment.scalar()
-    if not enrollment_obj:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not enrolled in this class"
-        )
+    membership = await access.require(assignment.class_id)
     
     # Check if submission exists
     existing = await db.execute(
@@ -259,6 +224,7 @@ async def submit_assignment(
     )
     
     submission = existing.scalar()
+    newly_completed = submission is None or submission.status != "completed"
     
     if submission:
         # Update existing submission
@@ -271,7 +237,7 @@ async def submit_assignment(
         
         # Track AI usage
         submission.ai_assistance_used = submission_data.ai_assistance_used
-        submission.ai_assistance_level = enrollment_obj.ai_assistance_level
+        submission.ai_assistance_level = membership.ai_assistance_level
         submission.ai_generated_percentage = submission_data.ai_generated_percentage
     else:
         # Create new submission
@@ -282,7 +248,7 @@ async def submit_assignment(
             content=submission_data.content,
             file_paths=submission_data.file_paths or [],
             ai_assistance_used=submission_data.ai_assistance_used,
-            ai_assistance_level=enrollment_obj.ai_assistance_level,
+            ai_assistance_level=membership.ai_assistance_level,
             ai_generated_percentage=submission_data.ai_generated_percentage,
             status="completed",
             submitted_at=datetime.utcnow(),
@@ -291,8 +257,79 @@ async def submit_assignment(
         
         db.add(submission)
     
+    if newly_completed:
+        await bump_daily_rollup(db, current_user.id, assignment.class_id, assignments_completed=1)
+    
+    await db.commit()
+    await db.refresh(submission)
+    await invalidate_user_analytics(current_user.id)
+    
+    return submission
+
+
+@router.put("/submissions/{submission_id}/grade", response_model=SubmissionResponse)
+async def grade_submission(
+    submission_id: str,
+    score: float = Body(...),
+    feedback: Optional[str] = Body(None),
+    current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Grade a submission or change its grade (instructor/TA only)"""
+    submission = await db.get(AssignmentSubmission, submission_id)
+    if not submission:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Submission not found"
+        )
+    
+    assignment = await db.get(Assignment, submission.assignment_id)
+    await access.require(
+        assignment.class_id,
+        roles=("instructor", "ta"),
+        active_only=False,
+        detail="Only instructors and TAs can grade submissions"
+    )
+    
+    if score < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Score cannot be negative"
+        )
+    
+    previous_score = submission.score
+    previous_graded_at = submission.graded_at
+    
+    submission.score = score
+    if feedback is not None:
+        submission.feedback = feedback
+    submission.graded_at = datetime.utcnow()
+    submission.graded_by = current_user.id
+    
+    # Rollups and percentile sketches
+    if previous_score is None:
+        await bump_daily_rollup(db, submission.user_id, assignment.class_id, scores_recorded=1, score_total=score)
+    else:
+        # Regrades correct the day the grade was first counted
+        await bump_daily_rollup(
+            db,
+            submission.user_id,
+            assignment.class_id,
+            day=utc_day(previous_graded_at) if previous_graded_at else None,
+            score_total=score - previous_score
+        )
+    await record_grade(
+        db,
+        assignment,
+        score_percent(score, assignment.total_points),
+        regraded=previous_score is not None
+    )
+    
     await db.commit()
     await db.refresh(submission)
+    await invalidate_user_analytics(submission.user_id)
+    await mark_class_sketch_stale(assignment.class_id, CURRENT_GRADE)
     
     return submission
 
@@ -303,9 +340,20 @@ async def update_submission_progress(
     progress_percentage: float,
     time_spent_minutes: int,
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Update submission progress (for tracking work in progress)"""
+    assignment = await db.get(Assignment, assignment_id)
+    if not assignment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Assignment not found"
+        )
+    
+    # Verify enrollment
+    await access.require(assignment.class_id)
+    
     # Get or create submission
     existing = await db.execute(
         select(AssignmentSubmission)
@@ -327,10 +375,16 @@ async def update_submission_progress(
         )
         db.add(submission)
     else:
+        newly_completed = progress_percentage >= 100 and submission.status != "completed"
         submission.progress_percentage = progress_percentage
         submission.time_spent_minutes = time_spent_minutes
         submission.status = "in_progress" if progress_percentage < 100 else "completed"
+        
+        # Counted once, like a submit; a later submit sees "completed" and skips it
+        if newly_completed:
+            await bump_daily_rollup(db, current_user.id, assignment.class_id, assignments_completed=1)
     
     await db.commit()
+    await invalidate_user_analytics(current_user.id)
     
     return {"message": "Progress updated", "progress": progress_percentage}
\ No newline at end of file
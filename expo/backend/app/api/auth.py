@@ -1,36 +1,34 @@
 """
 Authentication API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, or_
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
-from passlib.context import CryptContext
 
+from app.core.cache import MISSING, TTLCache, broadcast_invalidation
 from app.core.config import settings
 from app.core.database import get_async_session
+from app.core.passwords import get_password_hash, verify_password, verify_and_update_password
 from app.models.user import User
 from app.schemas.auth import Token, UserCreate, UserResponse, UserLogin
 
 router = APIRouter()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
+PRINCIPAL_CACHE = "principals"
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str) -> str:
-    """Hash password"""
-    return pwd_context.hash(password)
+# (user_id,) -> column values of the user's row
+principal_cache = TTLCache(
+    PRINCIPAL_CACHE,
+    maxsize=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -46,6 +44,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def create_user_token(user: User) -> str:
+    """Create an access token bound to the user's current token version"""
+    return create_access_token(data={"sub": str(user.id), "ver": user.token_version or 0})
+
+
+async def revoke_user_tokens(db: AsyncSession, user: User):
+    """Invalidate every token issued to a user so far"""
+    user.token_version = (user.token_version or 0) + 1
+    await db.commit()
+    await broadcast_invalidation(PRINCIPAL_CACHE, key=(user.id,))
+
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_async_session)
@@ -62,12 +72,26 @@ async def get_current_user(
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
+        # Tokens issued before versioning count as version 0
+        token_version = payload.get("ver", 0)
     except jwt.PyJWTError:
         raise credentials_exception
     
-    # Get user from database
-    user = await db.get(User, user_id)
-    if user is None:
+    # Get user from the principal cache, falling back to the database
+    values = principal_cache.get((user_id,))
+    if values is MISSING:
+        row = await db.get(User, user_id)
+        if row is None:
+            raise credentials_exception
+        values = {column.key: getattr(row, column.key) for column in User.__table__.columns}
+        principal_cache.set((user_id,), values)
+    
+    # A fresh unattached instance per request, so one request cannot
+    # change the user another request sees
+    user = User(**values)
+    
+    # Revoked or deactivated since the token was issued
+    if not user.is_active or user.token_version != token_version:
         raise credentials_exception
     
     return user
@@ -80,18 +104,20 @@ async def register(
 ):
     """Register new user"""
     # Check if user exists
-    existing_user = await db.query(User).filter(
-        (User.email == user_data.email) | (User.username == user_data.username)
-    ).first()
+    existing_user = await db.execute(
+        select(User.id)
+        .where(or_(User.email == user_data.email, User.username == user_data.username))
+        .limit(1)
+    )
     
-    if existing_user:
+    if existing_user.first():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this email or username already exists"
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     user = User(
         email=user_data.email,
         username=user_data.username,
@@ -114,19 +140,37 @@ async def login(
 ):
     """Login and get access token"""
     # Find user by username or email
-    user = await db.query(User).filter(
-        (User.username == form_data.username) | (User.email == form_data.username)
-    ).first()
+    result = await db.execute(
+        select(User)
+        .where(or_(User.username == form_data.username, User.email == form_data.username))
+        .limit(1)
+    )
+    user = result.scalar()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(
+        form_data.password,
+        user.hashed_password if user else None
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Upgrade hashes made with outdated rounds while the plaintext is at hand
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is deactivated"
+        )
+    
     # Create access token
-    access_token = create_access_token(data={"sub": str(user.id)})
+    access_token = create_user_token(user)
     
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -140,4 +184,67 @@ async def get_me(current_user: User = Depends(get_current_user)):
 @router.post("/logout")
 async def logout(current_user: User = Depends(get_current_user)):
     """Logout user (client should discard token)"""
-    return {"message": "Successfully logged out"}
\ No newline at end of file
+    return {"message": "Successfully logged out"}
+
+
+@router.post("/logout-all")
+async def logout_all(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Revoke every token issued to the current user"""
+    user = await db.get(User, current_user.id)
+    await revoke_user_tokens(db, user)
+    
+    return {"message": "All sessions have been logged out"}
+
+
+@router.post("/change-password", response_model=Token)
+async def change_password(
+    current_password: str = Body(...),
+    new_password: str = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Change password, revoking all existing tokens"""
+    user = await db.get(User, current_user.id)
+    
+    if not await verify_password(current_password, user.hashed_password):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Current password is incorrect"
+        )
+    
+    user.hashed_password = await get_password_hash(new_password)
+    await revoke_user_tokens(db, user)
+    
+    # Keep this client signed in with a token for the new version
+    access_token = create_user_token(user)
+    
+    return {"access_token": access_token, "token_type": "bearer"}
+
+
+@router.post("/users/{user_id}/deactivate")
+async def deactivate_user(
+    user_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Deactivate a user account and revoke its tokens (superusers, or users closing their own account)"""
+    if not current_user.is_superuser and current_user.id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to deactivate this user"
+        )
+    
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    user.is_active = False
+    await revoke_user_tokens(db, user)
+    
+    return {"message": "User deactivated"}
\ No newline at end of file
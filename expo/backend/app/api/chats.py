@@ -4,35 +4,61 @@ Chat API endpoints with AI integration
 from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 import uuid
 import json
 from datetime import datetime
 
+from app.core.config import settings
 from app.core.database import get_async_session
+from app.core.serialization import fast_list_response
 from app.models.user import User
 from app.models.chat import ChatSession, ChatMessage, MessageRole
-from app.models.class_model import ClassEnrollment
+from app.models.types import json_array_contains
 from app.api.auth import get_current_user
+from app.api.deps import ClassAccess, get_ai_service, get_class_access, get_vector_service
+from app.services.analytics_cache import invalidate_user_analytics
+from app.services.study_rollups import bump_daily_rollup
+from app.services.token_quota import REJECT, QuotaDecision, count_tokens, token_quotas
 from app.schemas.chat import ChatSessionCreate, ChatMessageCreate, ChatSessionResponse, ChatMessageResponse
-from app.services.ai_service import AIService
-from app.services.vector_service import VectorService
+
+if TYPE_CHECKING:
+    from app.services.ai_service import AIService
+    from app.services.vector_service import VectorService
 
 router = APIRouter()
 
+QUOTA_EXCEEDED_DETAILS = {
+    "class": "This class has used up its AI token budget",
+    "student": "You have used up your AI token budget for this class",
+}
+
+
+def _quota_exceeded(decision: QuotaDecision) -> HTTPException:
+    headers = {"Retry-After": str(decision.retry_after)} if decision.retry_after else None
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=QUOTA_EXCEEDED_DETAILS[decision.scope],
+        headers=headers
+    )
+
 
 @router.get("/sessions", response_model=List[ChatSessionResponse])
 async def get_chat_sessions(
     class_id: Optional[str] = None,
+    material_id: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session)
 ):
-    """Get all chat sessions for user, optionally filtered by class"""
+    """Get all chat sessions for user, optionally filtered by class or referenced material"""
     query = select(ChatSession).where(ChatSession.user_id == current_user.id)
     
     if class_id:
         query = query.where(ChatSession.class_id == class_id)
     
+    if material_id:
+        query = query.where(json_array_contains(ChatSession.context_materials, material_id))
+    
     result = await db.execute(query.order_by(ChatSession.last_activity.desc()))
     sessions = result.scalars().all()
     
@@ -43,22 +69,12 @@ async def get_chat_sessions(
 async def create_chat_session(
     session_data: ChatSessionCreate,
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Create a new chat session"""
     # Verify enrollment in class
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == session_data.class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.is_active == True)
-    )
-    
-    if not enrollment.scalar():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not enrolled in this class"
-        )
+    membership = await access.require(session_data.class_id)
     
     # Create session
     session = ChatSession(
@@ -69,13 +85,15 @@ async def create_chat_session(
         description=session_data.description,
         context_materials=session_data.context_materials or [],
         assignment_id=session_data.assignment_id,
-        ai_assistance_level=session_data.ai_assistance_level or enrollment.scalar().ai_assistance_level,
+        ai_assistance_level=session_data.ai_assistance_level or membership.ai_assistance_level,
         custom_instructions=session_data.custom_instructions
     )
     
     db.add(session)
+    await bump_daily_rollup(db, current_user.id, session_data.class_id, chat_sessions=1)
     await db.commit()
     await db.refresh(session)
+    await invalidate_user_analytics(current_user.id)
     
     return session
 
@@ -122,7 +140,7 @@ async def get_chat_messages(
         )
     
     # Get messages
-    result = await db.execute(
+    query = (
         select(ChatMessage)
         .where(ChatMessage.session_id == session_id)
         .order_by(ChatMessage.created_at.desc())
@@ -130,6 +148,11 @@ async def get_chat_messages(
         .offset(offset)
     )
     
+    if settings.FAST_LIST_SERIALIZATION:
+        # Return in chronological order
+        return await fast_list_response(db, query, ChatMessageResponse, reverse=True)
+    
+    result = await db.execute(query)
     messages = result.scalars().all()
     return list(reversed(messages))  # Return in chronological order
 
@@ -139,6 +162,8 @@ async def send_message(
     session_id: str,
     message_data: ChatMessageCreate,
     current_user: User = Depends(get_current_user),
+    ai_service: "AIService" = Depends(get_ai_service),
+    vector_service: "VectorService" = Depends(get_vector_service),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Send a message and get AI response"""
@@ -150,6 +175,13 @@ async def send_message(
             detail="Chat session not found"
         )
     
+    # Enforce token budgets before any LLM work (in-memory buckets)
+    quota = await token_quotas.check(db, session.class_id, current_user.id)
+    if quota.action == REJECT:
+        raise _quota_exceeded(quota)
+    # Over budget but within the overdraft: answer with the cheaper model
+    llm_options = {"model": quota.model} if quota.model else {}
+    
     # Create user message
     user_message = ChatMessage(
         id=str(uuid.uuid4()),
@@ -161,10 +193,6 @@ async def send_message(
     
     db.add(user_message)
     
-    # Get AI service
-    ai_service = AIService(db)
-    vector_service = VectorService()
-    
     # Get context from materials if specified
     context = ""
     if session.context_materials:
@@ -191,11 +219,20 @@ async def send_message(
     
     # Generate AI response
     ai_response = await ai_service.generate_response(
+        db=db,
         message=message_data.content,
         message_history=message_history,
         context=context,
         assistance_level=session.ai_assistance_level,
-        custom_instructions=session.custom_instructions
+        custom_instructions=session.custom_instructions,
+        **llm_options
+    )
+    tokens_used = ai_response.get("tokens_used", 0) or 0
+    token_quotas.consume(
+        session.class_id,
+        current_user.id,
+        ai_response.get("model") or quota.model or settings.OPENAI_MODEL,
+        tokens_used
     )
     
     # Create AI message
@@ -213,11 +250,20 @@ async def send_message(
     
     # Update session stats
     session.message_count += 2
-    session.total_tokens_used += ai_response.get("tokens_used", 0)
+    session.total_tokens_used += tokens_used
     session.last_activity = datetime.utcnow()
     
+    await bump_daily_rollup(
+        db,
+        current_user.id,
+        session.class_id,
+        chat_messages=2,
+        tokens_used=tokens_used
+    )
+    
     await db.commit()
     await db.refresh(ai_message)
+    await invalidate_user_analytics(current_user.id)
     
     return ai_message
 
@@ -226,6 +272,8 @@ async def send_message(
 async def websocket_chat(
     websocket: WebSocket,
     session_id: str,
+    ai_service: "AIService" = Depends(get_ai_service),
+    vector_service: "VectorService" = Depends(get_vector_service),
     db: AsyncSession = Depends(get_async_session)
 ):
     """WebSocket endpoint for real-time chat"""
@@ -241,14 +289,21 @@ async def websocket_chat(
             await websocket.close()
             return
         
-        ai_service = AIService(db)
-        vector_service = VectorService()
-        
         while True:
             # Receive message from client
             data = await websocket.receive_text()
             message_data = json.loads(data)
             
+            quota = await token_quotas.check(db, session.class_id, session.user_id)
+            if quota.action == REJECT:
+                await websocket.send_text(json.dumps({
+                    "type": "error",
+                    "error": QUOTA_EXCEEDED_DETAILS[quota.scope],
+                    "retry_after": quota.retry_after
+                }))
+                continue
+            llm_options = {"model": quota.model} if quota.model else {}
+            
             # Create user message
             user_message = ChatMessage(
                 id=str(uuid.uuid4()),
@@ -258,7 +313,9 @@ async def websocket_chat(
             )
             
             db.add(user_message)
+            await bump_daily_rollup(db, session.user_id, session.class_id, chat_messages=1)
             await db.commit()
+            await invalidate_user_analytics(session.user_id)
             
             # Send acknowledgment
             await websocket.send_text(json.dumps({
@@ -278,18 +335,52 @@ async def websocket_chat(
                 context = "\n\n".join([chunk.content for chunk in relevant_chunks])
             
             # Generate AI response (streaming)
-            async for chunk in ai_service.generate_streaming_response(
-                message=message_data["content"],
-                context=context,
-                assistance_level=session.ai_assistance_level
-            ):
-                await websocket.send_text(json.dumps({
-                    "type": "ai_chunk",
-                    "content": chunk
-                }))
+            model = quota.model or settings.OPENAI_MODEL
+            reply = []
+            try:
+                async for chunk in ai_service.generate_streaming_response(
+                    db=db,
+                    message=message_data["content"],
+                    context=context,
+                    assistance_level=session.ai_assistance_level,
+                    **llm_options
+                ):
+                    reply.append(chunk)
+                    await websocket.send_text(json.dumps({
+                        "type": "ai_chunk",
+                        "content": chunk
+                    }))
+            finally:
+                # Streams report no usage; meter what was generated, even if
+                # the client went away mid-stream
+                tokens_used = count_tokens(model, message_data["content"], context, "".join(reply))
+                token_quotas.consume(session.class_id, session.user_id, model, tokens_used)
             
             # Save complete AI response
-            # (Implementation depends on how streaming response is accumulated)
+            ai_message = ChatMessage(
+                id=str(uuid.uuid4()),
+                session_id=session_id,
+                role=MessageRole.ASSISTANT,
+                content="".join(reply),
+                tokens_used=tokens_used,
+                model_used=model
+            )
+            
+            db.add(ai_message)
+            
+            session.message_count += 2
+            session.total_tokens_used += tokens_used
+            session.last_activity = datetime.utcnow()
+            
+            await bump_daily_rollup(db, session.user_id, session.class_id, chat_messages=1, tokens_used=tokens_used)
+            await db.commit()
+            await invalidate_user_analytics(session.user_id)
+            
+            await websocket.send_text(json.dumps({
+                "type": "ai_message",
+                "id": ai_message.id,
+                "tokens_used": tokens_used
+            }))
             
     except WebSocketDisconnect:
         print(f"WebSocket disconnected for session {session_id}")
@@ -7,10 +7,14 @@ from sqlalchemy import select
 from typing import List
 import uuid
 
+from app.core.config import settings
 from app.core.database import get_async_session
+from app.core.serialization import fast_list_response
 from app.models.user import User
 from app.models.class_model import Class, ClassEnrollment
 from app.api.auth import get_current_user
+from app.api.deps import ClassAccess, get_class_access, invalidate_membership
+from app.services.analytics_cache import invalidate_user_analytics
 from app.schemas.classes import ClassCreate, ClassUpdate, ClassResponse, EnrollmentResponse
 
 router = APIRouter()
@@ -23,12 +27,17 @@ async def get_user_classes(
 ):
     """Get all classes for current user"""
     # Get user's enrollments
-    result = await db.execute(
+    query = (
         select(Class)
         .join(ClassEnrollment)
         .where(ClassEnrollment.user_id == current_user.id)
         .where(ClassEnrollment.is_active == True)
     )
+    
+    if settings.FAST_LIST_SERIALIZATION:
+        return await fast_list_response(db, query, ClassResponse)
+    
+    result = await db.execute(query)
     classes = result.scalars().all()
     
     return classes
@@ -77,22 +86,12 @@ async def create_class(
 @router.get("/{class_id}", response_model=ClassResponse)
 async def get_class(
     class_id: str,
-    current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Get specific class details"""
     # Check enrollment
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-    )
-    
-    if not enrollment.scalar():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not enrolled in this class"
-        )
+    await access.require(class_id, active_only=False)
     
     # Get class
     class_obj = await db.get(Class, class_id)
@@ -110,6 +109,7 @@ async def update_class(
     class_id: str,
     class_data: ClassUpdate,
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Update class information"""
@@ -123,18 +123,12 @@ async def update_class(
     
     # Check if user is creator or has appropriate role
     if class_obj.created_by != current_user.id:
-        enrollment = await db.execute(
-            select(ClassEnrollment)
-            .where(ClassEnrollment.class_id == class_id)
-            .where(ClassEnrollment.user_id == current_user.id)
-            .where(ClassEnrollment.role.in_(["instructor", "ta"]))
+        await access.require(
+            class_id,
+            roles=("instructor", "ta"),
+            active_only=False,
+            detail="You don't have permission to update this class"
         )
-        
-        if not enrollment.scalar():
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to update this class"
-            )
     
     # Update fields
     for field, value in class_data.dict(exclude_unset=True).items():
@@ -175,10 +169,15 @@ async def delete_class(
     enrollments = await db.execute(
         select(ClassEnrollment).where(ClassEnrollment.class_id == class_id)
     )
+    enrolled_user_ids = []
     for enrollment in enrollments.scalars():
         enrollment.is_active = False
+        enrolled_user_ids.append(enrollment.user_id)
     
     await db.commit()
+    await invalidate_membership(class_id)
+    for user_id in enrolled_user_ids:
+        await invalidate_user_analytics(user_id)
     
     return {"message": "Class deleted successfully"}
 
@@ -224,6 +223,8 @@ async def enroll_in_class(
     db.add(enrollment)
     await db.commit()
     await db.refresh(enrollment)
+    await invalidate_membership(class_id, current_user.id)
+    await invalidate_user_analytics(current_user.id)
     
     return enrollment
 
@@ -252,5 +253,7 @@ async def unenroll_from_class(
     # Soft delete enrollment
     enrollment.is_active = False
     await db.commit()
+    await invalidate_membership(class_id, current_user.id)
+    await invalidate_user_analytics(current_user.id)
     
     return {"message": "Successfully unenrolled from class"}
\ No newline at end of file
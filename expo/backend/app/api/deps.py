@@ -0,0 +1,129 @@
+"""
+Shared API dependencies
+"""
+from dataclasses import dataclass
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+
+from app.core.cache import MISSING, TTLCache, broadcast_invalidation
+from app.core.config import settings
+from app.core.database import get_async_session
+from app.core.services import services
+from app.models.user import User
+from app.models.class_model import ClassEnrollment
+from app.api.auth import get_current_user
+
+if TYPE_CHECKING:
+    from app.services.ai_service import AIService
+    from app.services.vector_service import VectorService
+
+MEMBERSHIP_CACHE = "class_membership"
+
+# (class_id, user_id) -> ClassMembership, or None if not enrolled
+membership_cache = TTLCache(
+    MEMBERSHIP_CACHE,
+    maxsize=settings.ENROLLMENT_CACHE_MAX_ENTRIES,
+    ttl=settings.ENROLLMENT_CACHE_TTL_SECONDS
+)
+
+
+@dataclass(frozen=True)
+class ClassMembership:
+    """The parts of an enrollment needed for authorization"""
+    class_id: str
+    user_id: str
+    role: str
+    is_active: bool
+    ai_assistance_level: Optional[str]
+
+
+class ClassAccess:
+    """
+    Resolves the current user's membership in classes.
+
+    Results are memoized for the request and shared across requests through
+    membership_cache, so most checks never reach the database.
+    """
+
+    def __init__(self, db: AsyncSession, user: User):
+        self.db = db
+        self.user = user
+        self._memo: Dict[str, Optional[ClassMembership]] = {}
+
+    async def membership(self, class_id: str) -> Optional[ClassMembership]:
+        """Get the user's enrollment in a class (active or not), or None"""
+        if class_id in self._memo:
+            return self._memo[class_id]
+
+        key = (class_id, self.user.id)
+        membership = membership_cache.get(key)
+        if membership is MISSING:
+            result = await self.db.execute(
+                select(
+                    ClassEnrollment.role,
+                    ClassEnrollment.is_active,
+                    ClassEnrollment.ai_assistance_level
+                )
+                .where(ClassEnrollment.class_id == class_id)
+                .where(ClassEnrollment.user_id == self.user.id)
+            )
+            row = result.first()
+            membership = ClassMembership(
+                class_id=class_id,
+                user_id=self.user.id,
+                role=row.role,
+                is_active=row.is_active,
+                ai_assistance_level=row.ai_assistance_level
+            ) if row else None
+            membership_cache.set(key, membership)
+
+        self._memo[class_id] = membership
+        return membership
+
+    async def require(
+        self,
+        class_id: str,
+        roles: Optional[Iterable[str]] = None,
+        active_only: bool = True,
+        detail: str = "You are not enrolled in this class"
+    ) -> ClassMembership:
+        """Return the user's membership or raise 403 if it does not qualify"""
+        membership = await self.membership(class_id)
+        if (
+            membership is None
+            or (active_only and not membership.is_active)
+            or (roles is not None and membership.role not in roles)
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=detail
+            )
+        return membership
+
+
+def get_class_access(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+) -> ClassAccess:
+    """Dependency providing the request's ClassAccess resolver"""
+    return ClassAccess(db, current_user)
+
+
+async def invalidate_membership(class_id: str, user_id: Optional[str] = None):
+    """Drop cached memberships for one user in a class, or for the whole class"""
+    if user_id is not None:
+        await broadcast_invalidation(MEMBERSHIP_CACHE, key=(class_id, user_id))
+    else:
+        await broadcast_invalidation(MEMBERSHIP_CACHE, prefix=(class_id,))
+
+
+def get_ai_service() -> "AIService":
+    """Dependency providing the application-scoped AIService"""
+    return services.ai_service
+
+
+def get_vector_service() -> "VectorService":
+    """Dependency providing the application-scoped VectorService"""
+    return services.vector_service
@@ -1,24 +1,44 @@
 """
 Material upload and management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
 import uuid
 import os
+import json
+import mimetypes
 from pathlib import Path
 
-from app.core.database import get_async_session
+from app.core.database import get_async_session, async_session_maker
 from app.core.config import settings
+from app.core.redis import get_async_redis
+from app.core.http_cache import make_etag, etag_matches, if_range_matches
+from app.core.serialization import fast_list_response
 from app.models.user import User
 from app.models.material import Material, MaterialChunk
-from app.models.class_model import ClassEnrollment
+from app.models.chat import ChatSession
+from app.models.types import json_array_contains
 from app.api.auth import get_current_user
-from app.schemas.material import MaterialResponse, MaterialChunkResponse
+from app.api.deps import ClassAccess, get_class_access
+from app.schemas.material import MaterialResponse
 from app.services.file_service import FileService
-from app.services.document_processor import DocumentProcessor
-from app.tasks import process_material_async
+from app.services.content_delivery import (
+    FileRangeResponse,
+    RangeNotSatisfiable,
+    accel_redirect_path,
+    compute_content_hash,
+    is_object_storage_path,
+    parse_range,
+    presigned_url,
+    resolve_local_path
+)
+from app.services.material_scheduler import get_class_queue_stats
+from app.services.processing_progress import TERMINAL_STATUSES, clear_cancel, progress_events, request_cancel
+from app.tasks import cancel_material_processing, enqueue_material
 
 router = APIRouter()
 
@@ -26,35 +46,52 @@ router = APIRouter()
 @router.get("/class/{class_id}", response_model=List[MaterialResponse])
 async def get_class_materials(
     class_id: str,
-    current_user: User = Depends(get_current_user),
+    tag: Optional[str] = None,
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
-    """Get all materials for a class"""
+    """Get all materials for a class, optionally only those with a tag"""
     # Verify enrollment
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.is_active == True)
-    )
-    
-    if not enrollment.scalar():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not enrolled in this class"
-        )
+    await access.require(class_id)
     
     # Get materials
-    result = await db.execute(
+    query = (
         select(Material)
         .where(Material.class_id == class_id)
         .order_by(Material.created_at.desc())
     )
     
+    if tag:
+        query = query.where(json_array_contains(Material.tags, tag))
+    
+    if settings.FAST_LIST_SERIALIZATION:
+        return await fast_list_response(db, query, MaterialResponse)
+    
+    result = await db.execute(query)
     materials = result.scalars().all()
     return materials
 
 
+@router.get("/class/{class_id}/queue")
+async def get_class_processing_queue(
+    class_id: str,
+    access: ClassAccess = Depends(get_class_access),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Get processing queue depth and wait-time metrics for a class"""
+    # Verify enrollment
+    await access.require(class_id)
+    
+    stats = await get_class_queue_stats(get_async_redis(), class_id)
+    return {
+        "class_id": stats.class_id,
+        "pending": stats.pending,
+        "dispatched": stats.dispatched,
+        "average_wait_seconds": stats.average_wait_seconds,
+        "max_wait_seconds": stats.max_wait_seconds
+    }
+
+
 @router.post("/upload", response_model=MaterialResponse)
 async def upload_material(
     class_id: str = Form(...),
@@ -62,22 +99,12 @@ async def upload_material(
     description: Optional[str] = Form(None),
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Upload a new material"""
     # Verify enrollment
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.is_active == True)
-    )
-    
-    if not enrollment.scalar():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not enrolled in this class"
-        )
+    await access.require(class_id)
     
     # Validate file
     file_extension = Path(file.filename).suffix.lower()[1:]
@@ -119,8 +146,8 @@ async def upload_material(
     await db.commit()
     await db.refresh(material)
     
-    # Queue for processing
-    process_material_async.delay(material.id)
+    # Queue for processing behind the fair-share scheduler
+    enqueue_material.delay(material.id, class_id, current_user.id, material.file_size)
     
     return material
 
@@ -128,7 +155,7 @@ async def upload_material(
 @router.get("/{material_id}", response_model=MaterialResponse)
 async def get_material(
     material_id: str,
-    current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Get specific material details"""
@@ -141,26 +168,192 @@ async def get_material(
         )
     
     # Verify enrollment in class
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == material.class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.is_active == True)
+    await access.require(
+        material.class_id,
+        detail="You don't have access to this material"
+    )
+    
+    return material
+
+
+@router.api_route("/{material_id}/content", methods=["GET", "HEAD"])
+async def download_material_content(
+    material_id: str,
+    request: Request,
+    access: ClassAccess = Depends(get_class_access),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Download material file contents (supports Range and If-None-Match)"""
+    material = await db.get(Material, material_id)
+    
+    if not material:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Material not found"
+        )
+    
+    # Verify enrollment in class
+    await access.require(
+        material.class_id,
+        detail="You don't have access to this material"
     )
     
-    if not enrollment.scalar():
+    # Object storage serves ranges and caching itself
+    if is_object_storage_path(material.file_path):
+        url = await run_in_threadpool(presigned_url, material.file_path)
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+    
+    path = resolve_local_path(material.file_path)
+    if not path.is_file():
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't have access to this material"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Material file not found"
         )
     
-    return material
+    # Materials uploaded before hashing was added get hashed on first download
+    if not material.content_hash:
+        material.content_hash = await run_in_threadpool(compute_content_hash, path)
+        await db.commit()
+    
+    etag = make_etag(material.content_hash)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache"
+    }
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    file_size = path.stat().st_size
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    headers["Content-Disposition"] = f'inline; filename="{path.name}"'
+    
+    accel_path = accel_redirect_path(path)
+    if accel_path:
+        # nginx serves the file with sendfile and applies the Range header itself
+        headers["X-Accel-Redirect"] = accel_path
+        return Response(headers=headers, media_type=media_type)
+    
+    byte_range = None
+    if if_range_matches(request.headers.get("if-range"), etag):
+        try:
+            byte_range = parse_range(request.headers.get("range"), file_size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{file_size}"}
+            )
+    
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+    else:
+        start, end = 0, file_size - 1
+        status_code = status.HTTP_200_OK
+    
+    return FileRangeResponse(
+        path,
+        start,
+        end,
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type
+    )
+
+
+@router.get("/{material_id}/progress")
+async def stream_material_progress(
+    material_id: str,
+    access: ClassAccess = Depends(get_class_access),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Stream processing progress as Server-Sent Events"""
+    material = await db.get(Material, material_id)
+    
+    if not material:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Material not found"
+        )
+    
+    # Verify enrollment in class
+    await access.require(
+        material.class_id,
+        detail="You don't have access to this material"
+    )
+    
+    current_status = material.processing_status
+    
+    async def event_stream():
+        # Nothing left to watch, report the final state once
+        if current_status in TERMINAL_STATUSES:
+            event = {
+                "material_id": material_id,
+                "status": current_status,
+                "stage": current_status,
+                "percent": 100.0 if current_status == "completed" else 0.0
+            }
+            yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            return
+        
+        async for event in progress_events(get_async_redis(), material_id):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/{material_id}/cancel")
+async def cancel_material(
+    material_id: str,
+    current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Cancel pending or in-flight processing of a material"""
+    material = await db.get(Material, material_id)
+    
+    if not material:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Material not found"
+        )
+    
+    # Check if user is uploader or has appropriate permissions
+    if material.uploaded_by != current_user.id:
+        await access.require(
+            material.class_id,
+            roles=("instructor", "ta"),
+            active_only=False,
+            detail="You don't have permission to cancel processing of this material"
+        )
+    
+    if material.processing_status in TERMINAL_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Material processing already {material.processing_status}"
+        )
+    
+    # Running workers stop at their next checkpoint; queued ones are dropped
+    await request_cancel(get_async_redis(), material_id)
+    cancel_material_processing.delay(material_id)
+    
+    return {"message": "Cancellation requested"}
 
 
 @router.delete("/{material_id}")
 async def delete_material(
     material_id: str,
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Delete a material"""
@@ -174,23 +367,28 @@ async def delete_material(
     
     # Check if user is uploader or has appropriate permissions
     if material.uploaded_by != current_user.id:
-        enrollment = await db.execute(
-            select(ClassEnrollment)
-            .where(ClassEnrollment.class_id == material.class_id)
-            .where(ClassEnrollment.user_id == current_user.id)
-            .where(ClassEnrollment.role.in_(["instructor", "ta"]))
+        await access.require(
+            material.class_id,
+            roles=("instructor", "ta"),
+            active_only=False,
+            detail="You don't have permission to delete this material"
         )
-        
-        if not enrollment.scalar():
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to delete this material"
-            )
     
     # Delete file
     file_service = FileService()
     await file_service.delete_file(material.file_path)
     
+    # Drop the material from chat sessions that reference it
+    sessions = await db.execute(
+        select(ChatSession)
+        .where(json_array_contains(ChatSession.context_materials, material_id))
+    )
+    for session in sessions.scalars():
+        session.context_materials = [
+            context_id for context_id in session.context_materials
+            if context_id != material_id
+        ]
+    
     # Delete from database
     await db.delete(material)
     await db.commit()
@@ -198,14 +396,54 @@ async def delete_material(
     return {"message": "Material deleted successfully"}
 
 
-@router.get("/{material_id}/chunks", response_model=List[MaterialChunkResponse])
+# Columns that may be requested through the `fields` projection
+CHUNK_FIELDS = {
+    "id": MaterialChunk.id,
+    "material_id": MaterialChunk.material_id,
+    "content": MaterialChunk.content,
+    "chunk_index": MaterialChunk.chunk_index,
+    "page_number": MaterialChunk.page_number,
+    "start_time": MaterialChunk.start_time,
+    "end_time": MaterialChunk.end_time,
+    "embedding_id": MaterialChunk.embedding_id,
+    "embedding_model": MaterialChunk.embedding_model,
+    "created_at": MaterialChunk.created_at
+}
+
+CHUNK_STREAM_BATCH_SIZE = 500
+
+
+def _json_default(value):
+    """Serialize values the json module does not handle (datetimes)"""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+@router.get("/{material_id}/chunks")
 async def get_material_chunks(
     material_id: str,
     page: Optional[int] = None,
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
-    """Get processed chunks of a material"""
+    """
+    Stream processed chunks of a material as NDJSON (one chunk per line).
+
+    `fields` is an optional comma-separated projection, e.g. "chunk_index,content".
+    """
+    if fields:
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in requested if name not in CHUNK_FIELDS]
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown chunk fields: {', '.join(unknown)}" if unknown else "No fields requested"
+            )
+    else:
+        requested = list(CHUNK_FIELDS)
+    
     # Verify access to material
     material = await db.get(Material, material_id)
     if not material:
@@ -214,37 +452,43 @@ async def get_material_chunks(
             detail="Material not found"
         )
     
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == material.class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.is_active == True)
+    await access.require(
+        material.class_id,
+        detail="You don't have access to this material"
     )
     
-    if not enrollment.scalar():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't have access to this material"
-        )
-    
-    # Get chunks
-    query = select(MaterialChunk).where(MaterialChunk.material_id == material_id)
+    # Select plain columns; no ORM objects are built for the rows
+    query = (
+        select(*[CHUNK_FIELDS[name] for name in requested])
+        .where(MaterialChunk.material_id == material_id)
+    )
     
     if page is not None:
         query = query.where(MaterialChunk.page_number == page)
     
-    query = query.order_by(MaterialChunk.chunk_index)
-    
-    result = await db.execute(query)
-    chunks = result.scalars().all()
+    query = query.order_by(MaterialChunk.chunk_index).execution_options(
+        yield_per=CHUNK_STREAM_BATCH_SIZE
+    )
     
-    return chunks
+    async def chunk_stream():
+        # The request-scoped session is closed before the body is sent, so
+        # the server-side cursor gets its own session for the stream's lifetime
+        async with async_session_maker() as stream_db:
+            result = await stream_db.stream(query)
+            async for rows in result.partitions():
+                yield "".join(
+                    json.dumps(dict(zip(requested, row)), default=_json_default) + "\n"
+                    for row in rows
+                )
+    
+    return StreamingResponse(chunk_stream(), media_type="application/x-ndjson")
 
 
 @router.post("/{material_id}/reprocess")
 async def reprocess_material(
     material_id: str,
     current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Reprocess a material (re-extract text, create embeddings, etc.)"""
@@ -257,19 +501,13 @@ async def reprocess_material(
         )
     
     # Verify permissions
-    enrollment = await db.execute(
-        select(ClassEnrollment)
-        .where(ClassEnrollment.class_id == material.class_id)
-        .where(ClassEnrollment.user_id == current_user.id)
-        .where(ClassEnrollment.role.in_(["instructor", "ta", "student"]))
+    await access.require(
+        material.class_id,
+        roles=("instructor", "ta", "student"),
+        active_only=False,
+        detail="You don't have permission to reprocess this material"
     )
     
-    if not enrollment.scalar():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't have permission to reprocess this material"
-        )
-    
     # Reset processing status
     material.is_processed = False
     material.processing_status = "pending"
@@ -282,7 +520,8 @@ async def reprocess_material(
     
     await db.commit()
     
-    # Queue for reprocessing
-    process_material_async.delay(material_id)
+    # Queue for reprocessing; an earlier cancel no longer applies
+    await clear_cancel(get_async_redis(), material_id)
+    enqueue_material.delay(material_id, material.class_id, current_user.id, material.file_size)
     
     return {"message": "Material queued for reprocessing"}
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+Writing style and writing sample API endpoints
+"""
+from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional
+from pathlib import Path
+import uuid
+
+from app.core.config import settings
+from app.core.database import get_async_session
+from app.models.user import User
+from app.models.writing_style import WritingStyle, WritingSample
+from app.api.auth import get_current_user
+from app.api.deps import ClassAccess, get_class_access
+from app.services.analytics_cache import invalidate_user_analytics
+from app.services.writing_profiles import add_samples, remove_sample
+
+router = APIRouter()
+
+# Samples are read as plain text
+SAMPLE_EXTENSIONS = {"txt", "md"}
+
+STYLE_FIELDS = (
+    "id",
+    "name",
+    "description",
+    "vocabulary_complexity",
+    "sentence_length_avg",
+    "sentence_length_std",
+    "formality_level",
+    "technical_level",
+    "common_phrases",
+    "transition_words",
+    "vocabulary_preferences",
+    "grammar_patterns",
+    "punctuation_style",
+    "paragraph_length_avg",
+    "paragraph_structure",
+    "tone_attributes",
+    "voice_type",
+    "sample_count",
+    "last_trained",
+    "training_status",
+    "is_default",
+    "is_active",
+    "created_at"
+)
+
+SAMPLE_FIELDS = (
+    "id",
+    "style_id",
+    "title",
+    "source_type",
+    "class_id",
+    "assignment_id",
+    "word_count",
+    "sentence_count",
+    "paragraph_count",
+    "features",
+    "created_at"
+)
+
+
+def _as_dict(row, fields) -> dict:
+    return {field: getattr(row, field) for field in fields}
+
+
+async def _get_style(db: AsyncSession, style_id: str, current_user: User) -> WritingStyle:
+    style = await db.get(WritingStyle, style_id)
+    if not style or style.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Writing style not found"
+        )
+    return style
+
+
+@router.get("/styles")
+async def get_writing_styles(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Get the user's writing styles"""
+    result = await db.execute(
+        select(WritingStyle)
+        .where(WritingStyle.user_id == current_user.id)
+        .order_by(WritingStyle.created_at)
+    )
+    return [_as_dict(style, STYLE_FIELDS) for style in result.scalars()]
+
+
+@router.post("/styles")
+async def create_writing_style(
+    name: str = Body(...),
+    description: Optional[str] = Body(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Create an empty writing style to upload samples to"""
+    style = WritingStyle(
+        id=str(uuid.uuid4()),
+        user_id=current_user.id,
+        name=name,
+        description=description
+    )
+
+    db.add(style)
+    await db.commit()
+    await db.refresh(style)
+    await invalidate_user_analytics(current_user.id)
+
+    return _as_dict(style, STYLE_FIELDS)
+
+
+@router.get("/styles/{style_id}")
+async def get_writing_style(
+    style_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Get a writing style with its aggregated features"""
+    style = await _get_style(db, style_id, current_user)
+    return _as_dict(style, STYLE_FIELDS)
+
+
+@router.post("/styles/{style_id}/samples")
+async def upload_writing_samples(
+    style_id: str,
+    files: List[UploadFile] = File(...),
+    source_type: Optional[str] = Form(None),
+    class_id: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user),
+    access: ClassAccess = Depends(get_class_access),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """
+    Upload a batch of plain-text writing samples to a style.
+
+    Features of the whole batch are extracted together in the stylometry
+    process pool, and the style's profile is updated once.
+    """
+    style = await _get_style(db, style_id, current_user)
+
+    if class_id:
+        await access.require(class_id)
+
+    if len(files) > settings.WRITING_SAMPLE_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.WRITING_SAMPLE_MAX_FILES} samples can be uploaded at once"
+        )
+
+    uploads = []
+    for file in files:
+        file_extension = Path(file.filename or "").suffix.lower()[1:]
+        if file_extension not in SAMPLE_EXTENSIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File type {file_extension} not allowed for writing samples"
+            )
+        data = await file.read(settings.WRITING_SAMPLE_MAX_BYTES + 1)
+        if len(data) > settings.WRITING_SAMPLE_MAX_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{file.filename} exceeds the maximum sample size of {settings.WRITING_SAMPLE_MAX_BYTES // 1024}KB"
+            )
+        try:
+            content = data.decode("utf-8")
+        except UnicodeDecodeError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{file.filename} is not UTF-8 text"
+            )
+        uploads.append({
+            "title": Path(file.filename).stem,
+            "content": content,
+            "source_type": source_type,
+            "class_id": class_id
+        })
+
+    samples = await add_samples(db, style, uploads)
+    await db.commit()
+    await invalidate_user_analytics(current_user.id)
+
+    return {
+        "style": _as_dict(style, STYLE_FIELDS),
+        "samples": [_as_dict(sample, SAMPLE_FIELDS) for sample in samples]
+    }
+
+
+@router.delete("/styles/{style_id}/samples/{sample_id}")
+async def delete_writing_sample(
+    style_id: str,
+    sample_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Delete a writing sample and update its style"""
+    style = await _get_style(db, style_id, current_user)
+
+    sample = await db.get(WritingSample, sample_id)
+    if not sample or sample.style_id != style.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Writing sample not found"
+        )
+
+    await remove_sample(db, style, sample)
+    await db.commit()
+    await invalidate_user_analytics(current_user.id)
+
+    return {"message": "Writing sample deleted successfully"}
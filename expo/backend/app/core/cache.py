@@ -0,0 +1,185 @@
+"""
+In-process caches with cross-worker invalidation
+
+Each API worker keeps its own bounded TTL caches. When a write makes an
+entry stale, the entry is dropped locally and the invalidation is published
+on Redis so every other worker drops it too; the TTL bounds staleness if a
+message is ever lost.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from app.core.redis import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Distinguishes a cached None from a miss
+MISSING = object()
+
+_caches: Dict[str, "TTLCache"] = {}
+_worker_id = uuid.uuid4().hex
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a fixed time"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Bumped by every invalidation, so a fill can tell it raced one
+        self.generation = 0
+        self._invalidated_at: Dict[tuple, float] = {}
+        self._cleared_at = float("-inf")
+        _caches[name] = self
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+        self.generation += 1
+
+    def invalidate_prefix(self, prefix: tuple):
+        """Drop every tuple key that starts with prefix"""
+        stale = [
+            key for key in self._data
+            if isinstance(key, tuple) and key[:len(prefix)] == prefix
+        ]
+        for key in stale:
+            del self._data[key]
+        self.generation += 1
+        now = time.monotonic()
+        self._invalidated_at[prefix] = now
+        if len(self._invalidated_at) > self.maxsize:
+            self._invalidated_at = {
+                other: at for other, at in self._invalidated_at.items()
+                if at >= now - self.ttl
+            }
+
+    def clear(self):
+        self._data.clear()
+        self.generation += 1
+        self._cleared_at = time.monotonic()
+        self._invalidated_at.clear()
+
+    def invalidated_within(self, prefix: tuple, seconds: float) -> bool:
+        """Whether prefix (or the whole cache) was invalidated in the last seconds"""
+        cutoff = time.monotonic() - seconds
+        return self._cleared_at >= cutoff or self._invalidated_at.get(prefix, float("-inf")) >= cutoff
+
+
+def _apply(cache_name: str, key: Optional[tuple], prefix: Optional[tuple]):
+    cache = _caches.get(cache_name)
+    if cache is None:
+        return
+    if key is not None:
+        cache.invalidate(key)
+    elif prefix is not None:
+        cache.invalidate_prefix(prefix)
+    else:
+        cache.clear()
+
+
+def _message(cache_name: str, key: Optional[tuple], prefix: Optional[tuple]) -> str:
+    return json.dumps({
+        "origin": _worker_id,
+        "cache": cache_name,
+        "key": list(key) if key is not None else None,
+        "prefix": list(prefix) if prefix is not None else None
+    })
+
+
+async def broadcast_invalidation(
+    cache_name: str,
+    key: Optional[tuple] = None,
+    prefix: Optional[tuple] = None
+):
+    """
+    Invalidate an entry (key), a group of entries (prefix) or a whole cache
+    in this worker and all others.
+    """
+    _apply(cache_name, key, prefix)
+    try:
+        await get_async_redis().publish(INVALIDATION_CHANNEL, _message(cache_name, key, prefix))
+    except Exception as e:
+        # Other workers fall back to TTL expiry
+        logger.warning(f"Failed to publish cache invalidation: {e}")
+
+
+def publish_invalidations(cache_name: str, prefixes: Iterable[tuple]):
+    """
+    Synchronous, pipelined form of broadcast_invalidation for Celery
+    workers, which hold no caches of their own.
+    """
+    try:
+        pipeline = get_redis().pipeline(transaction=False)
+        for prefix in prefixes:
+            pipeline.publish(INVALIDATION_CHANNEL, _message(cache_name, None, prefix))
+        pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish cache invalidations: {e}")
+
+
+class InvalidationListener:
+    """Applies invalidations published by other workers"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = get_async_redis().pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    if data["origin"] == _worker_id:
+                        continue
+                    _apply(
+                        data["cache"],
+                        tuple(data["key"]) if data["key"] is not None else None,
+                        tuple(data["prefix"]) if data["prefix"] is not None else None
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Entries may have been missed while disconnected
+                logger.warning(f"Cache invalidation listener error, clearing caches: {e}")
+                for cache in _caches.values():
+                    cache.clear()
+                await asyncio.sleep(1)
+
+    def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+
+invalidation_listener = InvalidationListener()
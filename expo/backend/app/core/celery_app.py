@@ -0,0 +1,56 @@
+"""
+Celery application for background processing
+"""
+from celery import Celery
+
+from app.core.config import settings
+
+celery_app = Celery(
+    "studymate",
+    broker=settings.REDIS_URL,
+    backend=settings.REDIS_URL,
+    include=["app.tasks.materials", "app.tasks.analytics"]
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    timezone="UTC",
+    task_acks_late=True,
+    # Long transcription segments should not be hoarded by one worker
+    worker_prefetch_multiplier=1,
+    task_routes={
+        # Scheduling bookkeeping must never wait behind processing work
+        "materials.enqueue": {"queue": "scheduling"},
+        "materials.dispatch": {"queue": "scheduling"},
+        "materials.cancel": {"queue": "scheduling"},
+        "materials.transcribe_segment": {"queue": "transcription"},
+        "media.transcribe_segment": {"queue": "transcription"},
+        "analytics.aggregate_activity": {"queue": "scheduling"},
+        "analytics.prune_hourly_rollups": {"queue": "scheduling"},
+        "analytics.rebuild_class_sketches": {"queue": "scheduling"}
+    },
+    beat_schedule={
+        "dispatch-materials": {
+            "task": "materials.dispatch",
+            "schedule": 30.0
+        },
+        "aggregate-activity": {
+            "task": "analytics.aggregate_activity",
+            "schedule": settings.ACTIVITY_AGGREGATE_INTERVAL_SECONDS
+        },
+        "prune-hourly-rollups": {
+            "task": "analytics.prune_hourly_rollups",
+            "schedule": settings.HOURLY_ROLLUP_PRUNE_INTERVAL_SECONDS
+        },
+        "rebuild-class-sketches": {
+            "task": "analytics.rebuild_class_sketches",
+            "schedule": settings.QUANTILE_SKETCH_REBUILD_INTERVAL_SECONDS
+        },
+        "detect-knowledge-gaps": {
+            "task": "analytics.detect_knowledge_gaps",
+            "schedule": settings.KNOWLEDGE_GAP_INTERVAL_SECONDS
+        }
+    }
+)
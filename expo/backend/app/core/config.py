@@ -18,13 +18,94 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str = Field(..., env="SECRET_KEY")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 1 week
+    PRINCIPAL_CACHE_TTL_SECONDS: float = Field(default=30.0, env="PRINCIPAL_CACHE_TTL_SECONDS")
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = Field(default=10000, env="PRINCIPAL_CACHE_MAX_ENTRIES")
+    
+    # Password hashing (existing hashes are upgraded on login when rounds change)
+    BCRYPT_ROUNDS: int = Field(default=12, env="BCRYPT_ROUNDS")
+    PASSWORD_HASH_MAX_CONCURRENCY: int = Field(default=4, env="PASSWORD_HASH_MAX_CONCURRENCY")
+    
+    # Serialize list endpoints from column rows with orjson instead of ORM objects
+    FAST_LIST_SERIALIZATION: bool = Field(default=True, env="FAST_LIST_SERIALIZATION")
     
     # Database
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
+    DATABASE_POOL_SIZE: int = Field(default=10, env="DATABASE_POOL_SIZE")
+    DATABASE_MAX_OVERFLOW: int = Field(default=20, env="DATABASE_MAX_OVERFLOW")
+    DATABASE_POOL_TIMEOUT: float = Field(default=30.0, env="DATABASE_POOL_TIMEOUT")
+    DATABASE_POOL_RECYCLE: int = Field(default=1800, env="DATABASE_POOL_RECYCLE")  # seconds
+    DATABASE_POOL_PRE_PING: bool = Field(default=True, env="DATABASE_POOL_PRE_PING")
+    # Disable prepared statement caching for PgBouncer transaction pooling
+    DATABASE_PGBOUNCER_MODE: bool = Field(default=False, env="DATABASE_PGBOUNCER_MODE")
+    
+    # Read replicas (optional)
+    DATABASE_REPLICA_URLS: List[str] = Field(default=[], env="DATABASE_REPLICA_URLS")
+    REPLICA_MAX_LAG_SECONDS: float = Field(default=5.0, env="REPLICA_MAX_LAG_SECONDS")
+    REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = Field(default=5.0, env="REPLICA_LAG_CHECK_INTERVAL_SECONDS")
+    
+    # Refuse to start unless the database is at the latest migration
+    SCHEMA_CHECK_ON_STARTUP: bool = Field(default=False, env="SCHEMA_CHECK_ON_STARTUP")
     
     # Redis (for Celery)
     REDIS_URL: str = Field(default="redis://localhost:6379", env="REDIS_URL")
     
+    # Enrollment authorization cache
+    ENROLLMENT_CACHE_TTL_SECONDS: float = Field(default=60.0, env="ENROLLMENT_CACHE_TTL_SECONDS")
+    ENROLLMENT_CACHE_MAX_ENTRIES: int = Field(default=50000, env="ENROLLMENT_CACHE_MAX_ENTRIES")
+    
+    # Analytics result cache (ETag/304 for dashboard polling)
+    ANALYTICS_CACHE_TTL_SECONDS: float = Field(default=300.0, env="ANALYTICS_CACHE_TTL_SECONDS")
+    ANALYTICS_CACHE_MAX_ENTRIES: int = Field(default=20000, env="ANALYTICS_CACHE_MAX_ENTRIES")
+    
+    # Hourly study rollups behind the hourly time series
+    HOURLY_ROLLUP_RETENTION_DAYS: int = Field(default=35, env="HOURLY_ROLLUP_RETENTION_DAYS")
+    HOURLY_ROLLUP_PRUNE_INTERVAL_SECONDS: float = Field(default=3600.0, env="HOURLY_ROLLUP_PRUNE_INTERVAL_SECONDS")
+    
+    # Class percentile sketches queued for rebuilding after writes
+    QUANTILE_SKETCH_REBUILD_INTERVAL_SECONDS: float = Field(default=60.0, env="QUANTILE_SKETCH_REBUILD_INTERVAL_SECONDS")
+    QUANTILE_SKETCH_REBUILD_BATCH: int = Field(default=500, env="QUANTILE_SKETCH_REBUILD_BATCH")
+    
+    # LLM token ledger and quotas. Budgets are tokens per rolling window,
+    # overridable per class with ai_settings "token_budget" (whole class)
+    # and "student_token_budget" (each user); None means unlimited
+    TOKEN_LEDGER_FLUSH_SECONDS: float = Field(default=2.0, env="TOKEN_LEDGER_FLUSH_SECONDS")
+    TOKEN_QUOTA_WINDOW_DAYS: int = Field(default=30, env="TOKEN_QUOTA_WINDOW_DAYS")
+    TOKEN_QUOTA_CLASS_BUDGET: Optional[int] = Field(default=None, env="TOKEN_QUOTA_CLASS_BUDGET")
+    TOKEN_QUOTA_STUDENT_BUDGET: Optional[int] = Field(default=None, env="TOKEN_QUOTA_STUDENT_BUDGET")
+    TOKEN_QUOTA_RECONCILE_SECONDS: float = Field(default=15.0, env="TOKEN_QUOTA_RECONCILE_SECONDS")
+    # Past its budget a scope may keep going on this cheaper model, up to
+    # budget * TOKEN_QUOTA_DOWNGRADE_RATIO, before requests are rejected
+    TOKEN_QUOTA_DOWNGRADE_MODEL: Optional[str] = Field(default=None, env="TOKEN_QUOTA_DOWNGRADE_MODEL")
+    TOKEN_QUOTA_DOWNGRADE_RATIO: float = Field(default=1.25, env="TOKEN_QUOTA_DOWNGRADE_RATIO")
+    
+    # Writing samples: upload limits and the stylometry process pool
+    WRITING_SAMPLE_MAX_FILES: int = Field(default=50, env="WRITING_SAMPLE_MAX_FILES")
+    WRITING_SAMPLE_MAX_BYTES: int = Field(default=1024 * 1024, env="WRITING_SAMPLE_MAX_BYTES")  # 1MB
+    STYLOMETRY_WORKERS: int = Field(default=2, env="STYLOMETRY_WORKERS")
+    STYLOMETRY_CHUNK_SAMPLES: int = Field(default=16, env="STYLOMETRY_CHUNK_SAMPLES")
+    
+    # Activity event log: in-process batching and periodic aggregation
+    ACTIVITY_BUFFER_MAX_BATCH: int = Field(default=1000, env="ACTIVITY_BUFFER_MAX_BATCH")
+    ACTIVITY_BUFFER_FLUSH_SECONDS: float = Field(default=1.0, env="ACTIVITY_BUFFER_FLUSH_SECONDS")
+    ACTIVITY_BUFFER_MAX_PENDING: int = Field(default=50000, env="ACTIVITY_BUFFER_MAX_PENDING")
+    ACTIVITY_AGGREGATE_INTERVAL_SECONDS: float = Field(default=10.0, env="ACTIVITY_AGGREGATE_INTERVAL_SECONDS")
+    ACTIVITY_AGGREGATE_GRACE_SECONDS: float = Field(default=10.0, env="ACTIVITY_AGGREGATE_GRACE_SECONDS")
+    ACTIVITY_AGGREGATE_MAX_EVENTS: int = Field(default=50000, env="ACTIVITY_AGGREGATE_MAX_EVENTS")
+    
+    # Knowledge-gap detection over chat questions
+    KNOWLEDGE_GAP_EMBEDDING_MODEL: str = Field(default="text-embedding-3-small", env="KNOWLEDGE_GAP_EMBEDDING_MODEL")
+    KNOWLEDGE_GAP_INTERVAL_SECONDS: float = Field(default=300.0, env="KNOWLEDGE_GAP_INTERVAL_SECONDS")
+    KNOWLEDGE_GAP_GRACE_SECONDS: float = Field(default=30.0, env="KNOWLEDGE_GAP_GRACE_SECONDS")
+    KNOWLEDGE_GAP_BATCH_MESSAGES: int = Field(default=2000, env="KNOWLEDGE_GAP_BATCH_MESSAGES")
+    KNOWLEDGE_GAP_CLUSTERS: int = Field(default=12, env="KNOWLEDGE_GAP_CLUSTERS")  # per class
+    KNOWLEDGE_GAP_MIN_QUESTIONS: int = Field(default=3, env="KNOWLEDGE_GAP_MIN_QUESTIONS")
+    KNOWLEDGE_GAP_MAX_GAPS: int = Field(default=5, env="KNOWLEDGE_GAP_MAX_GAPS")
+    
+    # Material processing scheduler
+    SCHEDULER_MAX_INFLIGHT: int = Field(default=4, env="SCHEDULER_MAX_INFLIGHT")
+    SCHEDULER_COST_UNIT_BYTES: int = Field(default=1024 * 1024, env="SCHEDULER_COST_UNIT_BYTES")  # 1MB
+    SCHEDULER_LEASE_SECONDS: int = Field(default=3 * 60 * 60, env="SCHEDULER_LEASE_SECONDS")
+    
     # CORS
     CORS_ORIGINS: List[str] = Field(
         default=["http://localhost:3000", "http://localhost:8000"],
@@ -40,6 +121,14 @@ class Settings(BaseSettings):
     PINECONE_ENVIRONMENT: Optional[str] = Field(default=None, env="PINECONE_ENVIRONMENT")
     PINECONE_INDEX_NAME: str = Field(default="studymate-index", env="PINECONE_INDEX_NAME")
     
+    # Shared outbound HTTP pool (OpenAI, vector database)
+    HTTP_CLIENT_HTTP2: bool = Field(default=True, env="HTTP_CLIENT_HTTP2")
+    HTTP_CLIENT_MAX_CONNECTIONS: int = Field(default=100, env="HTTP_CLIENT_MAX_CONNECTIONS")
+    HTTP_CLIENT_MAX_KEEPALIVE: int = Field(default=20, env="HTTP_CLIENT_MAX_KEEPALIVE")
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = Field(default=60.0, env="HTTP_CLIENT_KEEPALIVE_EXPIRY")
+    HTTP_CLIENT_CONNECT_TIMEOUT: float = Field(default=5.0, env="HTTP_CLIENT_CONNECT_TIMEOUT")
+    HTTP_CLIENT_TIMEOUT: float = Field(default=120.0, env="HTTP_CLIENT_TIMEOUT")
+    
     # File Storage
     UPLOAD_DIR: str = Field(default="/tmp/uploads", env="UPLOAD_DIR")
     MAX_UPLOAD_SIZE: int = Field(default=100 * 1024 * 1024, env="MAX_UPLOAD_SIZE")  # 100MB
@@ -47,6 +136,17 @@ class Settings(BaseSettings):
         default=["pdf", "docx", "txt", "pptx", "xlsx", "mp4", "webm", "mov"],
         env="ALLOWED_EXTENSIONS"
     )
+    # Internal nginx location mapped to UPLOAD_DIR; when set, downloads are
+    # handed to nginx (sendfile) via X-Accel-Redirect
+    DOWNLOAD_ACCEL_REDIRECT_PREFIX: Optional[str] = Field(default=None, env="DOWNLOAD_ACCEL_REDIRECT_PREFIX")
+    PRESIGNED_URL_EXPIRE_SECONDS: int = Field(default=3600, env="PRESIGNED_URL_EXPIRE_SECONDS")
+    
+    # Transcription (Whisper)
+    WHISPER_MODEL: str = Field(default="base", env="WHISPER_MODEL")
+    TRANSCRIPTION_SILENCE_DB: float = Field(default=-35.0, env="TRANSCRIPTION_SILENCE_DB")
+    TRANSCRIPTION_MIN_SILENCE_SECONDS: float = Field(default=0.5, env="TRANSCRIPTION_MIN_SILENCE_SECONDS")
+    TRANSCRIPTION_TARGET_SEGMENT_SECONDS: float = Field(default=45.0, env="TRANSCRIPTION_TARGET_SEGMENT_SECONDS")
+    TRANSCRIPTION_MAX_SEGMENT_SECONDS: float = Field(default=120.0, env="TRANSCRIPTION_MAX_SEGMENT_SECONDS")
     
     # AWS S3 (Optional)
     AWS_ACCESS_KEY_ID: Optional[str] = Field(default=None, env="AWS_ACCESS_KEY_ID")
@@ -1,16 +1,93 @@
 """
 Database configuration and session management
 """
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from typing import AsyncIterator, List, Optional
+from pathlib import Path
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+
 from app.core.config import settings
+from app.core.metrics import (
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_IN_USE,
+    DB_POOL_OVERFLOW,
+    DB_REPLICA_LAG_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+# Seconds a replica is behind the primary; 0 when it has replayed everything received
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waits"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(self.logging_name).observe(time.perf_counter() - start)
+
+
+def _is_postgres(url: str) -> bool:
+    return url.startswith("postgresql")
+
+
+def _engine_options(url: str, name: str) -> dict:
+    """Pool and driver options for an engine"""
+    options = {"echo": settings.DEBUG, "future": True}
+    if not _is_postgres(url):
+        # SQLite (tests) keeps the dialect's default pool
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name=name,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING
+    )
+    if settings.DATABASE_PGBOUNCER_MODE:
+        # Transaction pooling hands each transaction a different server
+        # connection, so prepared statements cannot be cached or reused by name
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__"
+        }
+    return options
+
+
+def _create_engine(url: str, name: str) -> AsyncEngine:
+    """Create an engine and export its pool gauges"""
+    new_engine = create_async_engine(url, **_engine_options(url, name))
+    if _is_postgres(url):
+        # Read the live pool on scrape; engine.pool changes if the pool is recreated
+        DB_POOL_IN_USE.labels(name).set_function(lambda: new_engine.pool.checkedout())
+        DB_POOL_OVERFLOW.labels(name).set_function(lambda: max(new_engine.pool.overflow(), 0))
+    return new_engine
+
 
 # Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    future=True
-)
+engine = _create_engine(settings.DATABASE_URL, "primary")
 
 # Create async session factory
 async_session_maker = async_sessionmaker(
@@ -23,7 +100,77 @@ async_session_maker = async_sessionmaker(
 Base = declarative_base()
 
 
-async def get_async_session() -> AsyncSession:
+class Replica:
+    """A read replica and its last observed replication lag"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = _create_engine(url, name)
+        self.session_maker = async_sessionmaker(
+            self.engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+        # Unknown until the first check; not used before that
+        self.lag_seconds: Optional[float] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.lag_seconds is not None and self.lag_seconds <= settings.REPLICA_MAX_LAG_SECONDS
+
+    async def check_lag(self):
+        """Measure replication lag; an unreachable replica is marked unhealthy"""
+        try:
+            async with self.engine.connect() as conn:
+                self.lag_seconds = float((await conn.execute(REPLICA_LAG_QUERY)).scalar())
+            DB_REPLICA_LAG_SECONDS.labels(self.name).set(self.lag_seconds)
+        except Exception as e:
+            logger.warning(f"Replica {self.name} lag check failed: {e}")
+            self.lag_seconds = None
+
+
+class ReplicaRouter:
+    """Round-robin read routing over replicas that are within the lag limit"""
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls)]
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+        self._monitor: Optional[asyncio.Task] = None
+
+    def pick(self) -> async_sessionmaker:
+        """Session factory of the next healthy replica, or the primary"""
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.healthy:
+                return replica.session_maker
+        return async_session_maker
+
+    async def check_all(self):
+        await asyncio.gather(*(replica.check_lag() for replica in self.replicas))
+
+    async def _monitor_loop(self):
+        while True:
+            await asyncio.sleep(settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS)
+            await self.check_all()
+
+    async def start(self):
+        """Check replicas once, then keep monitoring lag in the background"""
+        if not self.replicas:
+            return
+        await self.check_all()
+        self._monitor = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        if self._monitor:
+            self._monitor.cancel()
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+replica_router = ReplicaRouter(settings.DATABASE_REPLICA_URLS)
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
     """
     Dependency to get database session
     """
@@ -31,9 +178,59 @@ async def get_async_session() -> AsyncSession:
         yield session
 
 
-async def create_db_and_tables():
+async def get_read_session() -> AsyncIterator[AsyncSession]:
+    """
+    Dependency to get a read-only database session.
+
+    Routed to a read replica when one is within REPLICA_MAX_LAG_SECONDS,
+    otherwise to the primary. Only use it where slightly stale data is fine.
+    """
+    async with replica_router.pick()() as session:
+        yield session
+
+
+def create_worker_session_maker() -> async_sessionmaker:
+    """
+    Session factory for Celery workers.
+
+    Each task runs its own event loop, so connections must not be pooled
+    across tasks.
+    """
+    options = {"echo": settings.DEBUG, "poolclass": NullPool}
+    if settings.DATABASE_PGBOUNCER_MODE and _is_postgres(settings.DATABASE_URL):
+        options["connect_args"] = _engine_options(settings.DATABASE_URL, "worker")["connect_args"]
+
+    worker_engine = create_async_engine(settings.DATABASE_URL, **options)
+    return async_sessionmaker(
+        worker_engine,
+        class_=AsyncSession,
+        expire_on_commit=False
+    )
+
+
+async def check_schema_revision():
     """
-    Create database tables
+    Verify the database is migrated to the latest Alembic revision.
+
+    The schema is only ever changed by `alembic upgrade head`; this check
+    lets a deployment refuse to serve against an unmigrated database.
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+    # Only loaded when the check is enabled
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(str(ALEMBIC_INI))
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+
+    async with engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+            current = {row[0] for row in result}
+        except Exception:
+            current = set()
+
+    if current != heads:
+        raise RuntimeError(
+            f"Database schema is at {sorted(current) or 'no revision'}, expected {sorted(heads)}; "
+            "run `alembic upgrade head`"
+        )
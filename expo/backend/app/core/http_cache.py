@@ -0,0 +1,40 @@
+"""
+HTTP conditional request helpers (ETag / If-None-Match / If-Range)
+"""
+from typing import Optional
+
+
+def make_etag(value: str) -> str:
+    """Build a strong entity tag from an opaque value such as a content hash"""
+    return f'"{value}"'
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag.
+
+    Uses the weak comparison required for If-None-Match, so W/"x" matches "x".
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(_opaque_tag(tag) == _opaque_tag(etag) for tag in if_none_match.split(","))
+
+
+def if_range_matches(if_range: Optional[str], etag: str) -> bool:
+    """
+    Check an If-Range header; a range may only be served if it matches.
+
+    If-Range requires strong comparison, and dates are not supported, so any
+    value other than the current strong ETag means the full entity is sent.
+    """
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    return not if_range.startswith("W/") and if_range == etag
@@ -0,0 +1,81 @@
+"""
+Prometheus metrics
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Connections currently checked out of the pool",
+    ["pool"]
+)
+
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections open beyond the configured pool size",
+    ["pool"]
+)
+
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "db_replica_lag_seconds",
+    "Replication lag of each read replica at the last check",
+    ["pool"]
+)
+
+PASSWORD_HASH_QUEUE_SECONDS = Histogram(
+    "password_hash_queue_seconds",
+    "Time spent waiting for a password hashing slot",
+    ["operation"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds",
+    "Time spent hashing or verifying a password",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+ACTIVITY_EVENTS_FLUSHED = Counter(
+    "activity_events_flushed_total",
+    "Activity events written to the event log"
+)
+
+ACTIVITY_EVENTS_PENDING = Gauge(
+    "activity_events_pending",
+    "Activity events buffered in this process and not yet written"
+)
+
+ACTIVITY_FLUSH_SECONDS = Histogram(
+    "activity_flush_seconds",
+    "Time spent writing one batch of activity events",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+STYLOMETRY_SAMPLES_EXTRACTED = Counter(
+    "stylometry_samples_extracted_total",
+    "Writing samples analysed by the stylometry process pool"
+)
+
+STYLOMETRY_BATCH_SECONDS = Histogram(
+    "stylometry_batch_seconds",
+    "Time to extract the features of one uploaded batch of writing samples",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+TOKEN_LEDGER_PENDING = Gauge(
+    "token_ledger_pending_rows",
+    "Token ledger increments buffered in this process and not yet written"
+)
+
+TOKEN_QUOTA_DECISIONS = Counter(
+    "token_quota_decisions_total",
+    "Quota decisions taken before LLM calls",
+    ["decision"]
+)
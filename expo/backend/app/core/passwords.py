@@ -0,0 +1,68 @@
+"""
+Password hashing off the event loop
+
+bcrypt takes tens to hundreds of milliseconds per call, so hashing runs in
+a dedicated thread pool (bcrypt releases the GIL) behind a semaphore that
+caps concurrent hashes. Time spent waiting for a slot is exported as a
+metric so login bursts are visible before they turn into timeouts.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+import asyncio
+import time
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.metrics import PASSWORD_HASH_QUEUE_SECONDS, PASSWORD_HASH_SECONDS
+
+# Hashes made with other schemes or rounds are flagged by needs_update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_MAX_CONCURRENCY,
+    thread_name_prefix="password-hash"
+)
+_semaphore = asyncio.Semaphore(settings.PASSWORD_HASH_MAX_CONCURRENCY)
+
+
+async def _run(operation: str, fn: Callable, *args):
+    queued_at = time.perf_counter()
+    async with _semaphore:
+        started_at = time.perf_counter()
+        PASSWORD_HASH_QUEUE_SECONDS.labels(operation).observe(started_at - queued_at)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+        finally:
+            PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - started_at)
+
+
+async def get_password_hash(password: str) -> str:
+    """Hash password"""
+    return await _run("hash", pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify password against hash"""
+    return await _run("verify", pwd_context.verify, plain_password, hashed_password)
+
+
+async def verify_and_update_password(
+    plain_password: str,
+    hashed_password: Optional[str]
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and return (valid, new_hash).
+
+    new_hash is set when the stored hash uses outdated settings and should
+    be replaced. A missing hash is checked against a dummy so unknown
+    accounts take as long as wrong passwords.
+    """
+    if hashed_password is None:
+        await _run("verify", pwd_context.dummy_verify)
+        return False, None
+    return await _run("verify", pwd_context.verify_and_update, plain_password, hashed_password)
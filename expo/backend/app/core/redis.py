@@ -0,0 +1,26 @@
+"""
+Redis client management
+"""
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+_redis = None
+_async_redis = None
+
+
+def get_redis() -> redis.Redis:
+    """Get the shared synchronous Redis client (Celery workers)"""
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Get the shared asyncio Redis client (API process)"""
+    global _async_redis
+    if _async_redis is None:
+        _async_redis = aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _async_redis
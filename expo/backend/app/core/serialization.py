@@ -0,0 +1,75 @@
+"""
+Fast serialization path for list endpoints
+
+The default path loads full ORM objects (identity map, instance state),
+validates each one with from_attributes and encodes the result with
+jsonable_encoder and the standard json module. For large lists this path
+selects only the columns the response model needs as plain rows, validates
+them in one TypeAdapter call and encodes with orjson.
+"""
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from functools import lru_cache
+from typing import List, Optional, Type
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(response_model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[response_model])
+
+
+@lru_cache(maxsize=None)
+def _response_columns(response_model: Type[BaseModel], entity: type) -> Optional[tuple]:
+    """
+    Columns of entity backing the fields of response_model, labelled with
+    the field's validation name. None if a required field has no column.
+    """
+    mapper = inspect(entity)
+    by_name = {}
+    for attr in mapper.column_attrs:
+        column = attr.columns[0]
+        by_name[attr.key] = column
+        by_name.setdefault(column.name, column)
+
+    columns = []
+    for name, field in response_model.model_fields.items():
+        column = by_name.get(name)
+        if column is None:
+            if field.is_required():
+                return None
+            # Optional fields without a column keep their defaults
+            continue
+        columns.append(column.label(field.alias or name))
+    return tuple(columns)
+
+
+async def fast_list_response(
+    db: AsyncSession,
+    query: Select,
+    response_model: Type[BaseModel],
+    reverse: bool = False
+) -> ORJSONResponse:
+    """
+    Execute an ORM select (e.g. select(Material).where(...)) and return its
+    rows as a JSON list of response_model.
+
+    Falls back to loading ORM objects when the response model needs data
+    that is not a plain column of the selected entity.
+    """
+    adapter = _list_adapter(response_model)
+    entity = query.column_descriptions[0]["entity"]
+    columns = _response_columns(response_model, entity)
+
+    if columns is not None:
+        result = await db.execute(query.with_only_columns(*columns))
+        items = adapter.validate_python(result.mappings().all())
+    else:
+        result = await db.execute(query)
+        items = adapter.validate_python(result.scalars().all(), from_attributes=True)
+
+    if reverse:
+        items.reverse()
+    return ORJSONResponse(adapter.dump_python(items, by_alias=True))
@@ -0,0 +1,83 @@
+"""
+Application-scoped service clients
+
+AIService and VectorService are created once per process and share a single
+keep-alive HTTP/2 connection pool, so chat turns reuse open TLS connections
+instead of building new clients per request. Per-request state such as the
+database session is passed to each call.
+"""
+from typing import TYPE_CHECKING, Optional
+import logging
+
+import httpx
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from app.services.ai_service import AIService
+    from app.services.vector_service import VectorService
+
+logger = logging.getLogger(__name__)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Pooled client for outbound API calls, sized from settings"""
+    return httpx.AsyncClient(
+        http2=settings.HTTP_CLIENT_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(
+            settings.HTTP_CLIENT_TIMEOUT,
+            connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT
+        )
+    )
+
+
+class ServiceRegistry:
+    """
+    Holds the shared HTTP pool and the services built on it.
+
+    The pool is opened and closed with the application lifespan. Services
+    are constructed on first use, which keeps langchain and the vendor SDKs
+    out of worker startup; after that every request gets the same instance.
+    """
+
+    def __init__(self):
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self._ai_service: Optional["AIService"] = None
+        self._vector_service: Optional["VectorService"] = None
+
+    def _require_client(self) -> httpx.AsyncClient:
+        if self.http_client is None:
+            raise RuntimeError("Service registry is not started")
+        return self.http_client
+
+    @property
+    def ai_service(self) -> "AIService":
+        if self._ai_service is None:
+            from app.services.ai_service import AIService
+            self._ai_service = AIService(http_client=self._require_client())
+        return self._ai_service
+
+    @property
+    def vector_service(self) -> "VectorService":
+        if self._vector_service is None:
+            from app.services.vector_service import VectorService
+            self._vector_service = VectorService(http_client=self._require_client())
+        return self._vector_service
+
+    async def start(self):
+        self.http_client = create_http_client()
+
+    async def stop(self):
+        self._ai_service = None
+        self._vector_service = None
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+
+
+services = ServiceRegistry()
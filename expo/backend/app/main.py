@@ -6,9 +6,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 
-from app.api import auth, classes, chats, materials, assignments, analytics
+from app.api import auth, classes, chats, materials, assignments, analytics, writing
+from app.core.cache import invalidation_listener
 from app.core.config import settings
-from app.core.database import create_db_and_tables
+from app.core.database import check_schema_revision, replica_router
+from app.core.services import services
+from app.services.activity_log import activity_buffer
+from app.services.token_quota import token_ledger, token_quotas
+from app.services.writing_profiles import stylometry_pool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,10 +27,25 @@ async def lifespan(app: FastAPI):
     """
     # Startup
     logger.info("Starting StudyMate AI Backend...")
-    await create_db_and_tables()
+    # Schema changes only happen through `alembic upgrade head`
+    if settings.SCHEMA_CHECK_ON_STARTUP:
+        await check_schema_revision()
+    await replica_router.start()
+    invalidation_listener.start()
+    await services.start()
+    activity_buffer.start()
+    token_ledger.start()
+    token_quotas.start()
     yield
     # Shutdown
     logger.info("Shutting down StudyMate AI Backend...")
+    stylometry_pool.stop()
+    await token_quotas.stop()
+    await token_ledger.stop()
+    await activity_buffer.stop()
+    await services.stop()
+    await invalidation_listener.stop()
+    await replica_router.stop()
 
 
 # Create FastAPI instance
@@ -45,6 +65,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Expose Prometheus metrics
+if settings.PROMETHEUS_ENABLED:
+    from prometheus_client import make_asgi_app
+    app.mount("/metrics", make_asgi_app())
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(classes.router, prefix="/api/classes", tags=["Classes"])
@@ -52,6 +77,7 @@ app.include_router(chats.router, prefix="/api/chats", tags=["Chats"])
 app.include_router(materials.router, prefix="/api/materials", tags=["Materials"])
 app.include_router(assignments.router, prefix="/api/assignments", tags=["Assignments"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(writing.router, prefix="/api/writing", tags=["Writing"])
 
 
 @app.get("/")
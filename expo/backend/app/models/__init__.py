@@ -7,6 +7,16 @@ from app.models.chat import ChatSession, ChatMessage
 from app.models.material import Material, MaterialChunk
 from app.models.assignment import Assignment, AssignmentSubmission
 from app.models.writing_style import WritingStyle, WritingSample
+from app.models.analytics import (
+    DailyStudyRollup,
+    HourlyStudyRollup,
+    ActivityEvent,
+    AggregationWatermark,
+    TopicCluster,
+    TopicQuestionCount,
+    QuantileSketch,
+    TokenUsageLedger
+)
 
 __all__ = [
     "User",
@@ -20,5 +30,13 @@ __all__ = [
     "Assignment",
     "AssignmentSubmission",
     "WritingStyle",
-    "WritingSample"
+    "WritingSample",
+    "DailyStudyRollup",
+    "HourlyStudyRollup",
+    "ActivityEvent",
+    "AggregationWatermark",
+    "TopicCluster",
+    "TopicQuestionCount",
+    "QuantileSketch",
+    "TokenUsageLedger"
 ]
\ No newline at end of file
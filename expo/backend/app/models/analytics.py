@@ -0,0 +1,158 @@
+"""
+Pre-aggregated analytics models
+"""
+from sqlalchemy import Column, String, Date, DateTime, Integer, BigInteger, Float, ForeignKey, Index, JSON, LargeBinary
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+# class_id of rollup rows for activity not tied to a class
+NO_CLASS = ""
+
+
+class DailyStudyRollup(Base):
+    """
+    Per-user, per-class, per-day study counters.
+
+    Maintained incrementally (upserts that add to the counters) by the code
+    paths that create the underlying records, so range statistics are a sum
+    over a handful of rows instead of a scan of the raw tables.
+    """
+    __tablename__ = "daily_study_rollups"
+    __table_args__ = (
+        Index("ix_daily_study_rollups_class_day", "class_id", "day"),
+    )
+    
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    class_id = Column(String, primary_key=True, default=NO_CLASS)  # NO_CLASS for class-less activity
+    day = Column(Date, primary_key=True)  # UTC
+    
+    study_minutes = Column(Integer, nullable=False, default=0, server_default="0")
+    assignments_completed = Column(Integer, nullable=False, default=0, server_default="0")
+    scores_recorded = Column(Integer, nullable=False, default=0, server_default="0")
+    score_total = Column(Float, nullable=False, default=0.0, server_default="0")
+    chat_sessions = Column(Integer, nullable=False, default=0, server_default="0")
+    chat_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    tokens_used = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class HourlyStudyRollup(Base):
+    """
+    Per-user, per-class, per-hour counters for the metrics charted at
+    hourly resolution. Maintained alongside DailyStudyRollup for current
+    activity; rows older than HOURLY_ROLLUP_RETENTION_DAYS are pruned.
+    """
+    __tablename__ = "hourly_study_rollups"
+    __table_args__ = (
+        Index("ix_hourly_study_rollups_hour", "hour"),
+    )
+    
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)  # UTC, truncated to the hour
+    class_id = Column(String, primary_key=True, default=NO_CLASS)
+    
+    study_minutes = Column(Integer, nullable=False, default=0, server_default="0")
+    chat_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    tokens_used = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class ActivityEvent(Base):
+    """
+    Append-only log of study activity reported by clients.
+
+    Rows are never updated; the aggregator folds them into enrollment,
+    profile and rollup counters and remembers how far it got in
+    AggregationWatermark.
+    """
+    __tablename__ = "activity_events"
+    
+    # SQLite only autoincrements INTEGER primary keys
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    
+    user_id = Column(String, nullable=False)
+    class_id = Column(String)
+    activity_type = Column(String, nullable=False)
+    duration_minutes = Column(Integer, nullable=False, default=0)
+    
+    day = Column(Date, nullable=False)  # UTC day the activity happened
+    recorded_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class AggregationWatermark(Base):
+    """
+    How far each aggregator has read its source.
+
+    Aggregators over integer IDs use last_event_id; those over tables keyed
+    by UUID use the (last_event_at, last_event_key) position instead.
+    """
+    __tablename__ = "aggregation_watermarks"
+    
+    name = Column(String, primary_key=True)
+    last_event_id = Column(BigInteger, nullable=False, default=0)
+    last_event_at = Column(DateTime(timezone=True))
+    last_event_key = Column(String)
+
+
+class TopicCluster(Base):
+    """
+    One cluster of a class's chat questions, updated by mini-batch k-means.
+
+    The centroid is a unit-length float32 vector stored as raw bytes; the
+    label is built from the most frequent keywords of the member questions.
+    """
+    __tablename__ = "topic_clusters"
+    
+    class_id = Column(String, ForeignKey("classes.id"), primary_key=True)
+    cluster_index = Column(Integer, primary_key=True)
+    
+    centroid = Column(LargeBinary, nullable=False)
+    question_count = Column(Integer, nullable=False, default=0)
+    label = Column(String, nullable=False)
+    keywords = Column(JSON, default={})  # keyword -> count, truncated to the most frequent
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class TopicQuestionCount(Base):
+    """Questions each user has asked per topic cluster of a class"""
+    __tablename__ = "topic_question_counts"
+    
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    class_id = Column(String, primary_key=True)
+    cluster_index = Column(Integer, primary_key=True)
+    
+    question_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class QuantileSketch(Base):
+    """
+    Serialized KLL sketch (app.core.sketches) of one metric's distribution
+    within a scope, e.g. ("assignment", <id>, "score_percent").
+    """
+    __tablename__ = "quantile_sketches"
+    
+    scope = Column(String, primary_key=True)  # class, assignment
+    scope_id = Column(String, primary_key=True)
+    metric = Column(String, primary_key=True)  # score_percent, current_grade, study_minutes
+    
+    item_count = Column(BigInteger, nullable=False, default=0)
+    data = Column(LargeBinary, nullable=False)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class TokenUsageLedger(Base):
+    """
+    LLM tokens used per class, user, UTC day and model.
+
+    Written in coalesced batches by the token ledger buffer; the source the
+    in-memory quota buckets are reconciled against.
+    """
+    __tablename__ = "token_usage_ledger"
+    
+    class_id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    model = Column(String, primary_key=True)
+    
+    tokens = Column(BigInteger, nullable=False, default=0, server_default="0")
+    requests = Column(Integer, nullable=False, default=0, server_default="0")
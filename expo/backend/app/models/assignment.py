@@ -1,7 +1,7 @@
 """
 Assignment and submission models
 """
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Float
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -11,6 +11,9 @@ import uuid
 class Assignment(Base):
     """Class assignments"""
     __tablename__ = "assignments"
+    __table_args__ = (
+        Index("ix_assignments_class_due", "class_id", "due_date"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -61,6 +64,10 @@ class Assignment(Base):
 class AssignmentSubmission(Base):
     """Student assignment submissions"""
     __tablename__ = "assignment_submissions"
+    __table_args__ = (
+        Index("uq_assignment_submissions_assignment_user", "assignment_id", "user_id", unique=True),
+        Index("ix_assignment_submissions_user_submitted", "user_id", "submitted_at"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -101,4 +108,4 @@ class AssignmentSubmission(Base):
     
     # Relationships
     assignment = relationship("Assignment", back_populates="submissions")
-    user = relationship("User", back_populates="assignments")
\ No newline at end of file
+    user = relationship("User", back_populates="assignments", foreign_keys=[user_id])
\ No newline at end of file
@@ -1,10 +1,11 @@
 """
 Chat session and message models
 """
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Enum
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
+from app.models.types import JSONBVariant
 import uuid
 import enum
 
@@ -19,6 +20,16 @@ class MessageRole(enum.Enum):
 class ChatSession(Base):
     """Chat session for a specific class"""
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        Index("ix_chat_sessions_user_activity", "user_id", "last_activity"),
+        Index("ix_chat_sessions_class_user", "class_id", "user_id"),
+        Index(
+            "ix_chat_sessions_context_materials",
+            "context_materials",
+            postgresql_using="gin",
+            postgresql_ops={"context_materials": "jsonb_path_ops"}
+        ),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -30,7 +41,7 @@ class ChatSession(Base):
     description = Column(Text)
     
     # Context
-    context_materials = Column(JSON, default=[])  # List of material IDs being referenced
+    context_materials = Column(JSONBVariant, default=[])  # List of material IDs being referenced
     assignment_id = Column(String, ForeignKey("assignments.id"))  # If related to specific assignment
     
     # AI Settings for this session
@@ -57,6 +68,16 @@ class ChatSession(Base):
 class ChatMessage(Base):
     """Individual chat messages"""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_session_created", "session_id", "created_at"),
+        Index("ix_chat_messages_created", "created_at", "id"),  # knowledge-gap watermark scan
+        Index(
+            "ix_chat_messages_citations",
+            "citations",
+            postgresql_using="gin",
+            postgresql_ops={"citations": "jsonb_path_ops"}
+        ),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -72,7 +93,7 @@ class ChatMessage(Base):
     
     # Attachments and References
     attachments = Column(JSON, default=[])  # File attachments
-    citations = Column(JSON, default=[])  # References to materials
+    citations = Column(JSONBVariant, default=[])  # References to materials
     
     # Feedback
     helpful = Column(Boolean)  # User feedback
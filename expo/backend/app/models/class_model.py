@@ -1,7 +1,7 @@
 """
 Class and enrollment models
 """
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Float
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -49,6 +49,10 @@ class Class(Base):
 class ClassEnrollment(Base):
     """Student enrollment in classes"""
     __tablename__ = "class_enrollments"
+    __table_args__ = (
+        Index("uq_class_enrollments_class_user", "class_id", "user_id", unique=True),
+        Index("ix_class_enrollments_user_active", "user_id", "is_active"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -1,16 +1,27 @@
 """
 Course material models
 """
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Float
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
+from app.models.types import JSONBVariant
 import uuid
 
 
 class Material(Base):
     """Course materials (textbooks, notes, videos, etc.)"""
     __tablename__ = "materials"
+    __table_args__ = (
+        Index("ix_materials_class_created", "class_id", "created_at"),
+        Index(
+            "ix_materials_tags",
+            "tags",
+            postgresql_using="gin",
+            postgresql_ops={"tags": "jsonb_path_ops"}
+        ),
+        Index("ix_materials_metadata", "metadata", postgresql_using="gin"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -23,6 +34,7 @@ class Material(Base):
     file_type = Column(String)  # pdf, docx, video, etc.
     file_size = Column(Integer)  # in bytes
     file_path = Column(String)  # S3 or local path
+    content_hash = Column(String)  # SHA-256 of file contents, used as ETag
     
     # For videos
     duration_seconds = Column(Integer)  # For video/audio files
@@ -33,9 +45,9 @@ class Material(Base):
     processing_status = Column(String, default="pending")  # pending, processing, completed, failed
     processing_error = Column(Text)
     
-    # Metadata
-    metadata = Column(JSON, default={})  # Store extracted metadata
-    tags = Column(JSON, default=[])
+    # Metadata ("metadata" is reserved on declarative classes)
+    metadata_ = Column("metadata", JSONBVariant, default={})  # Store extracted metadata
+    tags = Column(JSONBVariant, default=[])
     
     # Vector Embeddings Info
     embedding_count = Column(Integer, default=0)
@@ -52,6 +64,10 @@ class Material(Base):
 class MaterialChunk(Base):
     """Chunks of materials for vector search"""
     __tablename__ = "material_chunks"
+    __table_args__ = (
+        Index("uq_material_chunks_material_index", "material_id", "chunk_index", unique=True),
+        Index("ix_material_chunks_material_page", "material_id", "page_number"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -73,7 +89,7 @@ class MaterialChunk(Base):
     embedding_model = Column(String)
     
     # Metadata
-    metadata = Column(JSON, default={})
+    metadata_ = Column("metadata", JSON, default={})
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
@@ -0,0 +1,40 @@
+"""
+Column types and SQL constructs shared by the models
+"""
+from sqlalchemy import JSON, Boolean
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+# JSONB (GIN-indexable, parsed once on write) on PostgreSQL, plain JSON elsewhere
+JSONBVariant = JSON().with_variant(JSONB(), "postgresql")
+
+
+class json_array_contains(FunctionElement):
+    """
+    True if a JSON array column contains the given string element.
+
+    Compiles to a JSONB containment test on PostgreSQL, which a GIN index
+    on the column can answer, and to a json_each scan on SQLite.
+    """
+    type = Boolean()
+    inherit_cache = True
+    name = "json_array_contains"
+
+
+@compiles(json_array_contains, "postgresql")
+def _json_array_contains_postgresql(element, compiler, **kw):
+    column, value = list(element.clauses)
+    return "%s @> jsonb_build_array(CAST(%s AS TEXT))" % (
+        compiler.process(column, **kw),
+        compiler.process(value, **kw)
+    )
+
+
+@compiles(json_array_contains)
+def _json_array_contains_default(element, compiler, **kw):
+    column, value = list(element.clauses)
+    return "EXISTS (SELECT 1 FROM json_each(%s) WHERE json_each.value = %s)" % (
+        compiler.process(column, **kw),
+        compiler.process(value, **kw)
+    )
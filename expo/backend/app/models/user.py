@@ -1,7 +1,7 @@
 """
 User model and authentication
 """
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -23,6 +23,8 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)
     is_superuser = Column(Boolean, default=False)
+    # Embedded in issued tokens; bumping it revokes all of them
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -31,7 +33,12 @@ class User(Base):
     profile = relationship("UserProfile", back_populates="user", uselist=False, cascade="all, delete-orphan")
     enrollments = relationship("ClassEnrollment", back_populates="user", cascade="all, delete-orphan")
     chat_sessions = relationship("ChatSession", back_populates="user", cascade="all, delete-orphan")
-    assignments = relationship("AssignmentSubmission", back_populates="user", cascade="all, delete-orphan")
+    assignments = relationship(
+        "AssignmentSubmission",
+        back_populates="user",
+        foreign_keys="AssignmentSubmission.user_id",
+        cascade="all, delete-orphan"
+    )
     writing_styles = relationship("WritingStyle", back_populates="user", cascade="all, delete-orphan")
 
 
@@ -40,7 +47,7 @@ class UserProfile(Base):
     __tablename__ = "user_profiles"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, nullable=False, unique=True, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, unique=True, index=True)
     
     # Academic Information
     university = Column(String)
@@ -1,7 +1,7 @@
 """
 Writing style analysis and mimicry models
 """
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Float
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, JSON, ForeignKey, Float, Index, LargeBinary
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -11,6 +11,9 @@ import uuid
 class WritingStyle(Base):
     """User's writing style profile"""
     __tablename__ = "writing_styles"
+    __table_args__ = (
+        Index("ix_writing_styles_user_active", "user_id", "is_active"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -51,6 +54,10 @@ class WritingStyle(Base):
     last_trained = Column(DateTime(timezone=True))
     training_status = Column(String, default="pending")  # pending, training, completed
     
+    # Streaming statistics behind the columns above, updated per sample
+    profile_stats = Column(JSON)
+    phrase_sketch = Column(LargeBinary)  # Count-min sketch of phrase counts
+    
     # Model Information
     model_path = Column(String)  # Path to fine-tuned model or parameters
     accuracy_score = Column(Float)
@@ -70,6 +77,9 @@ class WritingStyle(Base):
 class WritingSample(Base):
     """Writing samples for style analysis"""
     __tablename__ = "writing_samples"
+    __table_args__ = (
+        Index("ix_writing_samples_style", "style_id"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -0,0 +1,228 @@
+"""
+Activity event ingestion and aggregation
+
+track_activity used to read-modify-write enrollment and profile counters,
+losing updates under concurrent calls. Events are now appended to
+activity_events instead:
+
+  * ActivityBuffer collects events in memory and flushes them with
+    multi-row INSERTs, by size or on a short timer, so each request costs
+    a list append rather than a transaction.
+  * aggregate_activity_events (run periodically by Celery) folds new
+    events into ClassEnrollment, UserProfile and the study rollups with
+    additive UPDATEs/upserts in one transaction, refreshes the study time
+    sketches of the classes involved, and advances a watermark.
+
+Buffered events that have not been flushed are lost if the process dies,
+which is acceptable for activity pings.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import asyncio
+import logging
+import time
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.metrics import (
+    ACTIVITY_EVENTS_FLUSHED,
+    ACTIVITY_EVENTS_PENDING,
+    ACTIVITY_FLUSH_SECONDS
+)
+from app.models.analytics import ActivityEvent, AggregationWatermark
+from app.models.class_model import ClassEnrollment
+from app.models.user import UserProfile
+from app.services.analytics_cache import publish_user_analytics_invalidations
+from app.services.quantile_sketches import STUDY_MINUTES, mark_class_sketches_stale
+from app.services.study_rollups import (
+    bump_daily_rollups,
+    bump_hourly_rollups,
+    utc_day,
+    utc_hour,
+    utc_hour_expression
+)
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "activity_events"
+
+# Keeps each INSERT well under driver bind-parameter limits
+INSERT_CHUNK_ROWS = 1000
+
+
+class ActivityBuffer:
+    """In-process buffer that batches activity events into multi-row inserts"""
+
+    def __init__(self):
+        self._pending: List[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def record(
+        self,
+        user_id: str,
+        class_id: Optional[str],
+        activity_type: str,
+        duration_minutes: int
+    ):
+        """Queue an event; only waits when the buffer is backed up"""
+        self._pending.append({
+            "user_id": user_id,
+            # "" from an empty query parameter means no class, like None
+            "class_id": class_id or None,
+            "activity_type": activity_type,
+            "duration_minutes": duration_minutes,
+            "day": utc_day()
+        })
+        ACTIVITY_EVENTS_PENDING.set(len(self._pending))
+
+        if len(self._pending) >= settings.ACTIVITY_BUFFER_MAX_BATCH:
+            self._full.set()
+        if len(self._pending) >= settings.ACTIVITY_BUFFER_MAX_PENDING:
+            # The database is falling behind; apply backpressure
+            await self.flush()
+
+    async def flush(self):
+        """Write all pending events"""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            self._full.clear()
+            if not batch:
+                return
+
+            start = time.perf_counter()
+            try:
+                async with async_session_maker() as db:
+                    for offset in range(0, len(batch), INSERT_CHUNK_ROWS):
+                        await db.execute(
+                            insert(ActivityEvent).values(batch[offset:offset + INSERT_CHUNK_ROWS])
+                        )
+                    await db.commit()
+            except Exception as e:
+                # Put the batch back in front, bounded so a dead database cannot exhaust memory
+                logger.error(f"Failed to flush {len(batch)} activity events: {e}")
+                self._pending = (batch + self._pending)[-settings.ACTIVITY_BUFFER_MAX_PENDING:]
+                return
+            finally:
+                ACTIVITY_FLUSH_SECONDS.observe(time.perf_counter() - start)
+                ACTIVITY_EVENTS_PENDING.set(len(self._pending))
+
+            ACTIVITY_EVENTS_FLUSHED.inc(len(batch))
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), settings.ACTIVITY_BUFFER_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self):
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        await self.flush()
+
+
+activity_buffer = ActivityBuffer()
+
+
+async def aggregate_activity_events(db: AsyncSession) -> int:
+    """
+    Fold events recorded since the last run into the study counters.
+
+    Events newer than ACTIVITY_AGGREGATE_GRACE_SECONDS are left for the next
+    run so inserts still in flight are not skipped by the watermark. The
+    watermark row is locked, so concurrent runs serialize. Returns the
+    number of events aggregated.
+    """
+    watermark = (await db.execute(
+        select(AggregationWatermark)
+        .where(AggregationWatermark.name == WATERMARK_NAME)
+        .with_for_update()
+    )).scalar()
+    if watermark is None:
+        watermark = AggregationWatermark(name=WATERMARK_NAME, last_event_id=0)
+        db.add(watermark)
+        await db.flush()
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.ACTIVITY_AGGREGATE_GRACE_SECONDS)
+    low = watermark.last_event_id
+    high = (await db.execute(
+        select(func.max(ActivityEvent.id))
+        .where(ActivityEvent.id > low)
+        .where(ActivityEvent.id <= low + settings.ACTIVITY_AGGREGATE_MAX_EVENTS)
+        .where(ActivityEvent.recorded_at <= cutoff)
+    )).scalar()
+    if high is None:
+        await db.commit()
+        return 0
+
+    in_range = (ActivityEvent.id > low, ActivityEvent.id <= high)
+    hour = utc_hour_expression(db, ActivityEvent.recorded_at)
+    totals = (await db.execute(
+        select(
+            ActivityEvent.user_id,
+            ActivityEvent.class_id,
+            ActivityEvent.day,
+            hour.label("hour"),
+            func.sum(ActivityEvent.duration_minutes).label("minutes"),
+            func.count().label("events")
+        )
+        .where(*in_range)
+        .group_by(ActivityEvent.user_id, ActivityEvent.class_id, ActivityEvent.day, hour)
+    )).all()
+
+    enrollment_minutes = defaultdict(int)
+    profile_minutes = defaultdict(int)
+    daily_minutes = defaultdict(int)
+    hourly_minutes = defaultdict(int)
+    for row in totals:
+        if not row.minutes:
+            continue
+        if row.class_id:
+            enrollment_minutes[(row.user_id, row.class_id)] += row.minutes
+        profile_minutes[row.user_id] += row.minutes
+        daily_minutes[(row.user_id, row.class_id, row.day)] += row.minutes
+        hourly_minutes[(row.user_id, row.class_id, utc_hour(row.hour))] += row.minutes
+
+    # Additive updates (executemany on the tables), so concurrent writers
+    # to these rows cannot be overwritten
+    if enrollment_minutes:
+        enrollments = ClassEnrollment.__table__
+        await db.execute(
+            update(enrollments)
+            .where(enrollments.c.user_id == bindparam("u_id"))
+            .where(enrollments.c.class_id == bindparam("c_id"))
+            .values(study_time_minutes=func.coalesce(enrollments.c.study_time_minutes, 0) + bindparam("minutes")),
+            [
+                {"u_id": user_id, "c_id": class_id, "minutes": minutes}
+                for (user_id, class_id), minutes in enrollment_minutes.items()
+            ]
+        )
+    if profile_minutes:
+        profiles = UserProfile.__table__
+        await db.execute(
+            update(profiles)
+            .where(profiles.c.user_id == bindparam("u_id"))
+            .values(total_study_hours=func.coalesce(profiles.c.total_study_hours, 0) + bindparam("hours")),
+            [
+                {"u_id": user_id, "hours": minutes / 60}
+                for user_id, minutes in profile_minutes.items()
+            ]
+        )
+    await bump_daily_rollups(db, {key: {"study_minutes": minutes} for key, minutes in daily_minutes.items()})
+    await bump_hourly_rollups(db, {key: {"study_minutes": minutes} for key, minutes in hourly_minutes.items()})
+
+    watermark.last_event_id = high
+    await db.commit()
+    publish_user_analytics_invalidations(profile_minutes)
+    mark_class_sketches_stale(STUDY_MINUTES, {class_id for _, class_id in enrollment_minutes})
+    return sum(row.events for row in totals)
@@ -0,0 +1,90 @@
+"""
+Result cache and conditional responses for analytics endpoints
+
+Dashboard endpoints are polled on every screen focus but change rarely.
+Responses are cached per worker as encoded JSON, keyed by
+(user_id, endpoint, *params), together with a strong ETag (a hash of the
+body). A request whose If-None-Match matches gets an empty 304, and a
+cache hit costs no database query either way.
+
+Writes that change a user's analytics (submissions, grades, chat messages,
+aggregated activity, enrollment and writing changes) drop every entry of
+that user across workers. Figures that depend on other users, such as
+percentile ranks, are only bounded by ANALYTICS_CACHE_TTL_SECONDS.
+
+A result is only cached if it cannot predate the user's last invalidation:
+not when an invalidation arrived while it was being built, and not within
+REPLICA_MAX_LAG_SECONDS of one when reads go to replicas, which may not
+have replayed the write yet. Such results are still served, just rebuilt
+on the next request.
+"""
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from typing import Any, Awaitable, Callable, Iterable
+import hashlib
+
+import orjson
+
+from app.core.cache import MISSING, TTLCache, broadcast_invalidation, publish_invalidations
+from app.core.config import settings
+
+ANALYTICS_CACHE = "analytics"
+
+analytics_cache = TTLCache(
+    ANALYTICS_CACHE,
+    maxsize=settings.ANALYTICS_CACHE_MAX_ENTRIES,
+    ttl=settings.ANALYTICS_CACHE_TTL_SECONDS
+)
+
+# Clients must revalidate, but may keep the body to revalidate against
+CACHE_CONTROL = "private, no-cache"
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def cached_json_response(
+    request: Request,
+    key: tuple,
+    build: Callable[[], Awaitable[Any]]
+) -> Response:
+    """
+    Serve key from the cache, or await build() and cache its encoded result.
+    key must start with the user ID the result belongs to.
+    """
+    entry = analytics_cache.get(key)
+    if entry is MISSING:
+        generation = analytics_cache.generation
+        body = orjson.dumps(jsonable_encoder(await build()))
+        entry = (_etag(body), body)
+        lag_window = settings.REPLICA_MAX_LAG_SECONDS if settings.DATABASE_REPLICA_URLS else 0
+        if (
+            analytics_cache.generation == generation
+            and not analytics_cache.invalidated_within(key[:1], lag_window)
+        ):
+            analytics_cache.set(key, entry)
+    etag, body = entry
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def invalidate_user_analytics(user_id: str):
+    """Drop a user's cached analytics in every API worker"""
+    await broadcast_invalidation(ANALYTICS_CACHE, prefix=(user_id,))
+
+
+def publish_user_analytics_invalidations(user_ids: Iterable[str]):
+    """invalidate_user_analytics for many users, from a Celery worker"""
+    publish_invalidations(ANALYTICS_CACHE, [(user_id,) for user_id in sorted(set(user_ids))])
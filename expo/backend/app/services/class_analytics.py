@@ -0,0 +1,311 @@
+"""
+Class-wide analytics for instructors
+
+Every figure is computed with grouped SQL over the whole class, so the cost
+does not grow with one query per student. The per-student export streams
+rows from a server-side cursor and encodes them partition by partition as
+CSV or Parquet, keeping memory bounded by the partition size rather than
+the class size.
+"""
+from sqlalchemy import select, func, and_, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from typing import AsyncIterator, Dict, List
+import csv
+import io
+
+from app.models.user import User
+from app.models.class_model import ClassEnrollment
+from app.models.assignment import Assignment, AssignmentSubmission
+from app.models.analytics import DailyStudyRollup
+
+# Rows fetched from the cursor and encoded per chunk of the response
+EXPORT_PARTITION_ROWS = 1000
+
+# (column, Arrow type) of each exported row, in output order
+EXPORT_COLUMNS = [
+    ("user_id", "string"),
+    ("username", "string"),
+    ("first_name", "string"),
+    ("last_name", "string"),
+    ("email", "string"),
+    ("role", "string"),
+    ("is_active", "bool"),
+    ("ai_assistance_level", "string"),
+    ("study_minutes", "int64"),
+    ("assignments_submitted", "int64"),
+    ("assignments_completed", "int64"),
+    ("assignments_late", "int64"),
+    ("assignments_graded", "int64"),
+    ("average_score_percent", "double"),
+    ("ai_assisted_submissions", "int64"),
+    ("average_ai_generated_percentage", "double"),
+    ("chat_sessions", "int64"),
+    ("chat_messages", "int64"),
+    ("tokens_used", "int64"),
+]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _graded():
+    return and_(
+        AssignmentSubmission.score.isnot(None),
+        Assignment.total_points.isnot(None),
+        Assignment.total_points != 0
+    )
+
+
+def _submitted():
+    return AssignmentSubmission.submitted_at.isnot(None)
+
+
+async def class_overview(db: AsyncSession, class_id: str) -> dict:
+    """Submission, AI-assistance, token and study time figures for a class"""
+    graded = _graded()
+    submitted = _submitted()
+
+    # One row per assignment, including those nobody has submitted yet
+    per_assignment = await db.execute(
+        select(
+            Assignment.id,
+            Assignment.title,
+            Assignment.due_date,
+            Assignment.total_points,
+            func.count(AssignmentSubmission.id).filter(submitted).label("submitted"),
+            func.count(AssignmentSubmission.id).filter(
+                AssignmentSubmission.status == "completed"
+            ).label("completed"),
+            func.count(AssignmentSubmission.id).filter(
+                AssignmentSubmission.is_late == True
+            ).label("late"),
+            func.count(AssignmentSubmission.id).filter(graded).label("graded"),
+            func.avg(AssignmentSubmission.score).filter(graded).label("average_score"),
+            func.count(AssignmentSubmission.id).filter(
+                AssignmentSubmission.ai_assistance_used == True
+            ).label("ai_assisted"),
+            func.avg(AssignmentSubmission.ai_generated_percentage).label("average_ai_generated_percentage")
+        )
+        .select_from(Assignment)
+        .outerjoin(AssignmentSubmission, AssignmentSubmission.assignment_id == Assignment.id)
+        .where(Assignment.class_id == class_id)
+        .group_by(Assignment.id, Assignment.title, Assignment.due_date, Assignment.total_points)
+        .order_by(Assignment.due_date, Assignment.title)
+    )
+
+    status_counts = await db.execute(
+        select(AssignmentSubmission.status, func.count(AssignmentSubmission.id))
+        .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+        .where(Assignment.class_id == class_id)
+        .group_by(AssignmentSubmission.status)
+    )
+
+    level_counts = await db.execute(
+        select(
+            func.coalesce(AssignmentSubmission.ai_assistance_level, "unknown"),
+            func.count(AssignmentSubmission.id).label("submissions"),
+            func.count(AssignmentSubmission.id).filter(
+                AssignmentSubmission.ai_assistance_used == True
+            ).label("ai_assisted"),
+            func.avg(AssignmentSubmission.ai_generated_percentage).label("average_ai_generated_percentage")
+        )
+        .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+        .where(Assignment.class_id == class_id)
+        .group_by(func.coalesce(AssignmentSubmission.ai_assistance_level, "unknown"))
+    )
+
+    def rollup_total(counter):
+        return (
+            select(func.coalesce(func.sum(counter), 0))
+            .where(DailyStudyRollup.class_id == class_id)
+            .scalar_subquery()
+        )
+
+    totals = (await db.execute(
+        select(
+            func.count(ClassEnrollment.id).filter(ClassEnrollment.role == "student").label("students"),
+            func.count(ClassEnrollment.id).filter(and_(
+                ClassEnrollment.role == "student",
+                ClassEnrollment.is_active == True
+            )).label("active_students"),
+            func.coalesce(func.sum(ClassEnrollment.study_time_minutes).filter(
+                ClassEnrollment.role == "student"
+            ), 0).label("study_minutes"),
+            rollup_total(DailyStudyRollup.chat_sessions).label("chat_sessions"),
+            rollup_total(DailyStudyRollup.chat_messages).label("chat_messages"),
+            rollup_total(DailyStudyRollup.tokens_used).label("tokens_used")
+        )
+        .where(ClassEnrollment.class_id == class_id)
+    )).one()
+    students, active_students, study_minutes, chat_sessions, chat_messages, tokens_used = totals
+
+    assignments = []
+    for row in per_assignment:
+        average_score = row.average_score
+        assignments.append({
+            "assignment_id": row.id,
+            "title": row.title,
+            "due_date": row.due_date,
+            "submitted": row.submitted,
+            "completed": row.completed,
+            "late": row.late,
+            "graded": row.graded,
+            "average_score_percent": (
+                average_score / row.total_points * 100
+                if average_score is not None and row.total_points else None
+            ),
+            "ai_assisted": row.ai_assisted,
+            "average_ai_generated_percentage": row.average_ai_generated_percentage
+        })
+
+    return {
+        "class_id": class_id,
+        "students": students,
+        "active_students": active_students,
+        "submission_status": {status or "unknown": count for status, count in status_counts},
+        "ai_assistance": {
+            level: {
+                "submissions": submissions,
+                "ai_assisted": ai_assisted,
+                "average_ai_generated_percentage": average_percentage
+            }
+            for level, submissions, ai_assisted, average_percentage in level_counts
+        },
+        "study_hours": study_minutes / 60,
+        "average_study_hours": study_minutes / 60 / students if students else 0,
+        "chat_sessions": chat_sessions,
+        "chat_messages": chat_messages,
+        "tokens_used": tokens_used,
+        "assignments": assignments
+    }
+
+
+def student_export_query(class_id: str) -> Select:
+    """One row per enrolled user with the EXPORT_COLUMNS, ordered by username"""
+    graded = _graded()
+    submissions = (
+        select(
+            AssignmentSubmission.user_id,
+            func.count(AssignmentSubmission.id).filter(_submitted()).label("submitted"),
+            func.count(AssignmentSubmission.id).filter(
+                AssignmentSubmission.status == "completed"
+            ).label("completed"),
+            func.count(AssignmentSubmission.id).filter(
+                AssignmentSubmission.is_late == True
+            ).label("late"),
+            func.count(AssignmentSubmission.id).filter(graded).label("graded"),
+            func.sum(AssignmentSubmission.score).filter(graded).label("earned"),
+            func.sum(Assignment.total_points).filter(graded).label("possible"),
+            func.count(AssignmentSubmission.id).filter(
+                AssignmentSubmission.ai_assistance_used == True
+            ).label("ai_assisted"),
+            func.avg(AssignmentSubmission.ai_generated_percentage).label("ai_generated")
+        )
+        .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+        .where(Assignment.class_id == class_id)
+        .group_by(AssignmentSubmission.user_id)
+        .subquery()
+    )
+    chat = (
+        select(
+            DailyStudyRollup.user_id,
+            func.sum(DailyStudyRollup.chat_sessions).label("chat_sessions"),
+            func.sum(DailyStudyRollup.chat_messages).label("chat_messages"),
+            func.sum(DailyStudyRollup.tokens_used).label("tokens_used")
+        )
+        .where(DailyStudyRollup.class_id == class_id)
+        .group_by(DailyStudyRollup.user_id)
+        .subquery()
+    )
+
+    return (
+        select(
+            ClassEnrollment.user_id.label("user_id"),
+            User.username.label("username"),
+            User.first_name.label("first_name"),
+            User.last_name.label("last_name"),
+            User.email.label("email"),
+            ClassEnrollment.role.label("role"),
+            ClassEnrollment.is_active.label("is_active"),
+            ClassEnrollment.ai_assistance_level.label("ai_assistance_level"),
+            func.coalesce(ClassEnrollment.study_time_minutes, 0).label("study_minutes"),
+            func.coalesce(submissions.c.submitted, 0).label("assignments_submitted"),
+            func.coalesce(submissions.c.completed, 0).label("assignments_completed"),
+            func.coalesce(submissions.c.late, 0).label("assignments_late"),
+            func.coalesce(submissions.c.graded, 0).label("assignments_graded"),
+            case(
+                (submissions.c.possible > 0, submissions.c.earned * 100.0 / submissions.c.possible),
+                else_=None
+            ).label("average_score_percent"),
+            func.coalesce(submissions.c.ai_assisted, 0).label("ai_assisted_submissions"),
+            submissions.c.ai_generated.label("average_ai_generated_percentage"),
+            func.coalesce(chat.c.chat_sessions, 0).label("chat_sessions"),
+            func.coalesce(chat.c.chat_messages, 0).label("chat_messages"),
+            func.coalesce(chat.c.tokens_used, 0).label("tokens_used")
+        )
+        .join(User, User.id == ClassEnrollment.user_id)
+        .outerjoin(submissions, submissions.c.user_id == ClassEnrollment.user_id)
+        .outerjoin(chat, chat.c.user_id == ClassEnrollment.user_id)
+        .where(ClassEnrollment.class_id == class_id)
+        .order_by(User.username)
+    )
+
+
+async def _partitions(db: AsyncSession, query: Select) -> AsyncIterator[List[tuple]]:
+    result = await db.stream(query.execution_options(yield_per=EXPORT_PARTITION_ROWS))
+    async for partition in result.partitions():
+        yield partition
+
+
+async def stream_csv(db: AsyncSession, query: Select) -> AsyncIterator[bytes]:
+    """Encode query rows as CSV, one chunk per cursor partition"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    async for partition in _partitions(db, query):
+        writer.writerows(partition)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose written bytes are drained by the caller"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+async def stream_parquet(db: AsyncSession, query: Select) -> AsyncIterator[bytes]:
+    """Encode query rows as Parquet, one row group per cursor partition"""
+    # pyarrow is only needed by this export
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.type_for_alias(arrow_type)) for name, arrow_type in EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        async for partition in _partitions(db, query):
+            columns: Dict[str, list] = {name: [] for name, _ in EXPORT_COLUMNS}
+            for row in partition:
+                for (name, _), value in zip(EXPORT_COLUMNS, row):
+                    columns[name].append(value)
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
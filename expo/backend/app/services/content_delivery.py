@@ -0,0 +1,185 @@
+"""
+Serving uploaded material files
+
+Local files are sent without copying them through Python where the stack
+allows it: behind nginx via X-Accel-Redirect, or with the ASGI zero-copy
+(sendfile) extension when the server offers it. Otherwise the file is
+streamed in bounded chunks. Object storage files are served through
+presigned URLs so the bytes never touch the API at all.
+"""
+from pathlib import Path
+from typing import Optional, Tuple
+import hashlib
+import os
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+CHUNK_SIZE = 256 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+OBJECT_STORAGE_PREFIX = "s3://"
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file"""
+
+
+def is_object_storage_path(file_path: str) -> bool:
+    """Check if a material lives in S3/MinIO rather than on local disk"""
+    return file_path.startswith(OBJECT_STORAGE_PREFIX)
+
+
+def resolve_local_path(file_path: str) -> Path:
+    """Resolve a stored file path against the upload directory"""
+    path = Path(file_path)
+    if not path.is_absolute():
+        path = Path(settings.UPLOAD_DIR) / path
+    return path
+
+
+def compute_content_hash(path: Path) -> str:
+    """SHA-256 of a file, read in bounded chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_range(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range "bytes=" header into an inclusive (start, end).
+
+    Returns None when the whole file should be sent (no header, an unknown
+    unit or multiple ranges, which servers may ignore per RFC 9110).
+    """
+    if not range_header:
+        return None
+
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(file_size - length, 0), file_size - 1
+
+        start = int(start_text)
+        end = int(end_text) if end_text else file_size - 1
+    except ValueError:
+        return None
+
+    if start >= file_size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, file_size - 1)
+
+
+def presigned_url(file_path: str) -> str:
+    """Create a time-limited GET URL for an object storage path (s3://bucket/key)"""
+    import boto3
+
+    bucket, _, key = file_path[len(OBJECT_STORAGE_PREFIX):].partition("/")
+    if settings.MINIO_ENDPOINT:
+        client = boto3.client(
+            "s3",
+            endpoint_url=f"http://{settings.MINIO_ENDPOINT}",
+            aws_access_key_id=settings.MINIO_ACCESS_KEY,
+            aws_secret_access_key=settings.MINIO_SECRET_KEY
+        )
+    else:
+        client = boto3.client(
+            "s3",
+            region_name=settings.AWS_REGION,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
+        )
+
+    return client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key},
+        ExpiresIn=settings.PRESIGNED_URL_EXPIRE_SECONDS
+    )
+
+
+class FileRangeResponse(Response):
+    """Send a byte range of a local file with as little copying as possible"""
+
+    def __init__(
+        self,
+        path: Path,
+        start: int,
+        end: int,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None
+    ):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers
+        })
+
+        if scope["method"] == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopy" in scope.get("extensions", {}):
+                # The server calls sendfile(2); the bytes stay in the kernel
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f,
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False
+                })
+                return
+
+            fd = f.fileno()
+            offset = self.start
+            remaining = self.count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(
+                    os.pread, fd, min(CHUNK_SIZE, remaining), offset
+                )
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0
+                })
+
+        if remaining > 0:
+            # File shrank underneath us; terminate the body
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def accel_redirect_path(path: Path) -> Optional[str]:
+    """Map a local file to its internal nginx location, if X-Accel is configured"""
+    prefix = settings.DOWNLOAD_ACCEL_REDIRECT_PREFIX
+    if not prefix:
+        return None
+    try:
+        relative = path.resolve().relative_to(Path(settings.UPLOAD_DIR).resolve())
+    except ValueError:
+        return None
+    return f"{prefix.rstrip('/')}/{relative.as_posix()}"
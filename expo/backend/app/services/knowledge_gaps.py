@@ -0,0 +1,336 @@
+"""
+Incremental knowledge-gap detection over class chat traffic
+
+Each run reads the user questions posted since the last watermark, embeds
+them, and folds them into per-class topic clusters with one mini-batch
+k-means step (Sculley, 2010): every centroid moves toward the mean of its
+new members with a learning rate of 1 / (questions seen by the cluster).
+Clusters are labelled by their most frequent keywords.
+
+Per-user question counts per cluster are kept with additive upserts, and
+only the enrollments of users who asked something in the batch are
+rewritten: topics_covered lists every topic the student asked about,
+knowledge_gaps the ones they keep coming back to. A run therefore costs
+O(new messages), however long the chat history grows.
+
+numpy and scikit-learn are only imported by the worker task that runs this.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Sequence, Tuple
+import re
+
+import numpy as np
+from sqlalchemy import and_, bindparam, delete, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.analytics import AggregationWatermark, TopicCluster, TopicQuestionCount
+from app.models.chat import ChatMessage, ChatSession, MessageRole
+from app.models.class_model import ClassEnrollment
+from app.services.analytics_cache import publish_user_analytics_invalidations
+
+WATERMARK_NAME = "knowledge_gaps"
+
+# Keywords kept per cluster for labelling
+MAX_CLUSTER_KEYWORDS = 50
+LABEL_KEYWORDS = 3
+
+# Characters of each question sent for embedding
+MAX_EMBED_CHARS = 2000
+EMBED_BATCH_SIZE = 256
+
+# Questions this close to an existing centroid never seed a new cluster
+DUPLICATE_SIMILARITY = 0.98
+
+WORD_PATTERN = re.compile(r"[a-z][a-z0-9+#\-]{2,}")
+STOPWORDS = frozenset("""
+    about above after again against all also and any are because been before being below between both
+    but can cannot could did does doing down during each few for from further get got had has have
+    having her here hers how into its just let like make many may might more most much must need not
+    now off once only other our out over own please same she should some such than that the their
+    them then there these they this those through too under until use used using very want was way
+    were what when where which while who whom why will with would you your yours explain help know
+    understand question tell thanks thank give show does mean means example examples really still
+""".split())
+
+Embedder = Callable[[List[str]], Awaitable[np.ndarray]]
+
+
+def keywords(text: str) -> List[str]:
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+
+def cluster_label(keyword_counts: Dict[str, int], cluster_index: int) -> str:
+    top = [word for word, _ in Counter(keyword_counts).most_common(LABEL_KEYWORDS)]
+    return " / ".join(top) if top else f"Topic {cluster_index + 1}"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def minibatch_step(
+    centroids: np.ndarray,
+    counts: np.ndarray,
+    batch: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Assign a batch of unit vectors to the nearest centroid (cosine) and move
+    each centroid toward its new members. Returns (centroids, counts,
+    assignments); the inputs are not modified.
+    """
+    assignments = np.argmax(batch @ centroids.T, axis=1)
+    k = centroids.shape[0]
+    batch_counts = np.bincount(assignments, minlength=k)
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, assignments, batch)
+
+    new_counts = counts + batch_counts
+    touched = batch_counts > 0
+    # Per-center learning rate 1/n applied to the batch mean
+    rate = np.zeros(k, dtype=centroids.dtype)
+    rate[touched] = batch_counts[touched] / new_counts[touched]
+    means = np.zeros_like(centroids)
+    means[touched] = sums[touched] / batch_counts[touched, None]
+
+    updated = centroids * (1 - rate[:, None]) + means * rate[:, None]
+    return _normalize(updated), new_counts, assignments
+
+
+def seed_centroids(centroids: np.ndarray, batch: np.ndarray, k: int) -> np.ndarray:
+    """
+    Add centroids until there are k (or the batch runs out of distinct
+    questions): k-means++ on the first batch of a class, then the batch
+    questions least similar to any existing centroid. Classes start with
+    few questions, so clusters are added as traffic arrives.
+    """
+    if len(centroids) == 0:
+        from sklearn.cluster import kmeans_plusplus
+
+        centers, _ = kmeans_plusplus(batch, n_clusters=min(k, len(batch)), random_state=0)
+        centers = _normalize(centers.astype(np.float32))
+        # k-means++ picks repeats when the batch has fewer distinct questions than k
+        centroids = centers[:1]
+        for center in centers[1:]:
+            if np.max(centroids @ center) < DUPLICATE_SIMILARITY:
+                centroids = np.vstack([centroids, center])
+
+    while len(centroids) < k:
+        similarity = np.max(batch @ centroids.T, axis=1)
+        farthest = int(np.argmin(similarity))
+        if similarity[farthest] >= DUPLICATE_SIMILARITY:
+            break
+        centroids = np.vstack([centroids, batch[farthest]])
+    return centroids
+
+
+async def openai_embedder(texts: List[str]) -> np.ndarray:
+    """Embed texts with the OpenAI embeddings API, in batches"""
+    from openai import AsyncOpenAI
+    from app.core.services import create_http_client
+
+    async with create_http_client() as http_client:
+        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client)
+        vectors = []
+        for offset in range(0, len(texts), EMBED_BATCH_SIZE):
+            response = await client.embeddings.create(
+                model=settings.KNOWLEDGE_GAP_EMBEDDING_MODEL,
+                input=texts[offset:offset + EMBED_BATCH_SIZE]
+            )
+            vectors.extend(item.embedding for item in response.data)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _count_upsert(db: AsyncSession, rows: List[dict]):
+    dialect = db.get_bind().dialect.name
+    stmt = (postgresql if dialect == "postgresql" else sqlite).insert(TopicQuestionCount).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "class_id", "cluster_index"],
+        set_={"question_count": TopicQuestionCount.question_count + stmt.excluded.question_count}
+    )
+
+
+async def _lock_watermark(db: AsyncSession) -> AggregationWatermark:
+    watermark = (await db.execute(
+        select(AggregationWatermark)
+        .where(AggregationWatermark.name == WATERMARK_NAME)
+        .with_for_update()
+    )).scalar()
+    if watermark is None:
+        watermark = AggregationWatermark(name=WATERMARK_NAME, last_event_id=0)
+        db.add(watermark)
+        await db.flush()
+    return watermark
+
+
+async def _new_questions(db: AsyncSession, watermark: AggregationWatermark) -> Sequence:
+    """User turns after the watermark, oldest first, in (created_at, id) order"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.KNOWLEDGE_GAP_GRACE_SECONDS)
+    query = (
+        select(
+            ChatMessage.id,
+            ChatMessage.created_at,
+            ChatMessage.content,
+            ChatSession.user_id,
+            ChatSession.class_id
+        )
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+        .where(ChatMessage.role == MessageRole.USER)
+        .where(ChatMessage.created_at <= cutoff)
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+        .limit(settings.KNOWLEDGE_GAP_BATCH_MESSAGES)
+    )
+    if watermark.last_event_at is not None:
+        query = query.where(or_(
+            ChatMessage.created_at > watermark.last_event_at,
+            and_(
+                ChatMessage.created_at == watermark.last_event_at,
+                ChatMessage.id > watermark.last_event_key
+            )
+        ))
+    return (await db.execute(query)).all()
+
+
+async def _update_class_clusters(
+    db: AsyncSession,
+    class_id: str,
+    vectors: np.ndarray,
+    texts: List[str]
+) -> np.ndarray:
+    """Fold one class's batch into its clusters; returns each row's cluster index"""
+    clusters = list((await db.execute(
+        select(TopicCluster)
+        .where(TopicCluster.class_id == class_id)
+        .order_by(TopicCluster.cluster_index)
+        .with_for_update()
+    )).scalars())
+
+    dimension = vectors.shape[1]
+    if clusters and len(clusters[0].centroid) != dimension * 4:
+        # The embedding model changed; start the class over, including the
+        # per-student counts whose cluster indices would point at new clusters
+        for cluster in clusters:
+            await db.delete(cluster)
+        await db.execute(delete(TopicQuestionCount).where(TopicQuestionCount.class_id == class_id))
+        await db.flush()
+        clusters = []
+
+    if clusters:
+        centroids = np.stack([np.frombuffer(cluster.centroid, dtype=np.float32) for cluster in clusters])
+    else:
+        centroids = np.empty((0, dimension), dtype=np.float32)
+
+    if len(clusters) < settings.KNOWLEDGE_GAP_CLUSTERS:
+        centroids = seed_centroids(centroids, vectors, settings.KNOWLEDGE_GAP_CLUSTERS)
+        for index in range(len(clusters), len(centroids)):
+            cluster = TopicCluster(class_id=class_id, cluster_index=index, question_count=0, keywords={})
+            db.add(cluster)
+            clusters.append(cluster)
+    counts = np.array([cluster.question_count for cluster in clusters], dtype=np.int64)
+
+    centroids, counts, assignments = minibatch_step(centroids, counts, vectors)
+
+    new_keywords = defaultdict(Counter)
+    for text, index in zip(texts, assignments):
+        new_keywords[index].update(keywords(text))
+
+    for index, cluster in enumerate(clusters):
+        cluster.centroid = centroids[index].astype(np.float32).tobytes()
+        cluster.question_count = int(counts[index])
+        merged = Counter(cluster.keywords or {})
+        merged.update(new_keywords.get(index, {}))
+        cluster.keywords = dict(merged.most_common(MAX_CLUSTER_KEYWORDS))
+        cluster.label = cluster_label(cluster.keywords, index)
+
+    return assignments
+
+
+async def _refresh_enrollments(db: AsyncSession, pairs: set):
+    """Rewrite topics_covered and knowledge_gaps for (user_id, class_id) pairs"""
+    class_ids = {class_id for _, class_id in pairs}
+    user_ids = {user_id for user_id, _ in pairs}
+
+    labels = {
+        (row.class_id, row.cluster_index): row.label
+        for row in await db.execute(
+            select(TopicCluster.class_id, TopicCluster.cluster_index, TopicCluster.label)
+            .where(TopicCluster.class_id.in_(class_ids))
+        )
+    }
+    counts = defaultdict(list)
+    for count in (await db.execute(
+        select(TopicQuestionCount)
+        .where(TopicQuestionCount.class_id.in_(class_ids))
+        .where(TopicQuestionCount.user_id.in_(user_ids))
+        .order_by(TopicQuestionCount.question_count.desc())
+    )).scalars():
+        if (count.user_id, count.class_id) in pairs:
+            counts[(count.user_id, count.class_id)].append(count)
+
+    params = []
+    for (user_id, class_id), rows in counts.items():
+        topics = [labels[(class_id, row.cluster_index)] for row in rows if (class_id, row.cluster_index) in labels]
+        gaps = [
+            labels[(class_id, row.cluster_index)] for row in rows
+            if row.question_count >= settings.KNOWLEDGE_GAP_MIN_QUESTIONS and (class_id, row.cluster_index) in labels
+        ][:settings.KNOWLEDGE_GAP_MAX_GAPS]
+        params.append({"u_id": user_id, "c_id": class_id, "topics": topics, "gaps": gaps})
+
+    if params:
+        enrollments = ClassEnrollment.__table__
+        await db.execute(
+            update(enrollments)
+            .where(enrollments.c.user_id == bindparam("u_id"))
+            .where(enrollments.c.class_id == bindparam("c_id"))
+            .values(topics_covered=bindparam("topics"), knowledge_gaps=bindparam("gaps")),
+            params
+        )
+
+
+async def detect_knowledge_gaps(db: AsyncSession, embed: Embedder = openai_embedder) -> int:
+    """
+    Process user questions posted since the last run. The watermark row is
+    locked, so concurrent runs serialize. Returns the number of messages
+    processed.
+    """
+    watermark = await _lock_watermark(db)
+    messages = await _new_questions(db, watermark)
+    if not messages:
+        await db.commit()
+        return 0
+
+    texts = [message.content[:MAX_EMBED_CHARS] for message in messages]
+    vectors = _normalize(np.asarray(await embed(texts), dtype=np.float32))
+
+    by_class = defaultdict(list)
+    for position, message in enumerate(messages):
+        by_class[message.class_id].append(position)
+
+    question_counts = Counter()
+    for class_id, positions in by_class.items():
+        assignments = await _update_class_clusters(
+            db,
+            class_id,
+            vectors[positions],
+            [texts[position] for position in positions]
+        )
+        for position, cluster_index in zip(positions, assignments):
+            question_counts[(messages[position].user_id, class_id, int(cluster_index))] += 1
+
+    if question_counts:
+        await db.flush()
+        await db.execute(_count_upsert(db, [
+            {"user_id": user_id, "class_id": class_id, "cluster_index": cluster_index, "question_count": count}
+            for (user_id, class_id, cluster_index), count in question_counts.items()
+        ]))
+        await _refresh_enrollments(db, {(user_id, class_id) for user_id, class_id, _ in question_counts})
+
+    last = messages[-1]
+    watermark.last_event_at = last.created_at
+    watermark.last_event_key = last.id
+    await db.commit()
+    publish_user_analytics_invalidations(user_id for user_id, _, _ in question_counts)
+    return len(messages)
@@ -0,0 +1,201 @@
+"""
+Fair-share scheduler for material processing
+
+Materials are not put on the Celery queue directly. They wait in Redis in
+one flow per (class, user), and at most SCHEDULER_MAX_INFLIGHT of them are
+released to Celery at a time using weighted fair queuing:
+
+- Within a flow, the smallest material goes first.
+- Across flows, the flow whose head has the lowest virtual finish tag goes
+  first. A tag grows with the size of the material and with the number of
+  active flows in the same class, so a class gets the same overall share no
+  matter how many people upload to it, and each uploader gets an equal part
+  of their class's share.
+
+One user uploading 40 videos therefore only delays their own queue, while a
+one-page handout from another class is dispatched almost immediately.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+import time
+
+import redis
+
+from app.core.config import settings
+
+PREFIX = "sched"
+FLOWS_KEY = f"{PREFIX}:flows"              # ZSET flow -> virtual finish tag of its head
+VTIME_KEY = f"{PREFIX}:vtime"              # virtual time (tag of last dispatched job)
+CLASS_FLOWS_KEY = f"{PREFIX}:class_flows"  # HASH class -> active flows in class
+DEPTH_KEY = f"{PREFIX}:depth"              # HASH class -> pending jobs
+INFLIGHT_KEY = f"{PREFIX}:inflight"        # HASH material -> dispatch timestamp
+WAIT_SUM_KEY = f"{PREFIX}:wait_sum"        # HASH class -> total wait seconds
+WAIT_COUNT_KEY = f"{PREFIX}:wait_count"    # HASH class -> dispatched jobs
+WAIT_MAX_KEY = f"{PREFIX}:wait_max"        # HASH class -> longest wait seconds
+
+
+_SUBMIT_SCRIPT = """
+local material_id, class_id, user_id = ARGV[1], ARGV[2], ARGV[3]
+local cost, now = tonumber(ARGV[4]), ARGV[5]
+local flow = class_id .. ':' .. user_id
+local flow_key = 'sched:flow:' .. flow
+
+if redis.call('EXISTS', 'sched:job:' .. material_id) == 1 then
+    return 0
+end
+
+redis.call('ZADD', flow_key, cost, material_id)
+redis.call('HSET', 'sched:job:' .. material_id,
+    'flow', flow, 'class', class_id, 'cost', cost, 'enqueued_at', now)
+redis.call('HINCRBY', 'sched:depth', class_id, 1)
+
+if not redis.call('ZSCORE', 'sched:flows', flow) then
+    local active = redis.call('HINCRBY', 'sched:class_flows', class_id, 1)
+    local vtime = tonumber(redis.call('GET', 'sched:vtime') or '0')
+    local head = redis.call('ZRANGE', flow_key, 0, 0, 'WITHSCORES')
+    redis.call('ZADD', 'sched:flows', vtime + tonumber(head[2]) * active, flow)
+end
+return 1
+"""
+
+_DISPATCH_SCRIPT = """
+local max_inflight, now = tonumber(ARGV[1]), tonumber(ARGV[2])
+local dispatched = {}
+
+while redis.call('HLEN', 'sched:inflight') < max_inflight do
+    local head = redis.call('ZRANGE', 'sched:flows', 0, 0, 'WITHSCORES')
+    if #head == 0 then
+        break
+    end
+
+    local flow, tag = head[1], tonumber(head[2])
+    local flow_key = 'sched:flow:' .. flow
+    redis.call('SET', 'sched:vtime', tag)
+
+    local item = redis.call('ZPOPMIN', flow_key)
+    local material_id = item[1]
+    local job = redis.call('HMGET', 'sched:job:' .. material_id, 'class', 'enqueued_at')
+    local class_id = job[1]
+    local waited = now - tonumber(job[2])
+
+    redis.call('HINCRBY', 'sched:depth', class_id, -1)
+    redis.call('HINCRBYFLOAT', 'sched:wait_sum', class_id, waited)
+    redis.call('HINCRBY', 'sched:wait_count', class_id, 1)
+    local longest = tonumber(redis.call('HGET', 'sched:wait_max', class_id) or '0')
+    if waited > longest then
+        redis.call('HSET', 'sched:wait_max', class_id, waited)
+    end
+    redis.call('HSET', 'sched:inflight', material_id, now)
+    redis.call('DEL', 'sched:job:' .. material_id)
+
+    local next_head = redis.call('ZRANGE', flow_key, 0, 0, 'WITHSCORES')
+    if #next_head == 0 then
+        redis.call('ZREM', 'sched:flows', flow)
+        redis.call('HINCRBY', 'sched:class_flows', class_id, -1)
+    else
+        local active = tonumber(redis.call('HGET', 'sched:class_flows', class_id) or '1')
+        redis.call('ZADD', 'sched:flows', tag + tonumber(next_head[2]) * active, flow)
+    end
+
+    table.insert(dispatched, material_id)
+end
+return dispatched
+"""
+
+_REMOVE_SCRIPT = """
+local material_id = ARGV[1]
+local job = redis.call('HMGET', 'sched:job:' .. material_id, 'flow', 'class')
+local flow, class_id = job[1], job[2]
+if not flow then
+    return 0
+end
+
+local flow_key = 'sched:flow:' .. flow
+redis.call('ZREM', flow_key, material_id)
+redis.call('DEL', 'sched:job:' .. material_id)
+redis.call('HINCRBY', 'sched:depth', class_id, -1)
+
+if redis.call('ZCARD', flow_key) == 0 then
+    redis.call('ZREM', 'sched:flows', flow)
+    redis.call('HINCRBY', 'sched:class_flows', class_id, -1)
+end
+return 1
+"""
+
+
+@dataclass
+class QueueStats:
+    """Queue metrics for one class"""
+    class_id: str
+    pending: int
+    dispatched: int
+    average_wait_seconds: float
+    max_wait_seconds: float
+
+
+def material_cost(file_size: Optional[int]) -> float:
+    """Scheduling cost of a material, proportional to its size"""
+    return 1.0 + (file_size or 0) / settings.SCHEDULER_COST_UNIT_BYTES
+
+
+class MaterialScheduler:
+    """Fair-share admission control in front of process_material_async"""
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._submit = client.register_script(_SUBMIT_SCRIPT)
+        self._dispatch = client.register_script(_DISPATCH_SCRIPT)
+        self._remove = client.register_script(_REMOVE_SCRIPT)
+
+    def submit(self, material_id: str, class_id: str, user_id: str, file_size: Optional[int]) -> bool:
+        """Add a material to its flow; returns False if it is already queued"""
+        return bool(self._submit(args=[
+            material_id,
+            class_id,
+            user_id,
+            material_cost(file_size),
+            time.time()
+        ]))
+
+    def pop_ready(self) -> List[str]:
+        """Take materials that may start now, up to the in-flight limit"""
+        return self._dispatch(args=[settings.SCHEDULER_MAX_INFLIGHT, time.time()])
+
+    def remove(self, material_id: str) -> bool:
+        """Drop a material that has not been dispatched yet; returns False if it was not pending"""
+        return bool(self._remove(args=[material_id]))
+
+    def release(self, material_id: str):
+        """Free the in-flight slot held by a material"""
+        self.client.hdel(INFLIGHT_KEY, material_id)
+
+    def reclaim_expired(self) -> List[str]:
+        """Free slots held longer than the lease, e.g. after a worker crash"""
+        cutoff = time.time() - settings.SCHEDULER_LEASE_SECONDS
+        expired = [
+            material_id
+            for material_id, started in self.client.hgetall(INFLIGHT_KEY).items()
+            if float(started) < cutoff
+        ]
+        if expired:
+            self.client.hdel(INFLIGHT_KEY, *expired)
+        return expired
+
+
+async def get_class_queue_stats(client, class_id: str) -> QueueStats:
+    """Read queue depth and wait-time metrics for a class (asyncio client)"""
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.hget(DEPTH_KEY, class_id)
+        pipe.hget(WAIT_COUNT_KEY, class_id)
+        pipe.hget(WAIT_SUM_KEY, class_id)
+        pipe.hget(WAIT_MAX_KEY, class_id)
+        pending, dispatched, wait_sum, wait_max = await pipe.execute()
+
+    dispatched = int(dispatched or 0)
+    return QueueStats(
+        class_id=class_id,
+        pending=int(pending or 0),
+        dispatched=dispatched,
+        average_wait_seconds=float(wait_sum or 0) / dispatched if dispatched else 0.0,
+        max_wait_seconds=float(wait_max or 0)
+    )
@@ -0,0 +1,137 @@
+"""
+Material processing progress events and cooperative cancellation
+
+Workers publish progress to a Redis channel per material and keep the latest
+event in a key, so subscribers get the current state immediately and then
+every change as it happens. Cancellation is a flag that workers check
+between units of work (processing stages and transcription segments).
+"""
+from typing import AsyncIterator, Optional
+import json
+import time
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# Progress and cancel keys outlive any realistic processing run
+STATE_TTL_SECONDS = 24 * 60 * 60
+
+KEEPALIVE_SECONDS = 15.0
+
+
+class ProcessingCancelled(Exception):
+    """Raised inside a worker when a material's processing was cancelled"""
+
+
+def _channel(material_id: str) -> str:
+    return f"material:{material_id}:progress"
+
+
+def _last_key(material_id: str) -> str:
+    return f"material:{material_id}:progress:last"
+
+
+def _cancel_key(material_id: str) -> str:
+    return f"material:{material_id}:cancel"
+
+
+def _segments_done_key(material_id: str) -> str:
+    return f"material:{material_id}:segments_done"
+
+
+def publish_progress(
+    client,
+    material_id: str,
+    stage: str,
+    percent: float,
+    status: str = "processing",
+    detail: Optional[str] = None
+):
+    """Publish a progress event from a worker (synchronous client)"""
+    event = json.dumps({
+        "material_id": material_id,
+        "status": status,
+        "stage": stage,
+        "percent": round(min(max(percent, 0.0), 100.0), 1),
+        "detail": detail,
+        "timestamp": time.time()
+    })
+    pipe = client.pipeline(transaction=False)
+    pipe.set(_last_key(material_id), event, ex=STATE_TTL_SECONDS)
+    pipe.publish(_channel(material_id), event)
+    pipe.execute()
+
+
+def reset_progress(client, material_id: str):
+    """
+    Clear progress state before a new run.
+
+    The cancel flag is kept: a cancel requested before the run was queued
+    must still stop it. Explicit reprocessing clears it with clear_cancel.
+    """
+    client.delete(_last_key(material_id), _segments_done_key(material_id))
+
+
+def mark_segment_done(client, material_id: str) -> int:
+    """Count a finished transcription segment; returns segments done so far"""
+    pipe = client.pipeline(transaction=False)
+    pipe.incr(_segments_done_key(material_id))
+    pipe.expire(_segments_done_key(material_id), STATE_TTL_SECONDS)
+    done, _ = pipe.execute()
+    return done
+
+
+def is_cancelled(client, material_id: str) -> bool:
+    """Check the cancel flag (synchronous client)"""
+    return bool(client.exists(_cancel_key(material_id)))
+
+
+def check_cancelled(client, material_id: str):
+    """Raise ProcessingCancelled if cancellation was requested"""
+    if is_cancelled(client, material_id):
+        raise ProcessingCancelled(material_id)
+
+
+async def request_cancel(client, material_id: str):
+    """Ask workers to stop processing a material (asyncio client)"""
+    await client.set(_cancel_key(material_id), "1", ex=STATE_TTL_SECONDS)
+
+
+async def clear_cancel(client, material_id: str):
+    """Drop an earlier cancel request before reprocessing (asyncio client)"""
+    await client.delete(_cancel_key(material_id))
+
+
+async def progress_events(client, material_id: str) -> AsyncIterator[Optional[dict]]:
+    """
+    Yield progress events for a material until it reaches a terminal status.
+
+    Yields None every KEEPALIVE_SECONDS without events so callers can keep
+    idle connections open.
+    """
+    pubsub = client.pubsub()
+    # Subscribe before reading the last event so no update is missed in between
+    await pubsub.subscribe(_channel(material_id))
+    try:
+        last = await client.get(_last_key(material_id))
+        if last:
+            event = json.loads(last)
+            yield event
+            if event["status"] in TERMINAL_STATUSES:
+                return
+
+        while True:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=KEEPALIVE_SECONDS
+            )
+            if message is None:
+                yield None
+                continue
+
+            event = json.loads(message["data"])
+            yield event
+            if event["status"] in TERMINAL_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe(_channel(material_id))
+        await pubsub.reset()
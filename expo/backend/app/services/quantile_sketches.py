@@ -0,0 +1,261 @@
+"""
+Persisted quantile sketches for percentile ranks within classes
+
+Sketches are kept for:
+  * ("assignment", assignment_id, "score_percent"): graded submissions of
+    an assignment, as a percentage of its total points
+  * ("class", class_id, "current_grade"): current grade of each student,
+    earned over possible points across their graded submissions
+  * ("class", class_id, "study_minutes"): study time of each student
+
+Grades are merged into the assignment sketch as they are recorded, in the
+grading transaction with the sketch row locked. A regrade rebuilds only
+that assignment's sketch from its submissions, since sketches cannot
+remove values.
+
+The class sketches hold one value per student, and a grade or aggregated
+activity replaces that student's earlier value, which a sketch cannot
+remove either. They are rebuilt off the write path instead: after
+committing, writers add the class to a Redis set of stale sketches, and
+the analytics.rebuild_class_sketches task rebuilds each stale class once
+per QUANTILE_SKETCH_REBUILD_INTERVAL_SECONDS, however many writes it saw.
+Class percentiles may lag by that interval.
+
+Reading a percentile rank is one primary-key lookup and a scan of a few
+hundred floats.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.redis import get_async_redis, get_redis
+from app.core.sketches import KLLSketch
+from app.models.analytics import QuantileSketch
+from app.models.assignment import Assignment, AssignmentSubmission
+from app.models.class_model import ClassEnrollment
+
+logger = logging.getLogger(__name__)
+
+CLASS = "class"
+ASSIGNMENT = "assignment"
+
+SCORE_PERCENT = "score_percent"
+CURRENT_GRADE = "current_grade"
+STUDY_MINUTES = "study_minutes"
+
+SketchKey = Tuple[str, str, str]  # (scope, scope_id, metric)
+
+# Members are "<metric>:<class_id>" of class sketches waiting for a rebuild
+STALE_CLASS_SKETCHES = "sketches:stale"
+
+
+def score_percent(score: Optional[float], total_points: Optional[float]) -> Optional[float]:
+    if score is None or not total_points:
+        return None
+    return score / total_points * 100
+
+
+def _insert(db: AsyncSession):
+    dialect = db.get_bind().dialect.name
+    return (postgresql if dialect == "postgresql" else sqlite).insert(QuantileSketch)
+
+
+async def _locked(db: AsyncSession, key: SketchKey) -> QuantileSketch:
+    """The sketch row for key, created empty if missing, locked for update"""
+    scope, scope_id, metric = key
+    await db.execute(
+        _insert(db)
+        .values(scope=scope, scope_id=scope_id, metric=metric, item_count=0, data=KLLSketch().to_bytes())
+        .on_conflict_do_nothing(index_elements=["scope", "scope_id", "metric"])
+    )
+    return (await db.execute(
+        select(QuantileSketch)
+        .where(QuantileSketch.scope == scope)
+        .where(QuantileSketch.scope_id == scope_id)
+        .where(QuantileSketch.metric == metric)
+        .with_for_update()
+    )).scalar_one()
+
+
+async def add_values(db: AsyncSession, key: SketchKey, values: Iterable[float]):
+    """Add values to a stored sketch"""
+    row = await _locked(db, key)
+    sketch = KLLSketch.from_bytes(row.data)
+    sketch.extend(values)
+    row.data = sketch.to_bytes()
+    row.item_count = sketch.n
+
+
+async def replace_values(db: AsyncSession, key: SketchKey, values: Iterable[float]):
+    """Rebuild a stored sketch from the complete set of values"""
+    row = await _locked(db, key)
+    sketch = KLLSketch()
+    sketch.extend(values)
+    row.data = sketch.to_bytes()
+    row.item_count = sketch.n
+
+
+async def _graded_percents(db: AsyncSession, *conditions) -> List[float]:
+    result = await db.execute(
+        select(AssignmentSubmission.score, Assignment.total_points)
+        .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+        .where(AssignmentSubmission.score.isnot(None))
+        .where(Assignment.total_points.isnot(None))
+        .where(Assignment.total_points != 0)
+        .where(*conditions)
+    )
+    return [score_percent(score, total) for score, total in result]
+
+
+async def rebuild_grade_sketch(db: AsyncSession, class_id: str):
+    """Rebuild a class's current grade sketch, one value per student"""
+    await db.flush()
+    result = await db.execute(
+        select(func.sum(AssignmentSubmission.score), func.sum(Assignment.total_points))
+        .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+        .where(Assignment.class_id == class_id)
+        .where(AssignmentSubmission.score.isnot(None))
+        .where(Assignment.total_points.isnot(None))
+        .where(Assignment.total_points != 0)
+        .group_by(AssignmentSubmission.user_id)
+    )
+    await replace_values(
+        db,
+        (CLASS, class_id, CURRENT_GRADE),
+        [score_percent(earned, possible) or 0 for earned, possible in result]
+    )
+
+
+async def record_grade(
+    db: AsyncSession,
+    assignment: Assignment,
+    percent: Optional[float],
+    regraded: bool
+):
+    """
+    Reflect a newly recorded or changed grade in the assignment sketch.
+
+    After committing, call mark_class_sketch_stale for CURRENT_GRADE.
+    """
+    key = (ASSIGNMENT, assignment.id, SCORE_PERCENT)
+    if not regraded:
+        if percent is not None:
+            await add_values(db, key, [percent])
+        return
+
+    await db.flush()
+    await replace_values(db, key, await _graded_percents(db, Assignment.id == assignment.id))
+
+
+async def rebuild_study_time_sketches(db: AsyncSession, class_ids: Iterable[str]):
+    """Rebuild the study time sketches of classes from enrollment totals"""
+    class_ids = sorted(set(class_ids))
+    if not class_ids:
+        return
+    minutes: Dict[str, List[float]] = {class_id: [] for class_id in class_ids}
+    result = await db.execute(
+        select(ClassEnrollment.class_id, ClassEnrollment.study_time_minutes)
+        .where(ClassEnrollment.class_id.in_(class_ids))
+        .where(ClassEnrollment.role == "student")
+    )
+    for class_id, value in result:
+        minutes[class_id].append(value or 0)
+    # Sorted order keeps lock acquisition consistent across workers
+    for class_id in class_ids:
+        await replace_values(db, (CLASS, class_id, STUDY_MINUTES), minutes[class_id])
+
+
+async def rebuild_class_sketches(db: AsyncSession, class_id: str):
+    """Rebuild every sketch of a class from its submissions and enrollments"""
+    assignment_ids = (await db.execute(
+        select(Assignment.id).where(Assignment.class_id == class_id).order_by(Assignment.id)
+    )).scalars().all()
+    for assignment_id in assignment_ids:
+        await replace_values(
+            db,
+            (ASSIGNMENT, assignment_id, SCORE_PERCENT),
+            await _graded_percents(db, Assignment.id == assignment_id)
+        )
+    await rebuild_grade_sketch(db, class_id)
+    await rebuild_study_time_sketches(db, [class_id])
+
+
+async def load_sketches(db: AsyncSession, keys: Iterable[SketchKey]) -> Dict[SketchKey, bytes]:
+    """Serialized sketches for the keys that exist"""
+    keys = list(keys)
+    if not keys:
+        return {}
+    result = await db.execute(
+        select(QuantileSketch.scope, QuantileSketch.scope_id, QuantileSketch.metric, QuantileSketch.data)
+        .where(or_(*(
+            and_(
+                QuantileSketch.scope == scope,
+                QuantileSketch.scope_id == scope_id,
+                QuantileSketch.metric == metric
+            )
+            for scope, scope_id, metric in keys
+        )))
+    )
+    return {(scope, scope_id, metric): data for scope, scope_id, metric, data in result}
+
+
+async def _rebuild_grade_sketches(db: AsyncSession, class_ids: Iterable[str]):
+    for class_id in sorted(set(class_ids)):
+        await rebuild_grade_sketch(db, class_id)
+
+
+CLASS_SKETCH_REBUILDERS: Dict[str, Callable] = {
+    CURRENT_GRADE: _rebuild_grade_sketches,
+    STUDY_MINUTES: rebuild_study_time_sketches,
+}
+
+
+async def mark_class_sketch_stale(class_id: str, metric: str):
+    """Queue a class sketch for rebuilding, after the change is committed"""
+    try:
+        await get_async_redis().sadd(STALE_CLASS_SKETCHES, f"{metric}:{class_id}")
+    except Exception as e:
+        # The class's next change queues it again
+        logger.warning(f"Failed to mark {metric} sketch of class {class_id} stale: {e}")
+
+
+def mark_class_sketches_stale(metric: str, class_ids: Iterable[str]):
+    """mark_class_sketch_stale for many classes, from a Celery worker"""
+    members = [f"{metric}:{class_id}" for class_id in sorted(set(class_ids))]
+    if not members:
+        return
+    try:
+        get_redis().sadd(STALE_CLASS_SKETCHES, *members)
+    except Exception as e:
+        logger.warning(f"Failed to mark {metric} sketches stale: {e}")
+
+
+async def rebuild_stale_class_sketches(session_maker, limit: int) -> int:
+    """
+    Rebuild up to limit queued class sketches, one transaction per metric.
+
+    Entries are taken off the set before rebuilding, so a change committed
+    meanwhile queues its class again rather than being lost.
+    """
+    client = get_redis()
+    members = client.spop(STALE_CLASS_SKETCHES, limit) or []
+    by_metric: Dict[str, List[str]] = {}
+    for member in members:
+        metric, class_id = member.split(":", 1)
+        if metric in CLASS_SKETCH_REBUILDERS:
+            by_metric.setdefault(metric, []).append(class_id)
+
+    rebuilt = 0
+    for metric, class_ids in sorted(by_metric.items()):
+        try:
+            async with session_maker() as db:
+                await CLASS_SKETCH_REBUILDERS[metric](db, class_ids)
+                await db.commit()
+        except Exception:
+            client.sadd(STALE_CLASS_SKETCHES, *(f"{metric}:{class_id}" for class_id in class_ids))
+            raise
+        rebuilt += len(class_ids)
+    return rebuilt
@@ -0,0 +1,170 @@
+"""
+Incremental maintenance of daily and hourly study rollups
+
+Writers call bump_daily_rollup in the same transaction as the record they
+create, so a rollup row never disagrees with the data it summarizes. The
+upsert adds to the stored counters in SQL, which keeps concurrent bumps
+from losing updates. Bumps for current activity also update the hourly
+rollup of the counters charted at hourly resolution.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.analytics import DailyStudyRollup, HourlyStudyRollup, NO_CLASS
+
+COUNTERS = (
+    "study_minutes",
+    "assignments_completed",
+    "scores_recorded",
+    "score_total",
+    "chat_sessions",
+    "chat_messages",
+    "tokens_used"
+)
+
+HOURLY_COUNTERS = ("study_minutes", "chat_messages", "tokens_used")
+
+
+def utc_day(moment: Optional[datetime] = None) -> date:
+    """The UTC calendar day of a timestamp (now by default)"""
+    if moment is None:
+        return datetime.now(timezone.utc).date()
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def utc_hour(moment: Union[datetime, str, None] = None) -> datetime:
+    """The UTC hour of a timestamp (now by default), as an aware datetime"""
+    if moment is None:
+        moment = datetime.now(timezone.utc)
+    elif isinstance(moment, str):
+        # SQLite returns timestamps computed in SQL as text
+        moment = datetime.fromisoformat(moment)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def utc_hour_expression(db: AsyncSession, column):
+    """SQL expression truncating a timestamp column to its UTC hour"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("hour", func.timezone("UTC", column))
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def _insert(db: AsyncSession, model):
+    dialect = db.get_bind().dialect.name
+    return (postgresql if dialect == "postgresql" else sqlite).insert(model)
+
+
+def _upsert(db: AsyncSession, model, keys: tuple, counters: tuple, rows: Iterable[dict]):
+    rows = [{name: row.get(name, 0) for name in keys + counters} for row in rows]
+    stmt = _insert(db, model).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            name: getattr(model, name) + getattr(stmt.excluded, name)
+            for name in counters
+        }
+    )
+
+
+def rollup_upsert(db: AsyncSession, rows: Iterable[dict]):
+    """
+    Build a multi-row upsert adding each row's counters to the stored ones.
+
+    Rows need user_id, class_id and day; missing counters count as 0.
+    """
+    return _upsert(db, DailyStudyRollup, ("user_id", "class_id", "day"), COUNTERS, rows)
+
+
+def hourly_rollup_upsert(db: AsyncSession, rows: Iterable[dict]):
+    """rollup_upsert for hourly rows, which need user_id, hour and class_id"""
+    return _upsert(db, HourlyStudyRollup, ("user_id", "hour", "class_id"), HOURLY_COUNTERS, rows)
+
+
+async def bump_daily_rollup(
+    db: AsyncSession,
+    user_id: str,
+    class_id: Optional[str],
+    day: Optional[date] = None,
+    **increments: float
+):
+    """
+    Add to one user's counters for a class and day (today by default).
+
+    Without an explicit day the bump is for current activity, and the
+    hourly counters among increments are added to the current hour too.
+    """
+    unknown = set(increments) - set(COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown rollup counters: {', '.join(sorted(unknown))}")
+    
+    await db.execute(rollup_upsert(db, [{
+        "user_id": user_id,
+        "class_id": class_id or NO_CLASS,
+        "day": day or utc_day(),
+        **increments
+    }]))
+    
+    hourly = {name: value for name, value in increments.items() if name in HOURLY_COUNTERS}
+    if day is None and hourly:
+        await db.execute(hourly_rollup_upsert(db, [{
+            "user_id": user_id,
+            "hour": utc_hour(),
+            "class_id": class_id or NO_CLASS,
+            **hourly
+        }]))
+
+
+def _merge_rows(
+    increments: Dict[Tuple[str, Optional[str], object], Dict[str, float]],
+    bucket: str,
+    normalize: Callable = lambda moment: moment
+) -> List[dict]:
+    """
+    Rows for one upsert, merged by their final key.
+
+    None and "" both mean no class; one statement must not carry the same
+    conflict key twice, which Postgres rejects.
+    """
+    rows: Dict[tuple, dict] = {}
+    for (user_id, class_id, moment), counters in increments.items():
+        key = (user_id, class_id or NO_CLASS, normalize(moment))
+        row = rows.setdefault(key, {"user_id": key[0], "class_id": key[1], bucket: key[2]})
+        for name, value in counters.items():
+            row[name] = row.get(name, 0) + value
+    return list(rows.values())
+
+
+async def bump_daily_rollups(
+    db: AsyncSession,
+    increments: Dict[Tuple[str, Optional[str], date], Dict[str, float]]
+):
+    """Apply many bumps, keyed by (user_id, class_id, day), in one statement"""
+    if not increments:
+        return
+    await db.execute(rollup_upsert(db, _merge_rows(increments, "day")))
+
+
+async def bump_hourly_rollups(
+    db: AsyncSession,
+    increments: Dict[Tuple[str, Optional[str], datetime], Dict[str, float]]
+):
+    """Apply many hourly bumps, keyed by (user_id, class_id, hour), in one statement"""
+    if not increments:
+        return
+    await db.execute(hourly_rollup_upsert(db, _merge_rows(increments, "hour", utc_hour)))
+
+
+async def prune_hourly_rollups(db: AsyncSession, retention_days: int) -> int:
+    """Delete hourly rollups older than the retention window, returning the row count"""
+    cutoff = utc_hour() - timedelta(days=retention_days)
+    result = await db.execute(delete(HourlyStudyRollup).where(HourlyStudyRollup.hour < cutoff))
+    await db.commit()
+    return result.rowcount or 0
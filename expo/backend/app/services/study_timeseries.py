@@ -0,0 +1,124 @@
+"""
+Bucketed study time series from the rollup tables
+
+Hour buckets are read from HourlyStudyRollup (kept for
+HOURLY_ROLLUP_RETENTION_DAYS), day buckets from DailyStudyRollup, and week
+buckets (ISO weeks, starting Monday) are folded from the daily rows. Each
+request is one grouped query over the user's rollups in the range, so its
+cost depends on the number of buckets rather than on the raw activity.
+
+Empty buckets are returned as zeros. When a range holds more buckets than
+max_points, runs of adjacent buckets are summed so the series has at most
+max_points points; the response says how many buckets each point spans.
+"""
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Sequence
+from datetime import date, datetime, timedelta, timezone
+import math
+
+from app.models.analytics import DailyStudyRollup, HourlyStudyRollup
+from app.services.study_rollups import COUNTERS, HOURLY_COUNTERS, utc_hour
+
+BUCKET_SIZES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+BUCKET_METRICS = {
+    "hour": HOURLY_COUNTERS,
+    "day": COUNTERS,
+    "week": COUNTERS,
+}
+
+# Upper bound on the buckets a request may span before downsampling
+MAX_BUCKETS = 5000
+
+
+def _midnight(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def bucket_start(moment: datetime, bucket: str) -> datetime:
+    """The start of the bucket holding moment, as an aware UTC datetime"""
+    hour = utc_hour(moment)
+    if bucket == "hour":
+        return hour
+    day = _midnight(hour.date())
+    if bucket == "day":
+        return day
+    return day - timedelta(days=day.weekday())
+
+
+def _downsample(values: Sequence[float], step: int) -> List[float]:
+    return [sum(values[i:i + step]) for i in range(0, len(values), step)]
+
+
+async def study_timeseries(
+    db: AsyncSession,
+    user_id: str,
+    metrics: Sequence[str],
+    bucket: str,
+    start: datetime,
+    end: datetime,
+    class_id: Optional[str] = None,
+    max_points: int = 200
+) -> dict:
+    """
+    Series of the user's rollup counters per bucket from start to end
+    (both bucket-aligned downwards and inclusive), optionally for one class.
+
+    Raises ValueError for an unknown bucket or metric, or a range that is
+    empty or longer than MAX_BUCKETS buckets.
+    """
+    if bucket not in BUCKET_SIZES:
+        raise ValueError(f"Unknown bucket: {bucket}")
+    unknown = [metric for metric in metrics if metric not in BUCKET_METRICS[bucket]]
+    if unknown:
+        raise ValueError(f"Unknown {bucket} metrics: {', '.join(unknown)}")
+    if not metrics:
+        raise ValueError("No metrics requested")
+
+    first = bucket_start(start, bucket)
+    last = bucket_start(end, bucket)
+    if last < first:
+        raise ValueError("end is before start")
+    size = BUCKET_SIZES[bucket]
+    count = (last - first) // size + 1
+    if count > MAX_BUCKETS:
+        raise ValueError(f"Range spans {count} {bucket} buckets, more than {MAX_BUCKETS}")
+
+    if bucket == "hour":
+        model, column = HourlyStudyRollup, HourlyStudyRollup.hour
+        low, high = first, last
+    else:
+        model, column = DailyStudyRollup, DailyStudyRollup.day
+        low, high = first.date(), (last + size - timedelta(days=1)).date()
+
+    query = (
+        select(column, *(func.sum(getattr(model, metric)) for metric in metrics))
+        .where(model.user_id == user_id)
+        .where(column >= low)
+        .where(column <= high)
+        .group_by(column)
+    )
+    if class_id is not None:
+        query = query.where(model.class_id == class_id)
+
+    values: Dict[str, List[float]] = {metric: [0] * count for metric in metrics}
+    for row in await db.execute(query):
+        moment = row[0] if bucket == "hour" else _midnight(row[0])
+        index = (bucket_start(moment, bucket) - first) // size
+        for metric, value in zip(metrics, row[1:]):
+            values[metric][index] += value or 0
+
+    step = max(1, math.ceil(count / max_points))
+    return {
+        "bucket": bucket,
+        "buckets_per_point": step,
+        "start": first,
+        "end": last + size,
+        "timestamps": [first + size * i for i in range(0, count, step)],
+        "series": {metric: _downsample(series, step) for metric, series in values.items()}
+    }
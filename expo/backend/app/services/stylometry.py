@@ -0,0 +1,402 @@
+"""
+Stylometric features of writing samples, computed a batch at a time
+
+Each sample is tokenized once into words, sentence ends and paragraph
+breaks. The tokens of the whole batch are mapped to integer IDs and
+concatenated, and the features are then computed with NumPy over the
+batch arrays (bincounts keyed by sample) instead of sample by sample:
+  * sentence length distribution: mean, std, percentiles, histogram
+  * function-word frequencies and punctuation profile, per 1000 words
+  * vocabulary richness and complexity, formality, passive voice
+  * transition words and the most frequent content bigrams
+
+Only NumPy is imported, so process pool workers load this module without
+the rest of the application.
+"""
+from typing import Dict, List, Sequence, Tuple
+import re
+
+import numpy as np
+
+FEATURES_VERSION = 2
+
+FUNCTION_WORDS = (
+    "a", "about", "after", "all", "also", "an", "and", "any", "are", "as",
+    "at", "be", "because", "been", "before", "both", "but", "by", "can", "could",
+    "do", "does", "each", "either", "for", "from", "had", "has", "have", "he",
+    "her", "his", "how", "i", "if", "in", "into", "is", "it", "its",
+    "may", "might", "more", "most", "must", "my", "no", "nor", "not", "of",
+    "on", "one", "only", "or", "other", "our", "shall", "she", "should", "so",
+    "some", "such", "than", "that", "the", "their", "them", "then", "there", "these",
+    "they", "this", "those", "though", "to", "up", "upon", "was", "we", "were",
+    "what", "when", "where", "which", "while", "who", "whom", "why", "will", "with",
+    "would", "you", "your",
+)
+
+TRANSITIONS = (
+    "accordingly", "additionally", "besides", "consequently", "conversely",
+    "finally", "furthermore", "hence", "however", "indeed", "instead",
+    "likewise", "meanwhile", "moreover", "nevertheless", "nonetheless",
+    "overall", "similarly", "subsequently", "therefore", "thus",
+    "as a result", "for example", "for instance", "in addition", "in conclusion",
+    "in contrast", "in fact", "in particular", "in summary", "of course",
+    "on balance", "that said",
+)
+
+# Mark -> name of the punctuation profiled
+PUNCTUATION = {
+    ",": "comma",
+    ";": "semicolon",
+    ":": "colon",
+    "!": "exclamation",
+    "?": "question",
+    "-": "hyphen",
+    "\u2013": "dash",
+    "\u2014": "dash",
+    "(": "parenthesis",
+    '"': "quote",
+    "\u201c": "quote",
+    "\u201d": "quote",
+    "...": "ellipsis",  # counted from sentence-end tokens, not code points
+}
+
+PERSONAL_PRONOUNS = ("i", "me", "my", "we", "us", "our", "you", "your")
+BE_VERBS = ("am", "is", "are", "was", "were", "be", "been", "being")
+
+# Upper bounds of the sentence length histogram buckets, in words
+SENTENCE_LENGTH_BINS = (5, 10, 15, 20, 25, 30, 40)
+SENTENCE_LENGTH_LABELS = tuple(
+    f"{low + 1}-{high}" for low, high in zip((0,) + SENTENCE_LENGTH_BINS, SENTENCE_LENGTH_BINS)
+) + (f"{SENTENCE_LENGTH_BINS[-1] + 1}+",)
+
+PERCENTILES = (10, 50, 90)
+LONG_WORD_LETTERS = 7
+TECHNICAL_WORD_LETTERS = 10
+PHRASES_PER_SAMPLE = 10
+
+_TOKEN_RE = re.compile(r"([a-z0-9]+(?:'[a-z]+)*)|(\.\.\.|[.!?]+)|(\n[ \t]*\n)")
+
+# Token IDs below the first word
+_SENTENCE_END = 0
+_PARAGRAPH_BREAK = 1
+_ELLIPSIS = 2
+_FIRST_WORD = 3
+
+_PUNCTUATION_NAMES = sorted({name for mark, name in PUNCTUATION.items() if len(mark) == 1})
+_PUNCTUATION_CODES = np.array(sorted(ord(mark) for mark in PUNCTUATION if len(mark) == 1))
+_PUNCTUATION_INDEX = np.array([
+    _PUNCTUATION_NAMES.index(PUNCTUATION[chr(code)]) for code in _PUNCTUATION_CODES
+])
+_PROFILE_NAMES = _PUNCTUATION_NAMES + ["ellipsis"]
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(len(numerator), dtype=np.float64),
+        where=denominator > 0
+    )
+
+
+def _per_sample(samples: np.ndarray, count: int, weights=None) -> np.ndarray:
+    return np.bincount(samples, weights=weights, minlength=count).astype(np.float64)
+
+
+def _matrix(samples: np.ndarray, columns: np.ndarray, count: int, width: int) -> np.ndarray:
+    """Counts of (sample, column) pairs as a count x width matrix"""
+    return np.bincount(samples * width + columns, minlength=count * width).reshape(count, width)
+
+
+def _tokenize(texts: Sequence[str]):
+    """Token IDs of the batch, the sample of each token and the vocabulary"""
+    vocabulary = {"\x00end": _SENTENCE_END, "\x00paragraph": _PARAGRAPH_BREAK, "\x00ellipsis": _ELLIPSIS}
+    for word in FUNCTION_WORDS + TRANSITIONS + PERSONAL_PRONOUNS + BE_VERBS:
+        for part in word.split():
+            vocabulary.setdefault(part, len(vocabulary))
+
+    ids: List[int] = []
+    lengths: List[int] = []
+    for text in texts:
+        tokens = _TOKEN_RE.findall(text.lower().replace("\u2019", "'").replace("\r\n", "\n"))
+        before = len(ids)
+        ids.extend(
+            vocabulary.setdefault(word, len(vocabulary)) if word
+            else (_ELLIPSIS if end == "..." else _SENTENCE_END) if end
+            else _PARAGRAPH_BREAK
+            for word, end, _ in tokens
+        )
+        # Every sample ends with a paragraph break, which also keeps
+        # sentences and bigrams from spanning samples
+        ids.append(_PARAGRAPH_BREAK)
+        lengths.append(len(ids) - before)
+
+    tokens = np.array(ids, dtype=np.int64)
+    samples = np.repeat(np.arange(len(texts)), lengths)
+    return tokens, samples, list(vocabulary)
+
+
+def _word_flags(words: List[str], selected: Sequence[str]) -> np.ndarray:
+    selected = set(selected)
+    return np.array([word in selected for word in words], dtype=bool)
+
+
+def _segment_lengths(samples: np.ndarray, is_word: np.ndarray, boundary: np.ndarray):
+    """Words per non-empty segment (closed by a boundary token) and its sample"""
+    # Each token's segment is the number of boundaries before it
+    segment = np.cumsum(boundary) - boundary
+    lengths = np.bincount(segment[is_word], minlength=int(boundary.sum()))
+    segment_samples = samples[boundary]
+    non_empty = lengths > 0
+    return lengths[non_empty], segment_samples[non_empty]
+
+
+def _word_runs(tokens: np.ndarray, samples: np.ndarray, length: int, size: int):
+    """Keys (base-size digits) of runs of length adjacent words, and their samples"""
+    span = len(tokens) - length + 1
+    if span <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    keys = np.zeros(span, dtype=np.int64)
+    valid = np.ones(span, dtype=bool)
+    for offset in range(length):
+        part = tokens[offset:offset + span]
+        valid &= part >= _FIRST_WORD
+        keys = keys * size + part
+    return keys[valid], samples[:span][valid]
+
+
+def _percentiles(values: np.ndarray, value_samples: np.ndarray, count: int) -> np.ndarray:
+    """Nearest-rank percentiles of each sample's values, as a count x len(PERCENTILES) matrix"""
+    result = np.zeros((count, len(PERCENTILES)))
+    if not len(values):
+        return result
+    ordered = values[np.lexsort((values, value_samples))]
+    sizes = np.bincount(value_samples, minlength=count)
+    starts = np.cumsum(sizes) - sizes
+    present = sizes > 0
+    for column, percentile in enumerate(PERCENTILES):
+        rank = np.ceil(percentile / 100 * sizes[present]).astype(np.int64)
+        index = starts[present] + np.maximum(rank, 1) - 1
+        result[present, column] = ordered[index]
+    return result
+
+
+def _top_phrases(keys: np.ndarray, size: int, count: int, words: List[str]) -> List[Dict[str, int]]:
+    """The most frequent bigrams (sample * size^2 + first * size + second) of each sample"""
+    phrases: List[Dict[str, int]] = [{} for _ in range(count)]
+    if not len(keys):
+        return phrases
+    unique, counts = np.unique(keys, return_counts=True)
+    repeated = counts > 1
+    unique, counts = unique[repeated], counts[repeated]
+    owners = unique // (size * size)
+    order = np.lexsort((-counts, owners))
+    unique, counts, owners = unique[order], counts[order], owners[order]
+    rank = np.arange(len(owners)) - np.searchsorted(owners, owners)
+    keep = rank < PHRASES_PER_SAMPLE
+    for owner, key, value in zip(owners[keep].tolist(), unique[keep].tolist(), counts[keep].tolist()):
+        first, second = divmod(key % (size * size), size)
+        phrases[owner][f"{words[first]} {words[second]}"] = value
+    return phrases
+
+
+def _punctuation(texts: Sequence[str]) -> np.ndarray:
+    """Counts of each profiled mark per sample, from the code points of the batch"""
+    count = len(texts)
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32)
+    code_samples = np.repeat(np.arange(count), [len(text) for text in texts])
+    position = np.searchsorted(_PUNCTUATION_CODES, codes)
+    position[position == len(_PUNCTUATION_CODES)] = 0
+    marked = _PUNCTUATION_CODES[position] == codes
+    return _matrix(code_samples[marked], _PUNCTUATION_INDEX[position[marked]], count, len(_PUNCTUATION_NAMES))
+
+
+def _clip(values: np.ndarray) -> np.ndarray:
+    return np.clip(values, 0.0, 1.0)
+
+
+def extract_batch(texts: Sequence[str]) -> List[dict]:
+    """Feature dict (JSON-ready, FEATURES_VERSION layout) of each text"""
+    count = len(texts)
+    if not count:
+        return []
+    tokens, samples, words = _tokenize(texts)
+    size = len(words)
+
+    is_word = tokens >= _FIRST_WORD
+    word_tokens = tokens[is_word]
+    word_samples = samples[is_word]
+    word_count = _per_sample(word_samples, count)
+
+    # Sentences end at terminators and paragraph breaks
+    sentence_lengths, sentence_samples = _segment_lengths(samples, is_word, ~is_word)
+    paragraph_lengths, paragraph_samples = _segment_lengths(
+        samples, is_word, tokens == _PARAGRAPH_BREAK
+    )
+    sentence_count = _per_sample(sentence_samples, count)
+    paragraph_count = _per_sample(paragraph_samples, count)
+    sentence_mean = _ratio(_per_sample(sentence_samples, count, sentence_lengths), sentence_count)
+    sentence_square_mean = _ratio(_per_sample(sentence_samples, count, sentence_lengths ** 2), sentence_count)
+    sentence_std = np.sqrt(np.maximum(sentence_square_mean - sentence_mean ** 2, 0))
+    sentence_percentiles = _percentiles(sentence_lengths, sentence_samples, count)
+    histogram = _matrix(
+        sentence_samples,
+        np.digitize(sentence_lengths, SENTENCE_LENGTH_BINS, right=True),
+        count,
+        len(SENTENCE_LENGTH_LABELS)
+    )
+
+    # Function words are the first IDs after the special tokens
+    function_word = word_tokens < _FIRST_WORD + len(FUNCTION_WORDS)
+    function_words = _matrix(
+        word_samples[function_word],
+        word_tokens[function_word] - _FIRST_WORD,
+        count,
+        len(FUNCTION_WORDS)
+    )
+
+    punctuation = np.hstack([
+        _punctuation(texts),
+        _per_sample(samples[tokens == _ELLIPSIS], count)[:, None].astype(np.int64)
+    ])
+
+    # Vocabulary richness from distinct (sample, word) pairs
+    pairs, pair_counts = np.unique(word_samples * size + word_tokens, return_counts=True)
+    types = _per_sample(pairs // size, count)
+    hapaxes = _per_sample(pairs[pair_counts == 1] // size, count)
+    letters = np.array([len(word) for word in words])[word_tokens]
+    average_word_length = _ratio(_per_sample(word_samples, count, letters), word_count)
+    long_word_ratio = _ratio(_per_sample(word_samples[letters >= LONG_WORD_LETTERS], count), word_count)
+    technical_ratio = _ratio(_per_sample(word_samples[letters >= TECHNICAL_WORD_LETTERS], count), word_count)
+    root_type_token_ratio = _ratio(types, np.sqrt(word_count))
+    complexity = (
+        _clip((average_word_length - 3.5) / 2.5)
+        + _clip(long_word_ratio / 0.35)
+        + _clip((root_type_token_ratio - 4) / 8)
+    ) / 3
+
+    contraction = np.array(["'" in word for word in words])[word_tokens]
+    personal = _word_flags(words, PERSONAL_PRONOUNS)[word_tokens]
+    contraction_rate = _ratio(_per_sample(word_samples[contraction], count), word_count)
+    personal_rate = _ratio(_per_sample(word_samples[personal], count), word_count)
+    formality = np.where(word_count > 0, (
+        _clip((average_word_length - 3.5) / 2.5)
+        + 1 - _clip(contraction_rate * 20)
+        + 1 - _clip(personal_rate * 10)
+    ) / 3, 0.0)
+
+    # Adjacent word pairs; boundaries between them rule a pair out
+    first, second = tokens[:-1], tokens[1:]
+    adjacent = (first >= _FIRST_WORD) & (second >= _FIRST_WORD)
+    pair_samples = samples[:-1][adjacent]
+    first, second = first[adjacent], second[adjacent]
+
+    participle = np.array([len(word) > 3 and word.endswith(("ed", "en")) for word in words])
+    passive = _word_flags(words, BE_VERBS)[first] & participle[second]
+    passive_ratio = _ratio(_per_sample(pair_samples[passive], count), sentence_count)
+
+    single = np.full(size, -1)
+    phrase_entries: Dict[int, List[Tuple[int, int]]] = {}
+    for index, phrase in enumerate(TRANSITIONS):
+        parts = [words.index(part) for part in phrase.split()]
+        if len(parts) == 1:
+            single[parts[0]] = index
+            continue
+        key = 0
+        for part in parts:
+            key = key * size + part
+        phrase_entries.setdefault(len(parts), []).append((key, index))
+    single_hits = single[word_tokens]
+    found = single_hits >= 0
+    hit_samples, hit_index = [word_samples[found]], [single_hits[found]]
+    for length, entries in phrase_entries.items():
+        entries.sort()
+        phrase_keys = np.array([key for key, _ in entries])
+        phrase_index = np.array([index for _, index in entries])
+        keys, key_samples = _word_runs(tokens, samples, length, size)
+        position = np.minimum(np.searchsorted(phrase_keys, keys), len(phrase_keys) - 1)
+        matched = phrase_keys[position] == keys
+        hit_samples.append(key_samples[matched])
+        hit_index.append(phrase_index[position[matched]])
+    transitions = _matrix(np.concatenate(hit_samples), np.concatenate(hit_index), count, len(TRANSITIONS))
+
+    is_function = _word_flags(words, FUNCTION_WORDS)
+    content = ~(is_function[first] & is_function[second])
+    phrases = _top_phrases(
+        pair_samples[content] * size * size + first[content] * size + second[content],
+        size,
+        count,
+        words
+    )
+
+    def rates(matrix: np.ndarray, names: Sequence[str]) -> List[Dict[str, float]]:
+        per_thousand = np.round(matrix * 1000 / np.maximum(word_count, 1)[:, None], 3)
+        return [
+            {names[column]: row[column] for column in np.flatnonzero(row).tolist()}
+            for row in per_thousand.tolist()
+        ]
+
+    def counts(matrix: np.ndarray, names: Sequence[str]) -> List[Dict[str, int]]:
+        return [
+            {names[column]: row[column] for column in np.flatnonzero(row).tolist()}
+            for row in matrix.tolist()
+        ]
+
+    function_word_rates = rates(function_words, FUNCTION_WORDS)
+    punctuation_rates = rates(punctuation, _PROFILE_NAMES)
+    transition_counts = counts(transitions, TRANSITIONS)
+    histogram_counts = histogram.tolist()
+    columns = {
+        name: np.round(values, 4).tolist()
+        for name, values in {
+            "word_count": word_count,
+            "sentence_count": sentence_count,
+            "paragraph_count": paragraph_count,
+            "sentence_mean": sentence_mean,
+            "sentence_std": sentence_std,
+            "paragraph_length": _ratio(word_count, paragraph_count),
+            "types": types,
+            "type_token_ratio": _ratio(types, word_count),
+            "hapax_ratio": _ratio(hapaxes, word_count),
+            "average_word_length": average_word_length,
+            "long_word_ratio": long_word_ratio,
+            "complexity": complexity,
+            "formality": formality,
+            "technical_level": _clip(technical_ratio / 0.1),
+            "passive_ratio": passive_ratio,
+        }.items()
+    }
+    percentile_values = sentence_percentiles.tolist()
+
+    features = []
+    for index in range(count):
+        column = {name: values[index] for name, values in columns.items()}
+        features.append({
+            "version": FEATURES_VERSION,
+            "word_count": int(column["word_count"]),
+            "sentence_count": int(column["sentence_count"]),
+            "paragraph_count": int(column["paragraph_count"]),
+            "sentence_length": {
+                "mean": column["sentence_mean"],
+                "std": column["sentence_std"],
+                **{f"p{percentile}": value for percentile, value in zip(PERCENTILES, percentile_values[index])},
+                "histogram": dict(zip(SENTENCE_LENGTH_LABELS, histogram_counts[index]))
+            },
+            "paragraph_length_avg": column["paragraph_length"],
+            "vocabulary": {
+                "types": int(column["types"]),
+                "type_token_ratio": column["type_token_ratio"],
+                "hapax_ratio": column["hapax_ratio"],
+                "average_word_length": column["average_word_length"],
+                "long_word_ratio": column["long_word_ratio"],
+                "complexity": column["complexity"]
+            },
+            "formality": column["formality"],
+            "technical_level": column["technical_level"],
+            "passive_ratio": column["passive_ratio"],
+            "function_words": function_word_rates[index],
+            "punctuation": punctuation_rates[index],
+            "transitions": transition_counts[index],
+            "phrases": phrases[index]
+        })
+    return features
@@ -0,0 +1,374 @@
+"""
+LLM token ledger and in-memory quota enforcement
+
+Usage is metered per class, user, UTC day and model in token_usage_ledger,
+without a database round trip on the chat path:
+  * token_ledger coalesces usage into per-key increments in memory and
+    writes them with multi-row upserts every TOKEN_LEDGER_FLUSH_SECONDS.
+  * token_quotas keeps a token bucket per class and per (class, user)
+    budget. A bucket holds the budget for TOKEN_QUOTA_WINDOW_DAYS and
+    refills at budget / window; check() decides from the buckets before
+    the LLM is called, and consume() debits them and meters the usage.
+
+Every TOKEN_QUOTA_RECONCILE_SECONDS the buckets are reset from the ledger
+(usage in the window plus this worker's unwritten usage), which folds in
+what other workers spent and picks up budget changes. Between
+reconciliations a worker only sees its own spend, so a scope can overrun
+by what other workers use in one interval.
+
+The first turn for a class or user in a worker loads its budget and usage;
+later turns cost no query. Streamed responses report no usage, so their
+tokens are counted locally with count_tokens.
+"""
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Optional, Tuple
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+import asyncio
+import logging
+import math
+import time
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.metrics import TOKEN_LEDGER_PENDING, TOKEN_QUOTA_DECISIONS
+from app.models.analytics import TokenUsageLedger
+from app.models.class_model import Class
+from app.services.study_rollups import utc_day
+
+logger = logging.getLogger(__name__)
+
+LedgerKey = Tuple[str, str, date, str]  # (class_id, user_id, day, model)
+
+# Keeps each upsert well under driver bind-parameter limits
+UPSERT_CHUNK_ROWS = 1000
+
+# Buckets unused for this long are dropped, and reloaded when next needed
+IDLE_BUCKET_SECONDS = 3600.0
+
+ALLOW = "allow"
+DOWNGRADE = "downgrade"
+REJECT = "reject"
+
+CLASS_SCOPE = "class"
+STUDENT_SCOPE = "student"
+
+
+def _class_scope(class_id: str) -> tuple:
+    return (CLASS_SCOPE, class_id)
+
+
+def _student_scope(class_id: str, user_id: str) -> tuple:
+    return (STUDENT_SCOPE, class_id, user_id)
+
+
+def _window_seconds() -> float:
+    return settings.TOKEN_QUOTA_WINDOW_DAYS * 24 * 60 * 60
+
+
+def _window_start() -> date:
+    return utc_day() - timedelta(days=settings.TOKEN_QUOTA_WINDOW_DAYS - 1)
+
+
+def _insert(db: AsyncSession):
+    dialect = db.get_bind().dialect.name
+    return (postgresql if dialect == "postgresql" else sqlite).insert(TokenUsageLedger)
+
+
+def _budgets(ai_settings: Optional[dict]) -> Tuple[Optional[int], Optional[int]]:
+    """(class budget, per-student budget) from a class's ai_settings"""
+    ai_settings = ai_settings or {}
+    return (
+        ai_settings.get("token_budget", settings.TOKEN_QUOTA_CLASS_BUDGET),
+        ai_settings.get("student_token_budget", settings.TOKEN_QUOTA_STUDENT_BUDGET)
+    )
+
+
+# Rough English average, used when no tokenizer can be loaded
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """The model's tiktoken encoding, or None if it cannot be loaded"""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # e.g. the encoding file cannot be downloaded; metering must not break chat
+        logger.warning(f"Token encoding for {model} unavailable, estimating from length: {e}")
+        return None
+
+
+def count_tokens(model: str, *texts: Optional[str]) -> int:
+    """Tokens in texts as model would count them"""
+    encoding = _encoding(model)
+    texts = [text for text in texts if text]
+    if encoding is None:
+        return sum(math.ceil(len(text) / CHARS_PER_TOKEN) for text in texts)
+    return sum(len(encoding.encode(text, disallowed_special=())) for text in texts)
+
+
+class TokenLedger:
+    """In-process buffer that coalesces token usage into batched ledger upserts"""
+
+    def __init__(self):
+        self._pending: Dict[LedgerKey, list] = {}  # key -> [tokens, requests]
+        self._flushing: Dict[LedgerKey, list] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, class_id: str, user_id: str, model: str, tokens: int):
+        """Meter one LLM call; written with the next flush"""
+        entry = self._pending.setdefault((class_id, user_id, utc_day(), model), [0, 0])
+        entry[0] += tokens
+        entry[1] += 1
+        TOKEN_LEDGER_PENDING.set(len(self._pending))
+
+    def pending_by_scope(self) -> Dict[tuple, int]:
+        """Unwritten tokens per quota scope, including a flush in progress"""
+        totals: Dict[tuple, int] = defaultdict(int)
+        for batch in (self._flushing, self._pending):
+            for (class_id, user_id, _, _), (tokens, _) in batch.items():
+                totals[_class_scope(class_id)] += tokens
+                totals[_student_scope(class_id, user_id)] += tokens
+        return totals
+
+    async def flush(self):
+        """Write all pending increments"""
+        async with self._flush_lock:
+            self._flushing, self._pending = self._pending, {}
+            if not self._flushing:
+                return
+
+            rows = [
+                {
+                    "class_id": class_id,
+                    "user_id": user_id,
+                    "day": day,
+                    "model": model,
+                    "tokens": tokens,
+                    "requests": requests
+                }
+                for (class_id, user_id, day, model), (tokens, requests) in self._flushing.items()
+            ]
+            try:
+                async with async_session_maker() as db:
+                    for offset in range(0, len(rows), UPSERT_CHUNK_ROWS):
+                        stmt = _insert(db).values(rows[offset:offset + UPSERT_CHUNK_ROWS])
+                        await db.execute(stmt.on_conflict_do_update(
+                            index_elements=["class_id", "user_id", "day", "model"],
+                            set_={
+                                "tokens": TokenUsageLedger.tokens + stmt.excluded.tokens,
+                                "requests": TokenUsageLedger.requests + stmt.excluded.requests
+                            }
+                        ))
+                    await db.commit()
+            except Exception as e:
+                # Merge the batch back; keys are per day, so this stays small
+                logger.error(f"Failed to flush {len(rows)} token ledger rows: {e}")
+                for key, (tokens, requests) in self._flushing.items():
+                    entry = self._pending.setdefault(key, [0, 0])
+                    entry[0] += tokens
+                    entry[1] += requests
+            finally:
+                self._flushing = {}
+                TOKEN_LEDGER_PENDING.set(len(self._pending))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.TOKEN_LEDGER_FLUSH_SECONDS)
+            await self.flush()
+
+    def start(self):
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        await self.flush()
+
+
+token_ledger = TokenLedger()
+
+
+class TokenBucket:
+    """Tokens left in a scope's budget; may go negative by the overdraft used"""
+
+    __slots__ = ("budget", "level", "refilled_at", "used_at")
+
+    def __init__(self, budget: int, spent: int):
+        self.used_at = time.monotonic()
+        self.reset(budget, spent)
+
+    @property
+    def rate(self) -> float:
+        """Tokens regained per second"""
+        return self.budget / _window_seconds()
+
+    def reset(self, budget: int, spent: int):
+        self.budget = budget
+        self.level = float(budget - spent)
+        self.refilled_at = time.monotonic()
+
+    def available(self) -> float:
+        now = time.monotonic()
+        if self.level < self.budget:
+            self.level = min(self.budget, self.level + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        self.used_at = now
+        return self.level
+
+    def take(self, tokens: int):
+        self.available()
+        self.level -= tokens
+
+
+@dataclass
+class QuotaDecision:
+    """What to do with an LLM call, decided from the scope closest to its limit"""
+    action: str = ALLOW
+    scope: Optional[str] = None  # class or student, when not allowed outright
+    model: Optional[str] = None  # model to use instead of the default
+    retry_after: Optional[int] = None  # seconds until a rejected scope recovers
+
+
+class TokenQuotas:
+    """Per-class and per-student token buckets, reconciled with the ledger"""
+
+    def __init__(self):
+        self._class_budgets: Dict[str, Tuple[Optional[int], Optional[int]]] = {}
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _load(self, db: AsyncSession, class_id: str, user_id: str):
+        """Load a class's budgets and a scope's usage the first time they are needed"""
+        if class_id not in self._class_budgets:
+            ai_settings = (await db.execute(
+                select(Class.ai_settings).where(Class.id == class_id)
+            )).scalar_one_or_none()
+            self._class_budgets[class_id] = _budgets(ai_settings)
+        class_budget, student_budget = self._class_budgets[class_id]
+
+        missing = [
+            (scope, budget)
+            for scope, budget in (
+                (_class_scope(class_id), class_budget),
+                (_student_scope(class_id, user_id), student_budget)
+            )
+            if budget is not None and scope not in self._buckets
+        ]
+        if not missing:
+            return
+
+        class_spent, user_spent = (await db.execute(
+            select(
+                func.coalesce(func.sum(TokenUsageLedger.tokens), 0),
+                func.coalesce(func.sum(TokenUsageLedger.tokens).filter(TokenUsageLedger.user_id == user_id), 0)
+            )
+            .where(TokenUsageLedger.class_id == class_id)
+            .where(TokenUsageLedger.day >= _window_start())
+        )).one()
+        pending = token_ledger.pending_by_scope()
+        for scope, budget in missing:
+            spent = class_spent if scope[0] == CLASS_SCOPE else user_spent
+            self._buckets[scope] = TokenBucket(budget, spent + pending.get(scope, 0))
+
+    async def check(self, db: AsyncSession, class_id: str, user_id: str) -> QuotaDecision:
+        """Decide whether a user's next LLM call in a class may go ahead"""
+        await self._load(db, class_id, user_id)
+
+        decision = QuotaDecision()
+        downgrade_model = settings.TOKEN_QUOTA_DOWNGRADE_MODEL
+        for scope in (_class_scope(class_id), _student_scope(class_id, user_id)):
+            bucket = self._buckets.get(scope)
+            if bucket is None:
+                continue
+            level = bucket.available()
+            if level > 0:
+                continue
+            overdraft = bucket.budget * (settings.TOKEN_QUOTA_DOWNGRADE_RATIO - 1) if downgrade_model else 0
+            if level > -overdraft:
+                if decision.action == ALLOW:
+                    decision = QuotaDecision(DOWNGRADE, scope[0], downgrade_model)
+                continue
+            # Time until the bucket refills out of the rejected range
+            retry_after = math.ceil((-overdraft - level) / bucket.rate) + 1 if bucket.rate else None
+            decision = QuotaDecision(REJECT, scope[0], retry_after=retry_after)
+            break
+
+        TOKEN_QUOTA_DECISIONS.labels(decision.action).inc()
+        return decision
+
+    def consume(self, class_id: str, user_id: str, model: str, tokens: int):
+        """Debit a finished LLM call from the buckets and meter it in the ledger"""
+        token_ledger.record(class_id, user_id, model, tokens)
+        for scope in (_class_scope(class_id), _student_scope(class_id, user_id)):
+            bucket = self._buckets.get(scope)
+            if bucket is not None:
+                bucket.take(tokens)
+
+    async def reconcile(self, db: AsyncSession):
+        """Reset every bucket from the ledger and refresh class budgets"""
+        now = time.monotonic()
+        for scope, bucket in list(self._buckets.items()):
+            if now - bucket.used_at > IDLE_BUCKET_SECONDS:
+                del self._buckets[scope]
+
+        class_ids = sorted(self._class_budgets)
+        if not class_ids:
+            return
+        result = await db.execute(select(Class.id, Class.ai_settings).where(Class.id.in_(class_ids)))
+        for class_id, ai_settings in result:
+            self._class_budgets[class_id] = _budgets(ai_settings)
+
+        spent: Dict[tuple, int] = defaultdict(int)
+        bucket_class_ids = sorted({scope[1] for scope in self._buckets})
+        if bucket_class_ids:
+            usage = await db.execute(
+                select(TokenUsageLedger.class_id, TokenUsageLedger.user_id, func.sum(TokenUsageLedger.tokens))
+                .where(TokenUsageLedger.class_id.in_(bucket_class_ids))
+                .where(TokenUsageLedger.day >= _window_start())
+                .group_by(TokenUsageLedger.class_id, TokenUsageLedger.user_id)
+            )
+            for class_id, user_id, tokens in usage:
+                spent[_class_scope(class_id)] += tokens
+                spent[_student_scope(class_id, user_id)] += tokens
+        for scope, tokens in token_ledger.pending_by_scope().items():
+            spent[scope] += tokens
+
+        for scope, bucket in list(self._buckets.items()):
+            class_budget, student_budget = self._class_budgets[scope[1]]
+            budget = class_budget if scope[0] == CLASS_SCOPE else student_budget
+            if budget is None:
+                del self._buckets[scope]
+            else:
+                bucket.reset(budget, spent[scope])
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(settings.TOKEN_QUOTA_RECONCILE_SECONDS)
+            try:
+                async with async_session_maker() as db:
+                    await self.reconcile(db)
+            except Exception as e:
+                # Buckets keep counting locally until the next attempt
+                logger.warning(f"Token quota reconciliation failed: {e}")
+
+    def start(self):
+        self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+
+token_quotas = TokenQuotas()
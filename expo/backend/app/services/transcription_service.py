@@ -0,0 +1,161 @@
+"""
+Segmented transcription of lecture videos and audio
+
+Audio is split at silence boundaries so each segment can be transcribed by a
+separate worker process and stored as soon as it is finished.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import logging
+import re
+import subprocess
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Whisper expects 16 kHz mono float32 audio
+SAMPLE_RATE = 16000
+
+MEDIA_EXTENSIONS = {"mp4", "webm", "mov", "mp3", "wav", "m4a"}
+
+_SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end: (-?[\d.]+)")
+
+# Loaded lazily, once per worker process
+_whisper_model = None
+
+
+@dataclass
+class AudioSegment:
+    """A span of the source media to transcribe independently"""
+    index: int
+    start_time: float
+    end_time: float
+
+
+def probe_duration(media_path: str) -> float:
+    """Get media duration in seconds using ffprobe"""
+    output = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            media_path
+        ],
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return float(output.strip())
+
+
+def detect_silences(
+    media_path: str,
+    noise_db: Optional[float] = None,
+    min_silence: Optional[float] = None
+) -> List[Tuple[float, float]]:
+    """Find (start, end) silence intervals with ffmpeg's silencedetect filter"""
+    noise_db = settings.TRANSCRIPTION_SILENCE_DB if noise_db is None else noise_db
+    min_silence = settings.TRANSCRIPTION_MIN_SILENCE_SECONDS if min_silence is None else min_silence
+
+    # silencedetect only decodes audio, which is much faster than realtime
+    stderr = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-hide_banner", "-vn",
+            "-i", media_path,
+            "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+            "-f", "null", "-"
+        ],
+        capture_output=True,
+        text=True,
+        check=True
+    ).stderr
+
+    silences = []
+    start = None
+    for line in stderr.splitlines():
+        match = _SILENCE_START.search(line)
+        if match:
+            start = max(float(match.group(1)), 0.0)
+            continue
+        match = _SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+
+    return silences
+
+
+def plan_segments(
+    duration: float,
+    silences: List[Tuple[float, float]],
+    target_seconds: Optional[float] = None,
+    max_seconds: Optional[float] = None
+) -> List[AudioSegment]:
+    """
+    Split [0, duration] into segments that end in the middle of a silence.
+
+    A segment is closed at the first silence after it reaches target_seconds.
+    If no silence is found before max_seconds the segment is cut hard there.
+    """
+    target_seconds = target_seconds or settings.TRANSCRIPTION_TARGET_SEGMENT_SECONDS
+    max_seconds = max_seconds or settings.TRANSCRIPTION_MAX_SEGMENT_SECONDS
+
+    cut_points = sorted((start + end) / 2 for start, end in silences if 0 < (start + end) / 2 < duration)
+
+    segments = []
+    segment_start = 0.0
+    for cut in cut_points:
+        while cut - segment_start > max_seconds:
+            segments.append(AudioSegment(len(segments), segment_start, segment_start + max_seconds))
+            segment_start += max_seconds
+        if cut - segment_start >= target_seconds:
+            segments.append(AudioSegment(len(segments), segment_start, cut))
+            segment_start = cut
+
+    while duration - segment_start > max_seconds:
+        segments.append(AudioSegment(len(segments), segment_start, segment_start + max_seconds))
+        segment_start += max_seconds
+    if duration > segment_start:
+        segments.append(AudioSegment(len(segments), segment_start, duration))
+
+    return segments
+
+
+def load_audio_span(media_path: str, start_time: float, end_time: float):
+    """Decode only [start_time, end_time) of the media as 16 kHz mono float32"""
+    import numpy as np
+
+    raw = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-ss", f"{start_time:.3f}",
+            "-t", f"{end_time - start_time:.3f}",
+            "-i", media_path,
+            "-vn", "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"
+        ],
+        capture_output=True,
+        check=True
+    ).stdout
+    return np.frombuffer(raw, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def _get_whisper_model():
+    """Load the Whisper model once per worker process"""
+    global _whisper_model
+    if _whisper_model is None:
+        import whisper
+        logger.info(f"Loading Whisper model '{settings.WHISPER_MODEL}'")
+        _whisper_model = whisper.load_model(settings.WHISPER_MODEL)
+    return _whisper_model
+
+
+def transcribe_segment(media_path: str, segment: AudioSegment) -> str:
+    """Transcribe a single segment of the media file"""
+    audio = load_audio_span(media_path, segment.start_time, segment.end_time)
+    if audio.size == 0:
+        return ""
+
+    result = _get_whisper_model().transcribe(audio, fp16=False)
+    return result["text"].strip()
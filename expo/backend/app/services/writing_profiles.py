@@ -0,0 +1,285 @@
+"""
+Writing samples and the style profiles built from them
+
+Uploaded samples are analysed by app.services.stylometry in a process
+pool: extraction is CPU-bound NumPy and Python work that would otherwise
+stall the event loop, and batches are split into chunks so several cores
+share a large upload. Each sample keeps its feature dict.
+
+A style's aggregate columns are derived from streaming statistics stored
+with it (profile_stats and phrase_sketch): sums and Welford moments for
+the numeric features, exact counts for the small fixed sets of function
+words, punctuation and transitions, and a count-min sketch with a bounded
+candidate list for phrases, which are unbounded. All of them can be
+updated by one sample's features in either direction, so adding or
+removing a sample costs the same however many samples the style has.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import asyncio
+import copy
+import multiprocessing
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.metrics import STYLOMETRY_BATCH_SECONDS, STYLOMETRY_SAMPLES_EXTRACTED
+from app.core.sketches import CountMinSketch, Moments
+from app.models.writing_style import WritingStyle, WritingSample
+
+COMMON_PHRASES = 20
+TRANSITION_WORDS = 10
+VOCABULARY_PREFERENCES = 20
+# Phrases tracked as candidates for common_phrases, ranked by sketch estimate
+PHRASE_CANDIDATES = 100
+
+
+class StylometryPool:
+    """Process pool for stylometric feature extraction, started on first use"""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process running an event loop and DB pools is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.STYLOMETRY_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def extract(self, texts: List[str]) -> List[dict]:
+        """Feature dicts of texts, in order, computed chunk by chunk across the pool"""
+        if not texts:
+            return []
+        # numpy stays out of the API process until samples are uploaded
+        from app.services.stylometry import extract_batch
+
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        size = settings.STYLOMETRY_CHUNK_SAMPLES
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(self._pool(), extract_batch, texts[offset:offset + size])
+            for offset in range(0, len(texts), size)
+        ))
+        STYLOMETRY_BATCH_SECONDS.observe(time.perf_counter() - start)
+        STYLOMETRY_SAMPLES_EXTRACTED.inc(len(texts))
+        return [features for chunk in chunks for features in chunk]
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+stylometry_pool = StylometryPool()
+
+
+def _empty_stats() -> dict:
+    return {
+        "samples": 0,
+        "words": 0,
+        "sentences": 0,
+        "paragraphs": 0,
+        "sentence_length": Moments().to_dict(),
+        # complexity, formality and technical level weighted by words, passive ratio by sentences
+        "weighted": {"complexity": 0.0, "formality": 0.0, "technical": 0.0, "passive": 0.0},
+        "histogram": {},
+        # per-1000-word rates weighted by words
+        "function_words": {},
+        "punctuation": {},
+        "transitions": {},
+        "phrases": []
+    }
+
+
+def _add_counts(totals: Dict[str, float], counts: Dict[str, float], scale: float):
+    for name, count in counts.items():
+        total = totals.get(name, 0) + count * scale
+        if abs(total) < 1e-9:
+            totals.pop(name, None)
+        else:
+            totals[name] = total
+
+
+def _apply(stats: dict, sketch: CountMinSketch, features: dict, sign: int):
+    """Add (sign 1) or remove (sign -1) one sample's features, in O(sample)"""
+    words = features["word_count"]
+    sentences = features["sentence_count"]
+    stats["samples"] += sign
+    stats["words"] += sign * words
+    stats["sentences"] += sign * sentences
+    stats["paragraphs"] += sign * features["paragraph_count"]
+
+    moments = Moments.from_dict(stats["sentence_length"])
+    sample_moments = Moments.of(sentences, features["sentence_length"]["mean"], features["sentence_length"]["std"])
+    if sign > 0:
+        moments.merge(sample_moments)
+    else:
+        moments.remove(sample_moments)
+    stats["sentence_length"] = moments.to_dict()
+
+    weighted = stats["weighted"]
+    weighted["complexity"] += sign * features["vocabulary"]["complexity"] * words
+    weighted["formality"] += sign * features["formality"] * words
+    weighted["technical"] += sign * features["technical_level"] * words
+    weighted["passive"] += sign * features["passive_ratio"] * sentences
+
+    _add_counts(stats["histogram"], features["sentence_length"]["histogram"], sign)
+    _add_counts(stats["function_words"], features["function_words"], sign * words)
+    _add_counts(stats["punctuation"], features["punctuation"], sign * words)
+    _add_counts(stats["transitions"], features["transitions"], sign)
+
+    for phrase, count in features["phrases"].items():
+        sketch.update(phrase, sign * count)
+    candidates = set(stats["phrases"])
+    if sign > 0:
+        candidates.update(features["phrases"])
+    ranked = sorted(
+        ((sketch.estimate(phrase), phrase) for phrase in candidates),
+        key=lambda item: (-item[0], item[1])
+    )
+    stats["phrases"] = [phrase for estimate, phrase in ranked[:PHRASE_CANDIDATES] if estimate > 0]
+
+
+def _ranked(totals: Dict[str, float], limit: Optional[int] = None) -> List[tuple]:
+    # Ties by name, so the order does not depend on the history of updates
+    return sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def _rates(totals: Dict[str, float], words: int, limit: Optional[int] = None) -> Dict[str, float]:
+    if not words:
+        return {}
+    return {name: round(total / words, 3) for name, total in _ranked(totals, limit)}
+
+
+def _tone(formality: float, technical: float, complexity: float, transitions_per_thousand: float) -> List[str]:
+    tone = []
+    if formality >= 0.6:
+        tone.append("formal")
+    elif formality <= 0.4:
+        tone.append("conversational")
+    if transitions_per_thousand >= 5:
+        tone.append("analytical")
+    if technical >= 0.5:
+        tone.append("technical")
+    if complexity >= 0.6:
+        tone.append("sophisticated")
+    return tone
+
+
+def summarize_stats(stats: dict, sketch: CountMinSketch) -> dict:
+    """WritingStyle column values from a profile's streaming statistics"""
+    words = stats["words"]
+    sentences = stats["sentences"]
+    paragraphs = stats["paragraphs"]
+    weighted = stats["weighted"]
+    moments = Moments.from_dict(stats["sentence_length"])
+
+    complexity = weighted["complexity"] / words if words else 0.0
+    formality = weighted["formality"] / words if words else 0.0
+    technical = weighted["technical"] / words if words else 0.0
+    passive_ratio = weighted["passive"] / sentences if sentences else 0.0
+    transitions_per_thousand = sum(stats["transitions"].values()) * 1000 / words if words else 0.0
+
+    return {
+        "vocabulary_complexity": complexity,
+        "sentence_length_avg": moments.mean,
+        "sentence_length_std": moments.variance ** 0.5,
+        "formality_level": formality,
+        "technical_level": technical,
+        "common_phrases": stats["phrases"][:COMMON_PHRASES],
+        "transition_words": [phrase for phrase, _ in _ranked(stats["transitions"], TRANSITION_WORDS)],
+        "vocabulary_preferences": _rates(stats["function_words"], words, VOCABULARY_PREFERENCES),
+        "grammar_patterns": {"passive_ratio": round(passive_ratio, 4)},
+        "punctuation_style": _rates(stats["punctuation"], words),
+        "paragraph_length_avg": words / paragraphs if paragraphs else 0.0,
+        "paragraph_structure": {
+            "sentences_per_paragraph": round(sentences / paragraphs, 3) if paragraphs else 0.0,
+            "sentence_length_histogram": dict(stats["histogram"])
+        },
+        "tone_attributes": _tone(formality, technical, complexity, transitions_per_thousand),
+        "voice_type": "passive" if passive_ratio > 0.3 else "mixed" if passive_ratio > 0.1 else "active"
+    }
+
+
+async def _load_profile(db: AsyncSession, style: WritingStyle) -> Tuple[dict, CountMinSketch]:
+    """A style's statistics, locked for update"""
+    await db.refresh(style, ["profile_stats", "phrase_sketch"], with_for_update=True)
+    if style.profile_stats is not None and style.phrase_sketch is not None:
+        return copy.deepcopy(style.profile_stats), CountMinSketch.from_bytes(style.phrase_sketch)
+
+    # Styles from before profile statistics are built once from stored features
+    stats, sketch = _empty_stats(), CountMinSketch()
+    result = await db.execute(
+        select(WritingSample.features)
+        .where(WritingSample.style_id == style.id)
+    )
+    for features in result.scalars():
+        if features:
+            _apply(stats, sketch, features, 1)
+    return stats, sketch
+
+
+def _store_profile(style: WritingStyle, stats: dict, sketch: CountMinSketch):
+    if stats["samples"] <= 0:
+        # Start clean rather than carry rounding residue into the next sample
+        stats, sketch = _empty_stats(), CountMinSketch()
+    for name, value in summarize_stats(stats, sketch).items():
+        setattr(style, name, value)
+    style.profile_stats = stats
+    style.phrase_sketch = sketch.to_bytes()
+    style.sample_count = stats["samples"]
+    style.last_trained = datetime.now(timezone.utc)
+    style.training_status = "completed"
+
+
+async def add_samples(
+    db: AsyncSession,
+    style: WritingStyle,
+    uploads: List[dict]
+) -> List[WritingSample]:
+    """
+    Analyse and store samples for a style and fold them into its profile.
+
+    Each upload has content and optionally title, source_type, class_id
+    and assignment_id.
+    """
+    features = await stylometry_pool.extract([upload["content"] for upload in uploads])
+    stats, sketch = await _load_profile(db, style)
+    samples = []
+    for upload, sample_features in zip(uploads, features):
+        sample = WritingSample(
+            id=str(uuid.uuid4()),
+            style_id=style.id,
+            user_id=style.user_id,
+            title=upload.get("title"),
+            content=upload["content"],
+            source_type=upload.get("source_type"),
+            class_id=upload.get("class_id"),
+            assignment_id=upload.get("assignment_id"),
+            word_count=sample_features["word_count"],
+            sentence_count=sample_features["sentence_count"],
+            paragraph_count=sample_features["paragraph_count"],
+            features=sample_features
+        )
+        db.add(sample)
+        samples.append(sample)
+        _apply(stats, sketch, sample_features, 1)
+    _store_profile(style, stats, sketch)
+    await db.flush()
+    return samples
+
+
+async def remove_sample(db: AsyncSession, style: WritingStyle, sample: WritingSample):
+    """Delete a sample and take it out of its style's profile"""
+    stats, sketch = await _load_profile(db, style)
+    if sample.features:
+        _apply(stats, sketch, sample.features, -1)
+    await db.delete(sample)
+    _store_profile(style, stats, sketch)
+    await db.flush()
@@ -0,0 +1,28 @@
+"""
+Background tasks for StudyMate AI
+"""
+from app.core.celery_app import celery_app
+from app.tasks.analytics import (
+    aggregate_activity,
+    detect_knowledge_gaps,
+    prune_hourly_rollups,
+    rebuild_class_sketches
+)
+from app.tasks.materials import (
+    cancel_material_processing,
+    enqueue_material,
+    process_material_async,
+    process_instruction_video
+)
+
+__all__ = [
+    "celery_app",
+    "aggregate_activity",
+    "detect_knowledge_gaps",
+    "prune_hourly_rollups",
+    "rebuild_class_sketches",
+    "cancel_material_processing",
+    "enqueue_material",
+    "process_material_async",
+    "process_instruction_video"
+]
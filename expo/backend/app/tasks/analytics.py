@@ -0,0 +1,70 @@
+"""
+Analytics aggregation tasks
+"""
+import asyncio
+import logging
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.services.activity_log import aggregate_activity_events
+from app.services import quantile_sketches, study_rollups
+from app.tasks.materials import get_session_maker
+
+logger = logging.getLogger(__name__)
+
+
+async def _aggregate_activity() -> int:
+    async with get_session_maker()() as db:
+        return await aggregate_activity_events(db)
+
+
+@celery_app.task(name="analytics.aggregate_activity")
+def aggregate_activity():
+    """Periodic: fold new activity events into the study counters"""
+    aggregated = asyncio.run(_aggregate_activity())
+    if aggregated:
+        logger.info(f"Aggregated {aggregated} activity events")
+    return aggregated
+
+
+async def _prune_hourly_rollups() -> int:
+    async with get_session_maker()() as db:
+        return await study_rollups.prune_hourly_rollups(db, settings.HOURLY_ROLLUP_RETENTION_DAYS)
+
+
+@celery_app.task(name="analytics.prune_hourly_rollups")
+def prune_hourly_rollups():
+    """Periodic: drop hourly rollups past the retention window"""
+    pruned = asyncio.run(_prune_hourly_rollups())
+    if pruned:
+        logger.info(f"Pruned {pruned} hourly study rollups")
+    return pruned
+
+
+@celery_app.task(name="analytics.rebuild_class_sketches")
+def rebuild_class_sketches():
+    """Periodic: rebuild the class percentile sketches marked stale by writes"""
+    rebuilt = asyncio.run(quantile_sketches.rebuild_stale_class_sketches(
+        get_session_maker(),
+        settings.QUANTILE_SKETCH_REBUILD_BATCH
+    ))
+    if rebuilt:
+        logger.info(f"Rebuilt {rebuilt} class percentile sketches")
+    return rebuilt
+
+
+async def _detect_knowledge_gaps() -> int:
+    # numpy and scikit-learn stay out of the API import graph
+    from app.services.knowledge_gaps import detect_knowledge_gaps
+
+    async with get_session_maker()() as db:
+        return await detect_knowledge_gaps(db)
+
+
+@celery_app.task(name="analytics.detect_knowledge_gaps")
+def detect_knowledge_gaps():
+    """Periodic: cluster new chat questions and refresh enrollment topics and gaps"""
+    processed = asyncio.run(_detect_knowledge_gaps())
+    if processed:
+        logger.info(f"Clustered {processed} chat questions")
+    return processed
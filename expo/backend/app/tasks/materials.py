@@ -0,0 +1,382 @@
+"""
+Material processing tasks
+
+Uploads enter through enqueue_material, which hands them to the fair-share
+MaterialScheduler; process_material_async is only sent to Celery once the
+scheduler grants the material an in-flight slot.
+
+Video and audio materials are split at silences and fanned out as one
+transcription task per segment, so segments run in parallel across worker
+processes and each one is stored as a MaterialChunk as soon as it finishes.
+
+Every stage publishes progress events, and cancellation is checked between
+stages and before each segment, so a cancelled job stops at the next unit of
+work and frees its worker.
+"""
+from celery import chord
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import List, Optional
+import asyncio
+import logging
+import uuid
+
+from app.core.celery_app import celery_app
+from app.core.database import create_worker_session_maker
+from app.core.redis import get_redis
+from app.models.material import Material, MaterialChunk
+from app.models.assignment import Assignment
+from app.services.content_delivery import compute_content_hash, is_object_storage_path, resolve_local_path
+from app.services.material_scheduler import MaterialScheduler
+from app.services.processing_progress import (
+    ProcessingCancelled,
+    check_cancelled,
+    is_cancelled,
+    mark_segment_done,
+    publish_progress,
+    reset_progress
+)
+from app.services.transcription_service import (
+    AudioSegment,
+    MEDIA_EXTENSIONS,
+    detect_silences,
+    plan_segments,
+    probe_duration,
+    transcribe_segment
+)
+
+logger = logging.getLogger(__name__)
+
+_session_maker = None
+_scheduler = None
+
+
+def get_session_maker():
+    """Get the worker session factory, creating it on first use"""
+    global _session_maker
+    if _session_maker is None:
+        _session_maker = create_worker_session_maker()
+    return _session_maker
+
+
+def get_scheduler() -> MaterialScheduler:
+    """Get the material scheduler, creating it on first use"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = MaterialScheduler(get_redis())
+    return _scheduler
+
+
+def dispatch_ready_materials():
+    """Send every material the scheduler admits to the processing queue"""
+    for material_id in get_scheduler().pop_ready():
+        process_material_async.delay(material_id)
+
+
+def release_material_slot(material_id: str):
+    """Give back a material's in-flight slot and admit the next ones"""
+    get_scheduler().release(material_id)
+    dispatch_ready_materials()
+
+
+def split_media(media_path: str) -> List[AudioSegment]:
+    """Plan transcription segments for a media file"""
+    duration = probe_duration(media_path)
+    silences = detect_silences(media_path)
+    segments = plan_segments(duration, silences)
+    logger.info(f"Split {media_path} ({duration:.0f}s) into {len(segments)} segments")
+    return segments
+
+
+async def _start_processing(material_id: str) -> Optional[Material]:
+    """Mark material as processing and clear chunks from previous runs"""
+    async with get_session_maker()() as db:
+        material = await db.get(Material, material_id)
+        if not material:
+            return None
+
+        material.processing_status = "processing"
+        material.processing_error = None
+        if not is_object_storage_path(material.file_path):
+            material.content_hash = compute_content_hash(resolve_local_path(material.file_path))
+        await db.execute(
+            delete(MaterialChunk).where(MaterialChunk.material_id == material_id)
+        )
+        await db.commit()
+        return material
+
+
+async def _process_document(material_id: str):
+    """Extract and chunk text from a document material"""
+    from app.services.document_processor import DocumentProcessor
+
+    async with get_session_maker()() as db:
+        material = await db.get(Material, material_id)
+        await DocumentProcessor(db).process(material)
+
+        material.is_processed = True
+        material.processing_status = "completed"
+        await db.commit()
+
+
+def _insert_chunk(db):
+    dialect = db.get_bind().dialect.name
+    return (postgresql if dialect == "postgresql" else sqlite).insert(MaterialChunk)
+
+
+async def _store_segment_chunk(material_id: str, segment: AudioSegment, text: str) -> bool:
+    """
+    Persist one transcribed segment so it is searchable immediately.
+
+    Returns False if the segment was already stored: with late acks a
+    segment is redelivered when its worker dies after the commit.
+    """
+    async with get_session_maker()() as db:
+        result = await db.execute(
+            _insert_chunk(db)
+            .values(
+                id=str(uuid.uuid4()),
+                material_id=material_id,
+                content=text,
+                chunk_index=segment.index,
+                start_time=segment.start_time,
+                end_time=segment.end_time
+            )
+            .on_conflict_do_nothing(index_elements=["material_id", "chunk_index"])
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+
+async def _finalize_transcription(material_id: str):
+    """Assemble the full transcript from stored chunks and mark completed"""
+    async with get_session_maker()() as db:
+        material = await db.get(Material, material_id)
+        if not material:
+            return
+
+        result = await db.execute(
+            select(MaterialChunk.content, MaterialChunk.end_time)
+            .where(MaterialChunk.material_id == material_id)
+            .order_by(MaterialChunk.chunk_index)
+        )
+        rows = result.all()
+
+        material.transcript = "\n".join(row.content for row in rows)
+        if rows:
+            material.duration_seconds = int(rows[-1].end_time)
+        material.is_processed = True
+        material.processing_status = "completed"
+        await db.commit()
+
+
+async def _mark_failed(material_id: str, error: str):
+    """Record a processing failure"""
+    async with get_session_maker()() as db:
+        material = await db.get(Material, material_id)
+        if material:
+            material.processing_status = "failed"
+            material.processing_error = error
+            await db.commit()
+
+
+async def _mark_cancelled(material_id: str):
+    """Record that processing was cancelled"""
+    async with get_session_maker()() as db:
+        material = await db.get(Material, material_id)
+        if material:
+            material.processing_status = "cancelled"
+            material.processing_error = None
+            await db.commit()
+
+
+def _finish_failed(material_id: str, error: str):
+    """Mark a material failed, or cancelled if that is why it stopped"""
+    if is_cancelled(get_redis(), material_id):
+        asyncio.run(_mark_cancelled(material_id))
+        publish_progress(get_redis(), material_id, "cancelled", 0, status="cancelled")
+    else:
+        asyncio.run(_mark_failed(material_id, error))
+        publish_progress(get_redis(), material_id, "failed", 0, status="failed", detail=error)
+
+
+@celery_app.task(name="materials.enqueue")
+def enqueue_material(material_id: str, class_id: str, user_id: str, file_size: Optional[int]):
+    """Queue a material for processing behind the fair-share scheduler"""
+    reset_progress(get_redis(), material_id)
+    publish_progress(get_redis(), material_id, "queued", 0, status="pending")
+    get_scheduler().submit(material_id, class_id, user_id, file_size)
+    # A cancel that ran before the submit found nothing to remove
+    if is_cancelled(get_redis(), material_id) and get_scheduler().remove(material_id):
+        asyncio.run(_mark_cancelled(material_id))
+        publish_progress(get_redis(), material_id, "cancelled", 0, status="cancelled")
+        return
+    dispatch_ready_materials()
+
+
+@celery_app.task(name="materials.cancel")
+def cancel_material_processing(material_id: str):
+    """
+    Cancel a material that is still waiting in the scheduler.
+
+    Materials that are already running see the cancel flag at their next
+    check and stop on their own.
+    """
+    if get_scheduler().remove(material_id):
+        asyncio.run(_mark_cancelled(material_id))
+        publish_progress(get_redis(), material_id, "cancelled", 0, status="cancelled")
+
+
+@celery_app.task(name="materials.dispatch")
+def dispatch_materials():
+    """Periodic safety net: reclaim expired slots and admit waiting materials"""
+    expired = get_scheduler().reclaim_expired()
+    if expired:
+        logger.warning(f"Reclaimed expired processing slots: {expired}")
+    dispatch_ready_materials()
+
+
+@celery_app.task(name="materials.process")
+def process_material_async(material_id: str):
+    """Process an uploaded material (text extraction or transcription)"""
+    redis_client = get_redis()
+
+    # Transcription keeps the slot until its chord callback runs
+    slot_handed_off = False
+    try:
+        check_cancelled(redis_client, material_id)
+        material = asyncio.run(_start_processing(material_id))
+        if not material:
+            logger.warning(f"Material {material_id} not found, skipping processing")
+            return
+
+        if material.file_type in MEDIA_EXTENSIONS:
+            publish_progress(redis_client, material_id, "splitting", 2)
+            segments = split_media(material.file_path)
+            check_cancelled(redis_client, material_id)
+
+            publish_progress(
+                redis_client, material_id, "transcribing", 5,
+                detail=f"0/{len(segments)} segments"
+            )
+            callback = finalize_material_transcription.si(material_id).on_error(
+                mark_material_failed.si(material_id)
+            )
+            chord(
+                transcribe_material_segment.s(
+                    material_id,
+                    material.file_path,
+                    segment.index,
+                    segment.start_time,
+                    segment.end_time,
+                    len(segments)
+                )
+                for segment in segments
+            )(callback)
+            slot_handed_off = True
+        else:
+            publish_progress(redis_client, material_id, "extracting", 10)
+            asyncio.run(_process_document(material_id))
+            publish_progress(redis_client, material_id, "completed", 100, status="completed")
+    except ProcessingCancelled:
+        logger.info(f"Processing cancelled for material {material_id}")
+        asyncio.run(_mark_cancelled(material_id))
+        publish_progress(redis_client, material_id, "cancelled", 0, status="cancelled")
+    except Exception as e:
+        logger.exception(f"Processing failed for material {material_id}")
+        _finish_failed(material_id, str(e))
+        raise
+    finally:
+        if not slot_handed_off:
+            release_material_slot(material_id)
+
+
+@celery_app.task(name="materials.transcribe_segment")
+def transcribe_material_segment(
+    material_id: str,
+    media_path: str,
+    index: int,
+    start_time: float,
+    end_time: float,
+    segment_count: int
+):
+    """Transcribe one segment of a material and store it as a chunk"""
+    redis_client = get_redis()
+    # Failing fast on cancel fails the chord and skips the remaining segments
+    check_cancelled(redis_client, material_id)
+
+    segment = AudioSegment(index, start_time, end_time)
+    text = transcribe_segment(media_path, segment)
+    if text and not asyncio.run(_store_segment_chunk(material_id, segment, text)):
+        # Redelivered after it was stored; do not count it twice
+        return index
+
+    done = mark_segment_done(redis_client, material_id)
+    publish_progress(
+        redis_client, material_id, "transcribing", 5 + 90 * done / segment_count,
+        detail=f"{done}/{segment_count} segments"
+    )
+    return index
+
+
+@celery_app.task(name="materials.finalize_transcription")
+def finalize_material_transcription(material_id: str):
+    """Chord callback run once every segment of a material is transcribed"""
+    try:
+        publish_progress(get_redis(), material_id, "finalizing", 97)
+        asyncio.run(_finalize_transcription(material_id))
+        publish_progress(get_redis(), material_id, "completed", 100, status="completed")
+    finally:
+        release_material_slot(material_id)
+
+
+@celery_app.task(name="materials.mark_failed")
+def mark_material_failed(material_id: str):
+    """Chord error callback for a failed or cancelled segment"""
+    try:
+        _finish_failed(material_id, "Transcription of one or more segments failed")
+    finally:
+        release_material_slot(material_id)
+
+
+async def _save_instruction_transcript(assignment_id: str, transcript: str):
+    """Store the transcript of an assignment instruction video"""
+    async with get_session_maker()() as db:
+        assignment = await db.get(Assignment, assignment_id)
+        if assignment:
+            assignment.instruction_video_transcript = transcript
+            await db.commit()
+
+
+async def _get_instruction_video_path(assignment_id: str) -> Optional[str]:
+    """Get the instruction video path for an assignment"""
+    async with get_session_maker()() as db:
+        assignment = await db.get(Assignment, assignment_id)
+        return assignment.instruction_video_path if assignment else None
+
+
+@celery_app.task(name="assignments.process_instruction_video")
+def process_instruction_video(assignment_id: str):
+    """Transcribe an assignment instruction video in parallel segments"""
+    video_path = asyncio.run(_get_instruction_video_path(assignment_id))
+    if not video_path:
+        logger.warning(f"Assignment {assignment_id} has no instruction video")
+        return
+
+    chord(
+        transcribe_media_segment.s(video_path, segment.index, segment.start_time, segment.end_time)
+        for segment in split_media(video_path)
+    )(save_instruction_transcript.s(assignment_id))
+
+
+@celery_app.task(name="media.transcribe_segment")
+def transcribe_media_segment(media_path: str, index: int, start_time: float, end_time: float):
+    """Transcribe one segment of a media file and return (index, text)"""
+    return index, transcribe_segment(media_path, AudioSegment(index, start_time, end_time))
+
+
+@celery_app.task(name="assignments.save_instruction_transcript")
+def save_instruction_transcript(results: list, assignment_id: str):
+    """Chord callback joining instruction video segments in order"""
+    transcript = "\n".join(text for _, text in sorted(results) if text)
+    asyncio.run(_save_instruction_transcript(assignment_id, transcript))
@@ -0,0 +1,128 @@
+"""
+Benchmark for the fast list serialization path
+
+Compares the default path (ORM objects validated by FastAPI's response
+model handling, jsonable_encoder and JSONResponse) against
+fast_list_response (column rows, one TypeAdapter call, orjson) on a
+class with many materials. Uses a throwaway SQLite database unless
+DATABASE_URL points somewhere else.
+
+Usage (from the backend directory):
+    python -m scripts.bench_list_serialization --rows 20000 --repeat 5
+"""
+from datetime import datetime
+from typing import List, Optional
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+_db_file = os.path.join(tempfile.gettempdir(), "studymate_bench_list.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_file}")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import delete, insert, select
+
+from app.core.database import Base, engine, async_session_maker
+from app.core.serialization import fast_list_response
+from app.models import Material
+
+CLASS_ID = "bench-class"
+
+
+class MaterialListItem(BaseModel):
+    """Shape of a material in list responses"""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    class_id: str
+    uploaded_by: str
+    title: str
+    description: Optional[str] = None
+    file_type: Optional[str] = None
+    file_size: Optional[int] = None
+    is_processed: bool
+    processing_status: str
+    tags: list = []
+    embedding_count: int = 0
+    created_at: datetime
+
+
+async def seed(rows: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(delete(Material).where(Material.class_id == CLASS_ID))
+        await conn.execute(insert(Material), [
+            {
+                "id": str(uuid.uuid4()),
+                "class_id": CLASS_ID,
+                "uploaded_by": "bench-user",
+                "title": f"Lecture {i}",
+                "description": "Slides and notes for the weekly lecture",
+                "file_type": "pdf",
+                "file_size": 1024 * (i % 500 + 1),
+                "is_processed": True,
+                "processing_status": "completed",
+                "tags": ["week", str(i % 14)],
+                "embedding_count": i % 50,
+                "created_at": datetime.utcnow()
+            }
+            for i in range(rows)
+        ])
+
+
+def list_query():
+    return (
+        select(Material)
+        .where(Material.class_id == CLASS_ID)
+        .order_by(Material.created_at.desc())
+    )
+
+
+async def orm_path() -> bytes:
+    field = create_response_field(name="bench", type_=List[MaterialListItem])
+    async with async_session_maker() as db:
+        result = await db.execute(list_query())
+        materials = result.scalars().all()
+        content = await serialize_response(field=field, response_content=materials)
+    return JSONResponse(content).body
+
+
+async def fast_path() -> bytes:
+    async with async_session_maker() as db:
+        response = await fast_list_response(db, list_query(), MaterialListItem)
+    return response.body
+
+
+async def measure(name: str, fn, rows: int, repeat: int):
+    await fn()  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{name:>6}: best {best * 1000:8.1f} ms  {rows / best:12,.0f} rows/s")
+    return best
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    await seed(args.rows)
+    orm_best = await measure("orm", orm_path, args.rows, args.repeat)
+    fast_best = await measure("fast", fast_path, args.rows, args.repeat)
+    print(f"speedup: {orm_best / fast_best:.2f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
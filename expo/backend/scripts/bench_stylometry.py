@@ -0,0 +1,89 @@
+"""
+Benchmark for stylometric feature extraction of writing samples
+
+Compares extracting features one sample at a time against one batched
+extract_batch call, both in this process, and against the StylometryPool
+used by the upload endpoint (chunks spread over worker processes). The
+samples are synthetic paragraphs of mixed sentence lengths.
+
+Usage (from the backend directory):
+    python -m scripts.bench_stylometry --samples 200 --words 800 --workers 4 --chunk 16
+"""
+from typing import List
+import argparse
+import asyncio
+import os
+import random
+import time
+
+WORDS = (
+    "the of and to in is that for it as was with be by on not this are or "
+    "however therefore moreover student analysis evidence research theory "
+    "method results significant data function system process structure was "
+    "observed measured considered argued suggests indicates demonstrates "
+    "approach framework context although because while which whereas"
+).split()
+
+
+def make_samples(count: int, words: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(count):
+        paragraphs, written = [], 0
+        while written < words:
+            sentences = []
+            for _ in range(rng.randint(3, 7)):
+                length = rng.randint(4, 35)
+                sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+                sentences.append(sentence.capitalize() + rng.choice((".", ".", ".", "?", "!")))
+                written += length
+            paragraphs.append(" ".join(sentences))
+        samples.append("\n\n".join(paragraphs))
+    return samples
+
+
+def measure(name: str, fn, count: int, repeat: int) -> float:
+    fn()  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{name:>10}: best {best * 1000:8.1f} ms  {count / best:10,.1f} samples/s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--words", type=int, default=800)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # The pool reads its sizing from settings
+    os.environ["STYLOMETRY_WORKERS"] = str(args.workers)
+    os.environ["STYLOMETRY_CHUNK_SAMPLES"] = str(args.chunk)
+
+    from app.services.stylometry import extract_batch
+    from app.services.writing_profiles import StylometryPool
+
+    samples = make_samples(args.samples, args.words)
+    single_best = measure("single", lambda: [extract_batch([text]) for text in samples], args.samples, args.repeat)
+    batch_best = measure("batch", lambda: extract_batch(samples), args.samples, args.repeat)
+
+    pool = StylometryPool()
+    loop = asyncio.new_event_loop()
+    try:
+        pool_best = measure("pool", lambda: loop.run_until_complete(pool.extract(samples)), args.samples, args.repeat)
+    finally:
+        pool.stop()
+        loop.close()
+
+    print(f"batch speedup: {single_best / batch_best:.2f}x  pool speedup: {single_best / pool_best:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
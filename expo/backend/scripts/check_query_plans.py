@@ -0,0 +1,155 @@
+"""
+Query-plan regression check for hot query shapes
+
+Runs EXPLAIN for every query in HOT_QUERIES against a migrated PostgreSQL
+database and fails if any plan contains a sequential scan. Sequential scans
+are disabled for the session, so the planner only falls back to one when no
+usable index exists, which makes the check meaningful on small or empty
+databases too.
+
+Usage (from the backend directory, after `alembic upgrade head`):
+    DATABASE_URL=postgresql+asyncpg://... python -m scripts.check_query_plans
+"""
+from datetime import datetime
+import asyncio
+import json
+import sys
+
+from sqlalchemy import select, or_, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.models import (
+    User,
+    Class,
+    ClassEnrollment,
+    ChatSession,
+    ChatMessage,
+    Material,
+    MaterialChunk,
+    Assignment,
+    AssignmentSubmission,
+    WritingStyle
+)
+from app.models.types import json_array_contains
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+CLASS_ID = "00000000-0000-0000-0000-000000000002"
+PARENT_ID = "00000000-0000-0000-0000-000000000003"
+
+HOT_QUERIES = {
+    "enrollment check": (
+        select(ClassEnrollment)
+        .where(ClassEnrollment.class_id == CLASS_ID)
+        .where(ClassEnrollment.user_id == USER_ID)
+        .where(ClassEnrollment.is_active == True)
+    ),
+    "user classes": (
+        select(Class)
+        .join(ClassEnrollment)
+        .where(ClassEnrollment.user_id == USER_ID)
+        .where(ClassEnrollment.is_active == True)
+    ),
+    "class materials": (
+        select(Material)
+        .where(Material.class_id == CLASS_ID)
+        .order_by(Material.created_at.desc())
+    ),
+    "materials by tag": (
+        select(Material)
+        .where(Material.class_id == CLASS_ID)
+        .where(json_array_contains(Material.tags, "midterm"))
+        .order_by(Material.created_at.desc())
+    ),
+    "sessions referencing material": (
+        select(ChatSession)
+        .where(json_array_contains(ChatSession.context_materials, PARENT_ID))
+    ),
+    "material chunks": (
+        select(MaterialChunk)
+        .where(MaterialChunk.material_id == PARENT_ID)
+        .order_by(MaterialChunk.chunk_index)
+    ),
+    "material chunks by page": (
+        select(MaterialChunk)
+        .where(MaterialChunk.material_id == PARENT_ID)
+        .where(MaterialChunk.page_number == 3)
+        .order_by(MaterialChunk.chunk_index)
+    ),
+    "chat sessions": (
+        select(ChatSession)
+        .where(ChatSession.user_id == USER_ID)
+        .order_by(ChatSession.last_activity.desc())
+    ),
+    "chat messages": (
+        select(ChatMessage)
+        .where(ChatMessage.session_id == PARENT_ID)
+        .order_by(ChatMessage.created_at.desc())
+        .limit(50)
+    ),
+    "class assignments": (
+        select(Assignment)
+        .where(Assignment.class_id == CLASS_ID, Assignment.is_published == True)
+        .order_by(Assignment.due_date)
+    ),
+    "submission lookup": (
+        select(AssignmentSubmission)
+        .where(AssignmentSubmission.assignment_id == PARENT_ID)
+        .where(AssignmentSubmission.user_id == USER_ID)
+    ),
+    "recent submissions": (
+        select(AssignmentSubmission)
+        .where(AssignmentSubmission.user_id == USER_ID)
+        .where(AssignmentSubmission.submitted_at >= datetime(2024, 1, 1))
+    ),
+    "writing styles": (
+        select(WritingStyle)
+        .where(WritingStyle.user_id == USER_ID)
+        .where(WritingStyle.is_active == True)
+    ),
+    "login lookup": (
+        select(User)
+        .where(or_(User.username == "student", User.email == "student"))
+    ),
+}
+
+
+def find_seq_scans(plan: dict) -> list:
+    """Tables read by a sequential scan anywhere in a JSON plan tree"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+async def main() -> int:
+    if not settings.DATABASE_URL.startswith("postgresql"):
+        print("Query plan checks need a PostgreSQL DATABASE_URL")
+        return 2
+
+    engine = create_async_engine(settings.DATABASE_URL)
+    failures = 0
+    async with engine.connect() as conn:
+        await conn.execute(text("SET enable_seqscan = off"))
+        for name, query in HOT_QUERIES.items():
+            sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+            result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+            plan = result.scalar()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            seq_scans = find_seq_scans(plan[0]["Plan"])
+
+            if seq_scans:
+                failures += 1
+                print(f"FAIL  {name}: sequential scan on {', '.join(seq_scans)}")
+            else:
+                print(f"ok    {name}")
+    await engine.dispose()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,134 @@
+"""
+Startup time and import cost report for the API process
+
+Imports app.main in a fresh interpreter with `-X importtime`, then reports:
+  * wall time to import the app and to run its lifespan startup
+  * the top-level packages that cost the most to import
+  * any heavy processing library (ML, video, document parsing) that the API
+    import graph pulls in; those belong in lazy imports or worker code
+
+Exits non-zero when a heavy library is imported or startup exceeds the
+budget, so it can run in CI.
+
+Usage (from the backend directory):
+    python -m scripts.import_cost_report --top 15 --budget-ms 1000
+"""
+from collections import defaultdict
+from pathlib import Path
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Libraries that only the processing code paths and workers should load
+HEAVY_PACKAGES = {
+    "whisper",
+    "torch",
+    "cv2",
+    "moviepy",
+    "langchain",
+    "langchain_openai",
+    "openai",
+    "tiktoken",
+    "pinecone",
+    "sklearn",
+    "numpy",
+    "PyPDF2",
+    "docx",
+    "pytesseract",
+    "PIL",
+    "pyarrow",
+}
+
+# Runs in the child interpreter; prints timings as JSON on the last line
+STARTUP_PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def startup():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(startup())
+print(json.dumps({"import_ms": (imported - start) * 1000, "ready_ms": (ready - start) * 1000}))
+"""
+
+
+def run_probe() -> tuple:
+    """Start the app in a child interpreter; return (timings, importtime lines)"""
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "import-cost-report")
+    env.setdefault("OPENAI_API_KEY", "import-cost-report")
+    env.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"Starting the app failed:\n{proc.stderr[-4000:]}")
+
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    lines = [line for line in proc.stderr.splitlines() if line.startswith("import time:")]
+    return timings, lines
+
+
+def parse_importtime(lines: list) -> dict:
+    """Self time in microseconds per imported module"""
+    self_us = {}
+    for line in lines[1:]:  # skip the header
+        # "import time:   self [us] | cumulative | imported package"
+        self_part, _, module = line[len("import time:"):].split("|")
+        module = module.strip()
+        self_us[module] = self_us.get(module, 0) + int(self_part)
+    return self_us
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="API startup time and import cost report")
+    parser.add_argument("--top", type=int, default=15, help="packages to list")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="maximum time until ready")
+    args = parser.parse_args()
+
+    timings, lines = run_probe()
+    self_us = parse_importtime(lines)
+
+    by_package = defaultdict(int)
+    for module, micros in self_us.items():
+        by_package[module.split(".")[0]] += micros
+
+    print(f"import app.main: {timings['import_ms']:8.1f} ms")
+    print(f"ready (lifespan): {timings['ready_ms']:7.1f} ms  (budget {args.budget_ms:.0f} ms)")
+    print(f"modules imported: {len(self_us)}")
+    print()
+    print(f"{'package':<28}{'self ms':>10}")
+    for package, micros in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<28}{micros / 1000:>10.1f}")
+
+    heavy = sorted(HEAVY_PACKAGES & set(by_package))
+    failed = False
+    if heavy:
+        failed = True
+        print()
+        print("Heavy packages imported by the API process:")
+        for package in heavy:
+            print(f"  {package:<26}{by_package[package] / 1000:>10.1f} ms")
+
+    if timings["ready_ms"] > args.budget_ms:
+        failed = True
+        print()
+        print(f"Startup took {timings['ready_ms']:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Rebuild the percentile rank sketches from the database
+
+Sketches are maintained as grades are recorded and study time is
+aggregated. Run this once after `alembic upgrade head` adds the
+quantile_sketches table, so grades recorded before then are counted, or
+at any time to rebuild them from scratch.
+
+Usage (from the backend directory):
+    python -m scripts.rebuild_quantile_sketches [--class-id ID ...]
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from app.core.database import async_session_maker, engine
+from app.models import Class
+from app.services.quantile_sketches import rebuild_class_sketches
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--class-id", action="append", dest="class_ids", help="only these classes")
+    args = parser.parse_args()
+
+    async with async_session_maker() as db:
+        class_ids = args.class_ids or (await db.execute(select(Class.id).order_by(Class.id))).scalars().all()
+
+    for class_id in class_ids:
+        # One transaction per class keeps sketch rows locked only briefly
+        async with async_session_maker() as db:
+            await rebuild_class_sketches(db, class_id)
+            await db.commit()
+        print(f"rebuilt sketches for class {class_id}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
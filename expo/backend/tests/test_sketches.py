@@ -0,0 +1,22 @@
+"""
+Tests for the streaming sketches
+"""
+import random
+
+from app.core.sketches import KLLSketch, percentile_rank
+
+
+def test_maximum_ranks_at_100_after_serialization():
+    for values in ([10 / 7] * 10, [50, 60, 70 + 1 / 3]):
+        sketch = KLLSketch()
+        sketch.extend(values)
+        assert percentile_rank(sketch.to_bytes(), max(values)) == 100.0
+        assert sketch.rank(max(values)) == 1.0
+
+
+def test_maximum_ranks_at_100_after_compaction():
+    rng = random.Random(1)
+    values = [rng.uniform(0, 100) for _ in range(5000)]
+    sketch = KLLSketch(seed=1)
+    sketch.extend(values)
+    assert percentile_rank(sketch.to_bytes(), max(values)) == 100.0